@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
+
+Serve with an ASGI server (e.g. ``uvicorn ShopSphere.asgi:application``) for
+the live order tracking stream (/api/delivery/track/<order_number>/stream/);
+under WSGI that endpoint only sends the current state.
 """
 
 import os
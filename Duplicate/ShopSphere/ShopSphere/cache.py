@@ -0,0 +1,224 @@
+"""
+ShopSphere/cache.py
+
+Project-wide response caching.
+
+TwoTierCache is a Django cache backend that keeps a small per-process LRU in
+front of a shared backend (Redis in production, LocMemCache in development
+and tests, see CACHES in settings.py). Entries live in the local tier for at
+most LOCAL_TIMEOUT seconds, which bounds how stale a worker can be after
+another worker writes to the shared tier.
+
+Cached endpoints are declared with @cache_policy(name, tags=...). The policy
+timeout comes from settings.CACHE_POLICIES[name]; the tags name the data the
+response is built from. Saving or deleting a Product, Review, Order or
+VendorProfile calls invalidate_tags() (see the apps' signals.py), which bumps
+the tag's version so every key built on the old version is skipped.
+"""
+import functools
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.http import HttpRequest
+from rest_framework.response import Response
+
+
+CACHE_ALIAS = 'tiered'
+DEFAULT_POLICY_TIMEOUT = 60
+
+_MISSING = object()
+
+
+class TwoTierCache(BaseCache):
+    """
+    Per-process LRU (LOCAL_MAX_ENTRIES, LOCAL_TIMEOUT) in front of the cache
+    alias named by LOCATION. Writes go through to the shared tier.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = location or 'default'
+        self._local_max_entries = int(options.get('LOCAL_MAX_ENTRIES', 1024))
+        self._local_timeout = float(options.get('LOCAL_TIMEOUT', 5))
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    # -- local tier ---------------------------------------------------------
+
+    def _local_get(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return _MISSING
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._local[key]
+                return _MISSING
+            self._local.move_to_end(key)
+            return value
+
+    def _local_set(self, key, value, timeout):
+        ttl = self._local_timeout
+        if timeout is not None:
+            ttl = min(ttl, timeout)
+        if ttl <= 0:
+            self._local_delete(key)
+            return
+        with self._lock:
+            self._local[key] = (time.monotonic() + ttl, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self._local_max_entries:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+
+    # -- cache API ----------------------------------------------------------
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        value = self._local_get(local_key)
+        if value is not _MISSING:
+            return value
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            return default
+        self._local_set(local_key, value, None)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.get_backend_timeout(timeout)
+        self.shared.set(key, value, timeout, version=version)
+        self._local_set(self.make_and_validate_key(key, version=version), value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.get_backend_timeout(timeout)
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._local_set(self.make_and_validate_key(key, version=version), value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, self.get_backend_timeout(timeout), version=version)
+
+    def delete(self, key, version=None):
+        self._local_delete(self.make_and_validate_key(key, version=version))
+        return self.shared.delete(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._local_delete(self.make_and_validate_key(key, version=version))
+        return self.shared.incr(key, delta, version=version)
+
+    def has_key(self, key, version=None):
+        if self._local_get(self.make_and_validate_key(key, version=version)) is not _MISSING:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        self.shared.clear()
+
+    def get_backend_timeout(self, timeout=DEFAULT_TIMEOUT):
+        if timeout is DEFAULT_TIMEOUT:
+            return self.default_timeout
+        return timeout
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+# -- tags ---------------------------------------------------------------------
+
+def _tag_key(tag):
+    return f'cache:tag:{tag}'
+
+
+def get_tag_versions(tags):
+    """Current version token for each tag, creating missing ones."""
+    cache = get_cache()
+    versions = []
+    for tag in tags:
+        version = cache.get(_tag_key(tag))
+        if version is None:
+            cache.add(_tag_key(tag), uuid.uuid4().hex, timeout=None)
+            version = cache.get(_tag_key(tag))
+        versions.append(version)
+    return versions
+
+
+def invalidate_tags(*tags):
+    """Orphan every cached response built from any of `tags`."""
+    cache = get_cache()
+    for tag in tags:
+        cache.set(_tag_key(tag), uuid.uuid4().hex, timeout=None)
+
+
+# -- endpoint policies --------------------------------------------------------
+
+def get_policy(name):
+    policy = {'timeout': DEFAULT_POLICY_TIMEOUT, 'enabled': True}
+    policy.update(getattr(settings, 'CACHE_POLICIES', {}).get(name, {}))
+    return policy
+
+
+def _find_request(args):
+    for arg in args[:2]:
+        if isinstance(arg, HttpRequest) or hasattr(arg, '_request'):
+            return arg
+    raise TypeError('cache_policy: view has no request argument')
+
+
+def _response_key(name, request, tags, vary_on_user):
+    parts = [
+        request.build_absolute_uri(),
+        request.accepted_renderer.format,
+        *get_tag_versions(tags),
+    ]
+    if vary_on_user:
+        parts.append(str(request.user.pk) if request.user.is_authenticated else 'anon')
+    digest = hashlib.md5('|'.join(str(p) for p in parts).encode()).hexdigest()
+    return f'cache:view:{name}:{digest}'
+
+
+def cache_policy(name, tags=(), vary_on_user=False):
+    """
+    Cache successful JSON GET responses of a DRF view (function or method)
+    under the policy `name`. Place it below @api_view / on the get() method.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            request = _find_request(args)
+            policy = get_policy(name)
+            renderer = getattr(request, 'accepted_renderer', None)
+            if (not policy['enabled'] or request.method not in ('GET', 'HEAD')
+                    or renderer is None or renderer.format != 'json'):
+                return view(*args, **kwargs)
+
+            cache = get_cache()
+            key = _response_key(name, request, tags, vary_on_user)
+            cached = cache.get(key)
+            if cached is not None:
+                status_code, data = cached
+                return Response(data, status=status_code)
+
+            response = view(*args, **kwargs)
+            if isinstance(response, Response) and response.status_code == 200:
+                cache.set(key, (response.status_code, response.data), policy['timeout'])
+            return response
+        return wrapper
+    return decorator
@@ -2,6 +2,7 @@
 Django settings for ShopSphere project.
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -106,6 +107,132 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Content-addressed storage for uploaded binaries (see vendor/blobstore.py)
+BLOB_STORAGE = {
+    'BACKEND': 'vendor.blobstore.LocalBlobStorage',
+    'OPTIONS': {'location': MEDIA_ROOT / 'blobs'},
+}
+
+# Product image variants (thumb/medium/large) are rendered on a background
+# thread pool after upload; set IMAGE_VARIANTS_ASYNC = False to render inline.
+IMAGE_VARIANTS_ASYNC = True
+IMAGE_VARIANT_WORKERS = 2
+
+# Caching (see ShopSphere/cache.py).
+# 'default' is the shared tier: Redis when REDIS_URL is set (requires the
+# redis package), otherwise per-process memory for development and tests.
+# 'tiered' adds a per-process LRU in front of it; LOCAL_TIMEOUT bounds how
+# long a worker may serve an entry another worker has replaced.
+REDIS_URL = os.environ.get('REDIS_URL')
+CACHES = {
+    'default': (
+        {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}
+        if REDIS_URL else
+        {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shopsphere'}
+    ),
+    'tiered': {
+        'BACKEND': 'ShopSphere.cache.TwoTierCache',
+        'LOCATION': 'default',
+        'OPTIONS': {'LOCAL_MAX_ENTRIES': 1024, 'LOCAL_TIMEOUT': 5},
+    },
+}
+
+# Per-endpoint response cache policies (seconds). Tag invalidation on
+# Product / Review / Order / VendorProfile writes usually expires entries
+# sooner; the timeout bounds staleness for changes made via bulk updates.
+CACHE_POLICIES = {
+    'catalog': {'timeout': 60},
+    'product_detail': {'timeout': 60},
+    'trending': {'timeout': 300},
+    'most_searched': {'timeout': 300},
+    'search': {'timeout': 60},
+    'admin_dashboard': {'timeout': 30},
+    'admin_reports': {'timeout': 120},
+}
+
+# Delivery agent matching index (deliveryAgent/agent_index.py) is rebuilt from
+# the database at least this often, catching changes made via bulk updates.
+AGENT_INDEX_MAX_AGE = 60
+
+# Agent GPS ingestion (deliveryAgent/location_ingest.py). Pings within
+# LOCATION_MIN_DISTANCE_M of the last stored point are dropped unless
+# LOCATION_HEARTBEAT_SECONDS have passed (0 disables thinning). Points are
+# buffered and bulk-inserted per LOCATION_BUFFER_SIZE rows or
+# LOCATION_BUFFER_MAX_AGE seconds (size 0 writes on every request).
+LOCATION_MIN_DISTANCE_M = 15
+LOCATION_HEARTBEAT_SECONDS = 60
+LOCATION_BUFFER_SIZE = 200
+LOCATION_BUFFER_MAX_AGE = 2
+
+# Live order tracking stream (deliveryAgent/live_tracking.py): Redis pub/sub
+# when REDIS_URL is set, otherwise in-process. Streams send a keepalive every
+# HEARTBEAT seconds and close after MAX_SECONDS; EventSource reconnects.
+LIVE_TRACKING_HEARTBEAT_SECONDS = 15
+LIVE_TRACKING_MAX_SECONDS = 1800
+
+# Tracking history compaction (deliveryAgent/track_compaction.py, run
+# `manage.py compact_tracking` from cron). Finished routes are simplified to
+# within TRACKING_SIMPLIFY_TOLERANCE_M metres; raw points of compacted
+# assignments older than TRACKING_ARCHIVE_AFTER_DAYS move to monthly archives.
+TRACKING_SIMPLIFY_TOLERANCE_M = 10
+TRACKING_ARCHIVE_AFTER_DAYS = 30
+
+# Product search (user/search.py). SEARCH_BACKEND is 'auto' (the FTS5 table
+# when the SQLite build has FTS5, otherwise an in-process inverted index),
+# 'fts5' or 'memory'. The in-process index is rebuilt from the database at
+# least every SEARCH_INDEX_MAX_AGE seconds.
+SEARCH_BACKEND = 'auto'
+SEARCH_INDEX_MAX_AGE = 300
+
+# Search logging (user/search_logging.py). log_search events are buffered per
+# process and written with bulk_create once SEARCH_LOG_BUFFER_SIZE are pending
+# or the oldest is SEARCH_LOG_BUFFER_MAX_AGE seconds old (size 0 writes on
+# every request), together with hourly per-query counts. `manage.py
+# prune_search_logs` (cron) deletes raw SearchLog rows after
+# SEARCH_LOG_RETENTION_DAYS and hourly counts after SEARCH_ROLLUP_RETENTION_DAYS.
+SEARCH_LOG_BUFFER_SIZE = 200
+SEARCH_LOG_BUFFER_MAX_AGE = 5
+SEARCH_LOG_RETENTION_DAYS = 14
+SEARCH_ROLLUP_RETENTION_DAYS = 90
+
+# Most-searched ranking (user/search_ranking.py), precomputed by
+# `manage.py refresh_most_searched` from cron: the top MOST_SEARCHED_TOP_N
+# products overall and per category, from searches of the last
+# MOST_SEARCHED_WINDOW_DAYS days.
+MOST_SEARCHED_WINDOW_DAYS = 30
+MOST_SEARCHED_TOP_N = 10
+
+# Trending ranking (user/trending.py), precomputed by `manage.py
+# refresh_trending` from cron: reviews, units sold and searches of the last
+# TRENDING_WINDOW_DAYS days, each halved in weight every
+# TRENDING_HALF_LIFE_HOURS; the top TRENDING_TOP_K overall and per category.
+TRENDING_WINDOW_DAYS = 7
+TRENDING_HALF_LIFE_HOURS = 48
+TRENDING_TOP_K = 10
+
+# Admin report (superAdmin/metrics.py): reading it rolls up at most
+# PLATFORM_METRICS_CATCH_UP_DAYS closed days; a longer gap is backfilled by
+# `manage.py rollup_platform_metrics`.
+PLATFORM_METRICS_CATCH_UP_DAYS = 7
+
+# Batch assignment (deliveryAgent/batch_assignment.py): largest backlog and
+# slots per agent an admin may solve in one POST /superAdmin/api/batch-assignment/
+# (the assign_pending_orders command is not bounded).
+BATCH_ASSIGN_MAX_LIMIT = 1000
+BATCH_ASSIGN_MAX_SLOTS_PER_AGENT = 5
+
+# Multi-drop delivery runs (deliveryAgent/route_batching.py, run
+# `manage.py plan_delivery_runs`). Packed orders from one vendor, or to one
+# pincode prefix of ROUTE_PINCODE_PREFIX digits, go to a single agent in runs
+# of at most ROUTE_MAX_STOPS stops. Groups above ROUTE_TOUR_MAX_STOPS are cut
+# into spatial parts before routing. POST /superAdmin/api/route-batching/
+# accepts at most ROUTE_MAX_RUN_LIMIT orders and ROUTE_MAX_RUN_STOPS stops.
+ROUTE_MAX_STOPS = 8
+ROUTE_PINCODE_PREFIX = 3
+ROUTE_TOUR_MAX_STOPS = 200
+ROUTE_MAX_RUN_LIMIT = 1000
+ROUTE_MAX_RUN_STOPS = 25
+
 # Authentication
 AUTH_USER_MODEL = 'user.AuthUser'
 
@@ -100,7 +100,7 @@ def product_list(request):
     block_filter = request.GET.get('blocked', '')
     vendor_filter = request.GET.get('vendor', '')
 
-    products = Product.objects.all().select_related('vendor')
+    products = Product.objects.all().select_related('vendor').defer(*VendorProfile.document_defer_paths('vendor'))
 
     if block_filter == 'blocked':
         products = products.filter(is_blocked=True)
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from .models import (
-    DeliveryAgentProfile, DeliveryAssignment, DeliveryTracking,
+    DeliveryAgentProfile, DeliveryAssignment, DeliveryRun, DeliveryTracking, DeliveryTrackingArchive,
     DeliveryCommission, DeliveryPayment, DeliveryDailyStats, DeliveryFeedback
 )
 
@@ -29,12 +29,24 @@ class DeliveryAssignmentAdmin(admin.ModelAdmin):
     search_fields = ['agent__user__username', 'order__id']
     readonly_fields = ['assigned_at', 'accepted_at', 'started_at', 'completed_at']
 
+@admin.register(DeliveryRun)
+class DeliveryRunAdmin(admin.ModelAdmin):
+    list_display = ['id', 'agent', 'group_key', 'status', 'stop_count', 'total_distance', 'created_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['agent__user__username', 'group_key']
+    readonly_fields = ['created_at', 'completed_at']
+
 @admin.register(DeliveryTracking)
 class DeliveryTrackingAdmin(admin.ModelAdmin):
     list_display = ['delivery_assignment', 'latitude', 'longitude', 'status', 'tracked_at']
     list_filter = ['status', 'tracked_at']
     search_fields = ['delivery_assignment__order__id']
 
+@admin.register(DeliveryTrackingArchive)
+class DeliveryTrackingArchiveAdmin(admin.ModelAdmin):
+    list_display = ['month', 'row_count', 'size', 'first_tracked_at', 'last_tracked_at', 'created_at']
+    readonly_fields = ['blob_hash', 'created_at']
+
 @admin.register(DeliveryCommission)
 class DeliveryCommissionAdmin(admin.ModelAdmin):
     list_display = ['agent', 'total_commission', 'status', 'created_at']
@@ -0,0 +1,397 @@
+"""
+deliveryAgent/agent_index.py
+
+In-memory index of delivery agents who can take a new order right now
+(approved, available, active, not blocked), used by auto-assignment.
+
+Agents are bucketed by exact pincode, 3-digit pincode region and city, and,
+when their coordinates are known, by a lat/lon grid cell (GRID_CELL_DEG).
+candidates() returns the k nearest eligible agents of the best matching tier
+(pincode > region > city) with a ring search over the grid, so a lookup
+touches only the handful of cells around the delivery point.
+
+The index lives per process. DeliveryAgentProfile saves update it in place
+(see signals.py) and publish a version stamp in the shared cache after
+commit; other workers rebuild on their next lookup, and every index is
+rebuilt at least every AGENT_INDEX_MAX_AGE seconds. Callers must re-check
+the agents they pick against the database (find_best_agent() does).
+"""
+import heapq
+import math
+import threading
+import time
+import uuid
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .geo import KM_PER_DEG, haversine_km
+
+VERSION_CACHE_KEY = 'delivery:agent_index:version'
+GRID_CELL_DEG = 0.02          # ~2.2 km of latitude
+BRUTE_FORCE_LIMIT = 64        # tiers this small are ranked without the grid
+UNRANKED_POOL_SIZE = 200      # candidates returned when the delivery point has no coordinates
+ACTIVE_ASSIGNMENT_STATUSES = ('assigned', 'accepted', 'picked_up', 'in_transit')
+
+TIER_PINCODE, TIER_REGION, TIER_CITY = 1, 2, 3
+
+AgentEntry = namedtuple('AgentEntry', ['id', 'lat', 'lon', 'city', 'pincodes', 'regions', 'cities'])
+
+
+def is_eligible(agent):
+    return (
+        agent.approval_status == 'approved'
+        and agent.availability_status == 'available'
+        and agent.is_active
+        and not agent.is_blocked
+    )
+
+
+def make_entry(agent_id, latitude, longitude, city, postal_code, service_cities, service_pincodes):
+    pincodes = {str(p).strip() for p in (service_pincodes or []) if p}
+    if postal_code:
+        pincodes.add(postal_code.strip())
+    cities = {c.strip().lower() for c in (service_cities or []) if c}
+    city = (city or '').strip().lower()
+    if city:
+        cities.add(city)
+    return AgentEntry(
+        id=agent_id,
+        lat=float(latitude) if latitude is not None else None,
+        lon=float(longitude) if longitude is not None else None,
+        city=city,
+        pincodes=frozenset(pincodes),
+        regions=frozenset(p[:3] for p in pincodes if len(p) >= 3),
+        cities=frozenset(cities),
+    )
+
+
+class AgentIndex:
+
+    def __init__(self, cell_deg=GRID_CELL_DEG):
+        self.cell_deg = cell_deg
+        self.entries = {}
+        self.by_pincode = defaultdict(set)
+        self.by_region = defaultdict(set)
+        self.by_city = defaultdict(set)
+        self.grid = defaultdict(set)
+        self.extent = None            # (min row, max row, min col, max col) of linked cells
+        self.version = None
+        self.built_at = 0.0
+        self._lock = threading.RLock()
+
+    # -- maintenance --------------------------------------------------------
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
+
+    def _unlink(self, entry):
+        for key in entry.pincodes:
+            self.by_pincode[key].discard(entry.id)
+        for key in entry.regions:
+            self.by_region[key].discard(entry.id)
+        for key in entry.cities:
+            self.by_city[key].discard(entry.id)
+        if entry.lat is not None and entry.lon is not None:
+            self.grid[self._cell(entry.lat, entry.lon)].discard(entry.id)
+
+    def _link(self, entry):
+        for key in entry.pincodes:
+            self.by_pincode[key].add(entry.id)
+        for key in entry.regions:
+            self.by_region[key].add(entry.id)
+        for key in entry.cities:
+            self.by_city[key].add(entry.id)
+        if entry.lat is not None and entry.lon is not None:
+            cell = self._cell(entry.lat, entry.lon)
+            self.grid[cell].add(entry.id)
+            if self.extent is None:
+                self.extent = (cell[0], cell[0], cell[1], cell[1])
+            else:
+                min_row, max_row, min_col, max_col = self.extent
+                self.extent = (min(min_row, cell[0]), max(max_row, cell[0]),
+                               min(min_col, cell[1]), max(max_col, cell[1]))
+
+    def upsert(self, entry):
+        with self._lock:
+            previous = self.entries.get(entry.id)
+            if previous is not None:
+                self._unlink(previous)
+            self.entries[entry.id] = entry
+            self._link(entry)
+
+    def remove(self, agent_id):
+        with self._lock:
+            previous = self.entries.pop(agent_id, None)
+            if previous is not None:
+                self._unlink(previous)
+
+    def move(self, agent_id, latitude, longitude):
+        """Record a new position for an indexed agent (no-op if not indexed)."""
+        with self._lock:
+            entry = self.entries.get(agent_id)
+            if entry is not None:
+                self.upsert(entry._replace(lat=float(latitude), lon=float(longitude)))
+
+    def sync(self, agent):
+        """Add, refresh or drop `agent` according to its current eligibility."""
+        if is_eligible(agent):
+            self.upsert(make_entry(
+                agent.id, agent.latitude, agent.longitude, agent.city, agent.postal_code,
+                agent.service_cities, agent.service_pincodes,
+            ))
+        else:
+            self.remove(agent.id)
+
+    def rebuild(self, version=None):
+        from .models import DeliveryAgentProfile
+
+        rows = DeliveryAgentProfile.objects.filter(
+            approval_status='approved',
+            availability_status='available',
+            is_blocked=False,
+            is_active=True,
+        ).values_list('id', 'latitude', 'longitude', 'city', 'postal_code', 'service_cities', 'service_pincodes')
+        with self._lock:
+            self.entries.clear()
+            for buckets in (self.by_pincode, self.by_region, self.by_city, self.grid):
+                buckets.clear()
+            self.extent = None
+            for row in rows:
+                self.upsert(make_entry(*row))
+            self.version = version
+            self.built_at = time.monotonic()
+
+    # -- queries ------------------------------------------------------------
+
+    def best_tier(self, pincode, city, state=''):
+        """
+        (tier, buckets, predicate) for the best tier with any eligible agent:
+        the id sets making up the tier and a test for a single entry. Never
+        copies buckets, so the cost does not grow with the number of agents.
+        """
+        pincode = (pincode or '').strip()
+        city = (city or '').strip().lower()
+        state = (state or '').strip().lower()
+
+        if pincode and self.by_pincode.get(pincode):
+            return TIER_PINCODE, [self.by_pincode[pincode]], lambda e: pincode in e.pincodes
+        # Every agent serving `pincode` is also in its region bucket, so with
+        # tier 1 empty the region bucket holds exactly the tier 2 agents.
+        region = pincode[:3] if len(pincode) >= 3 else None
+        if region and self.by_region.get(region):
+            return TIER_REGION, [self.by_region[region]], lambda e: region in e.regions
+        buckets = [self.by_city[key] for key in (city, state) if key and self.by_city.get(key)]
+        if buckets:
+            return TIER_CITY, buckets, lambda e: city in e.cities or (state and state in e.cities)
+        return None, [], None
+
+    def nearest(self, buckets, predicate, lat, lon, k):
+        """
+        The k agents of `buckets` closest to (lat, lon) as (distance_km, agent_id),
+        nearest first; agents without coordinates follow with distance inf.
+        """
+        size = sum(len(bucket) for bucket in buckets)
+        if lat is None or lon is None:
+            # Nothing to rank by: hand back a wide pool so the caller can
+            # balance on active load instead.
+            pool = {}
+            for bucket in buckets:
+                for agent_id in bucket:
+                    pool[agent_id] = (math.inf, agent_id)
+                    if len(pool) >= max(k, UNRANKED_POOL_SIZE):
+                        return list(pool.values())
+            return list(pool.values())
+
+        if size <= BRUTE_FORCE_LIMIT:
+            members = set().union(*buckets)
+            ranked = sorted(
+                (haversine_km(lat, lon, self.entries[m].lat, self.entries[m].lon), m)
+                for m in members
+            )
+            return ranked[:k]
+
+        # Ring search: after scanning rings 0..r, any unscanned agent is at
+        # least r cell widths plus the gap to the query cell's nearest edge
+        # away, so stop once the k-th best distance is within that.
+        row, col = self._cell(lat, lon)
+        lat_km = self.cell_deg * KM_PER_DEG
+        lon_km = lat_km * max(math.cos(math.radians(lat)), 0.01)
+        cell_km = min(lat_km, lon_km)
+        edge_km = min(
+            (lat / self.cell_deg - row) * lat_km, (row + 1 - lat / self.cell_deg) * lat_km,
+            (lon / self.cell_deg - col) * lon_km, (col + 1 - lon / self.cell_deg) * lon_km,
+        )
+        min_row, max_row, min_col, max_col = self.extent or (row, row - 1, col, col)
+        max_r = max(row - min_row, max_row - row, col - min_col, max_col - col)
+        best, r = [], 0
+        while r <= max_r:
+            for i in range(row - r, row + r + 1):
+                for j in range(col - r, col + r + 1):
+                    if r and abs(i - row) != r and abs(j - col) != r:
+                        continue
+                    for m in self.grid.get((i, j), ()):
+                        entry = self.entries[m]
+                        if predicate(entry):
+                            heapq.heappush(best, (-haversine_km(lat, lon, entry.lat, entry.lon), m))
+                            if len(best) > k:
+                                heapq.heappop(best)
+            if len(best) >= k and -best[0][0] <= r * cell_km + edge_km:
+                break
+            r += 1
+        ranked = sorted((-d, m) for d, m in best)
+        if len(ranked) < k:
+            for bucket in buckets:
+                ranked.extend((math.inf, m) for m in bucket if self.entries[m].lat is None)
+        return ranked[:k]
+
+    def serving(self, pincode, city, state=''):
+        """{agent_id: best tier} for every indexed agent serving the address, across all tiers."""
+        pincode = (pincode or '').strip()
+        city = (city or '').strip().lower()
+        state = (state or '').strip().lower()
+        region = pincode[:3] if len(pincode) >= 3 else None
+        tiers = {}
+        with self._lock:
+            # Worst tier first so better tiers overwrite it.
+            for tier, buckets, keys in (
+                (TIER_CITY, self.by_city, (city, state)),
+                (TIER_REGION, self.by_region, (region,)),
+                (TIER_PINCODE, self.by_pincode, (pincode,)),
+            ):
+                for key in keys:
+                    if key:
+                        tiers.update(dict.fromkeys(buckets.get(key, ()), tier))
+        return tiers
+
+    def snapshot(self):
+        """List of the indexed AgentEntry tuples."""
+        with self._lock:
+            return list(self.entries.values())
+
+    def candidates(self, pincode, city, state='', lat=None, lon=None, k=10):
+        """(tier, [(distance_km, agent_id), ...]) for the best non-empty tier, or (None, [])."""
+        with self._lock:
+            tier, buckets, predicate = self.best_tier(pincode, city, state)
+            if tier is None:
+                return None, []
+            return tier, self.nearest(buckets, predicate, lat, lon, k)
+
+
+_index = AgentIndex()
+_index_lock = threading.Lock()
+
+
+def _shared_version():
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(VERSION_CACHE_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(VERSION_CACHE_KEY)
+    return version
+
+
+def get_agent_index():
+    """The process index, rebuilt when another worker changed availability or it aged out."""
+    version = _shared_version()
+    max_age = getattr(settings, 'AGENT_INDEX_MAX_AGE', 60)
+    if _index.version != version or time.monotonic() - _index.built_at > max_age:
+        with _index_lock:
+            if _index.version != version or time.monotonic() - _index.built_at > max_age:
+                _index.rebuild(version)
+    return _index
+
+
+def publish_agent_change(agent):
+    """Apply an agent save to this process's index and tell other workers after commit."""
+    publish_agent_changes([agent])
+
+
+def publish_agent_changes(agents):
+    """publish_agent_change() for a batch of agents, with a single version stamp."""
+    for agent in agents:
+        _index.sync(agent)
+
+    def publish():
+        version = uuid.uuid4().hex
+        cache.set(VERSION_CACHE_KEY, version, timeout=None)
+        if _index.version is not None:
+            _index.version = version
+
+    transaction.on_commit(publish)
+
+
+def record_agent_location(agent_id, latitude, longitude):
+    """Store an agent's last known position and move it in this process's index."""
+    from decimal import Decimal
+    from django.utils import timezone
+    from .models import DeliveryAgentProfile
+
+    DeliveryAgentProfile.objects.filter(id=agent_id).update(
+        latitude=Decimal(str(round(float(latitude), 6))),
+        longitude=Decimal(str(round(float(longitude), 6))),
+        last_location_update=timezone.now(),
+    )
+    _index.move(agent_id, latitude, longitude)
+
+
+def active_assignment_counts(agent_ids):
+    """{agent_id: active assignment count} from one grouped query."""
+    from .models import DeliveryAssignment
+
+    rows = (
+        DeliveryAssignment.objects
+        .filter(agent_id__in=agent_ids, status__in=ACTIVE_ASSIGNMENT_STATUSES)
+        .values('agent_id')
+        .annotate(active=Count('id'))
+    )
+    counts = {agent_id: 0 for agent_id in agent_ids}
+    counts.update({row['agent_id']: row['active'] for row in rows})
+    return counts
+
+
+def find_best_agent(delivery_address, k=10):
+    """
+    Pick the agent for a delivery: best matching tier, then nearest, then
+    fewest active assignments. Returns (agent, tier) or (None, None).
+    Costs two queries: eligibility re-check of the k candidates and their loads.
+    """
+    from .models import DeliveryAgentProfile
+
+    if delivery_address is None:
+        return None, None
+
+    lat = getattr(delivery_address, 'latitude', None)
+    lon = getattr(delivery_address, 'longitude', None)
+    tier, ranked = get_agent_index().candidates(
+        delivery_address.pincode,
+        delivery_address.city,
+        delivery_address.state,
+        float(lat) if lat is not None else None,
+        float(lon) if lon is not None else None,
+        k=k,
+    )
+    if not ranked:
+        return None, None
+
+    agents = {
+        agent.id: agent
+        for agent in DeliveryAgentProfile.objects.select_related('user').filter(
+            id__in=[agent_id for _, agent_id in ranked],
+            approval_status='approved',
+            availability_status='available',
+            is_blocked=False,
+            is_active=True,
+        )
+    }
+    if not agents:
+        return None, None
+
+    loads = active_assignment_counts(list(agents))
+    distance, agent_id = min(
+        ((d, a) for d, a in ranked if a in agents),
+        key=lambda pair: (pair[0], loads[pair[1]]),
+    )
+    return agents[agent_id], tier
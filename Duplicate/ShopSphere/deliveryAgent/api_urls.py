@@ -14,6 +14,7 @@ from .order_lifecycle_views import (
     NearbyOTPView,
     VerifyDeliveryOTPView,
     CustomerOrderTrackingView,
+    customer_order_tracking_stream,
 )
 
 # Create router for viewsets
@@ -55,6 +56,7 @@ urlpatterns = [
 
     # ── Customer order tracking API
     path('track/<str:order_number>/', CustomerOrderTrackingView.as_view(), name='customer_order_tracking'),
+    path('track/<str:order_number>/stream/', customer_order_tracking_stream, name='customer_order_tracking_stream'),
     
     # Routed endpoints
     path('', include(router.urls)),
@@ -22,10 +22,20 @@ from .serializers import (
     DeliveryCommissionSerializer, DeliveryPaymentSerializer,
     DeliveryDailyStatsSerializer, DeliveryFeedbackSerializer
 )
+from .pagination import AssignmentCursorPagination
 from user.models import Order
+from vendor.blob_http import read_upload, document_response
 
 User = get_user_model()
 
+# Upload form field -> model field prefix for agent documents
+AGENT_DOCUMENT_UPLOADS = {
+    'vehicle_registration': 'vehicle_registration',
+    'vehicle_insurance': 'vehicle_insurance',
+    'license_file': 'license_file',
+    'id_proof_file': 'id_proof',
+}
+
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 20
@@ -49,12 +59,14 @@ class DeliveryAgentProfileViewSet(viewsets.ViewSet):
             
             # Handle Binary File Uploads
             files_saved = False
-            for field in ['vehicle_registration', 'vehicle_insurance', 'license_file', 'id_proof_file']:
+            for field, prefix in AGENT_DOCUMENT_UPLOADS.items():
                 if field in request.FILES:
                     f = request.FILES[field]
-                    setattr(agent, f"{field}_data", f.read())
-                    setattr(agent, f"{field}_mimetype", f.content_type)
-                    setattr(agent, f"{field}_filename", f.name)
+                    data, digest = read_upload(f)
+                    setattr(agent, f"{prefix}_data", data)
+                    setattr(agent, f"{prefix}_hash", digest)
+                    setattr(agent, f"{prefix}_mimetype", f.content_type)
+                    setattr(agent, f"{prefix}_filename", f.name)
                     files_saved = True
             
             if files_saved:
@@ -102,12 +114,14 @@ class DeliveryAgentProfileViewSet(viewsets.ViewSet):
                     setattr(agent, field, request.data[field])
             
             # Handle Binary File Updates
-            for field in ['vehicle_registration', 'vehicle_insurance', 'license_file', 'id_proof_file']:
+            for field, prefix in AGENT_DOCUMENT_UPLOADS.items():
                 if field in request.FILES:
                     f = request.FILES[field]
-                    setattr(agent, f"{field}_data", f.read())
-                    setattr(agent, f"{field}_mimetype", f.content_type)
-                    setattr(agent, f"{field}_filename", f.name)
+                    data, digest = read_upload(f)
+                    setattr(agent, f"{prefix}_data", data)
+                    setattr(agent, f"{prefix}_hash", digest)
+                    setattr(agent, f"{prefix}_mimetype", f.content_type)
+                    setattr(agent, f"{prefix}_filename", f.name)
             
             agent.save()
             serializer = DeliveryAgentProfileDetailSerializer(agent)
@@ -148,7 +162,22 @@ class DeliveryAgentProfileViewSet(viewsets.ViewSet):
 class DeliveryAssignmentViewSet(viewsets.ViewSet):
     """Delivery assignment management for agents"""
     permission_classes = [IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = AssignmentCursorPagination
+
+    def _list_response(self, request, queryset):
+        """
+        Serialize an assignment list with the serializer's prefetch plan.
+        Cursor-paginated when the client asks for it (?cursor= / ?page_size=);
+        the agent app expects the plain list otherwise.
+        """
+        queryset = DeliveryAssignmentListSerializer.setup_eager_loading(queryset)
+        paginator = self.pagination_class()
+        if paginator.is_requested(request):
+            page = paginator.paginate_queryset(queryset, request, view=self)
+            serializer = DeliveryAssignmentListSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+        serializer = DeliveryAssignmentListSerializer(queryset.order_by(*paginator.ordering), many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
     
     def list(self, request):
         """Get all assigned deliveries for agent"""
@@ -156,13 +185,12 @@ class DeliveryAssignmentViewSet(viewsets.ViewSet):
             agent = DeliveryAgentProfile.objects.get(user=request.user)
             
             status_filter = request.query_params.get('status')
-            queryset = DeliveryAssignment.objects.filter(agent=agent).order_by('-assigned_at')
+            queryset = DeliveryAssignment.objects.filter(agent=agent)
             
             if status_filter:
                 queryset = queryset.filter(status=status_filter)
             
-            serializer = DeliveryAssignmentListSerializer(queryset, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return self._list_response(request, queryset)
         except DeliveryAgentProfile.DoesNotExist:
             return Response({'error': 'Agent profile not found'}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
@@ -173,7 +201,7 @@ class DeliveryAssignmentViewSet(viewsets.ViewSet):
         try:
             agent = DeliveryAgentProfile.objects.get(user=request.user)
             assignment = DeliveryAssignment.objects.get(id=pk, agent=agent)
-            serializer = DeliveryAssignmentDetailSerializer(assignment)
+            serializer = DeliveryAssignmentDetailSerializer(assignment, context={'request': request})
             return Response(serializer.data, status=status.HTTP_200_OK)
         except DeliveryAgentProfile.DoesNotExist:
             return Response({'error': 'Agent profile not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -193,7 +221,7 @@ class DeliveryAssignmentViewSet(viewsets.ViewSet):
                 return Response({'error': 'Only assigned deliveries can be accepted'}, status=status.HTTP_400_BAD_REQUEST)
             
             assignment.accept_delivery()
-            serializer = DeliveryAssignmentDetailSerializer(assignment)
+            serializer = DeliveryAssignmentDetailSerializer(assignment, context={'request': request})
             return Response(serializer.data, status=status.HTTP_200_OK)
         except (DeliveryAgentProfile.DoesNotExist, DeliveryAssignment.DoesNotExist):
             return Response({'error': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -211,7 +239,7 @@ class DeliveryAssignmentViewSet(viewsets.ViewSet):
                 return Response({'error': 'Delivery must be accepted first'}, status=status.HTTP_400_BAD_REQUEST)
             
             assignment.start_delivery()
-            serializer = DeliveryAssignmentDetailSerializer(assignment)
+            serializer = DeliveryAssignmentDetailSerializer(assignment, context={'request': request})
             return Response(serializer.data, status=status.HTTP_200_OK)
         except (DeliveryAgentProfile.DoesNotExist, DeliveryAssignment.DoesNotExist):
             return Response({'error': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -229,7 +257,7 @@ class DeliveryAssignmentViewSet(viewsets.ViewSet):
                 return Response({'error': 'Delivery must be picked up first'}, status=status.HTTP_400_BAD_REQUEST)
             
             assignment.mark_in_transit()
-            serializer = DeliveryAssignmentDetailSerializer(assignment)
+            serializer = DeliveryAssignmentDetailSerializer(assignment, context={'request': request})
             return Response(serializer.data, status=status.HTTP_200_OK)
         except (DeliveryAgentProfile.DoesNotExist, DeliveryAssignment.DoesNotExist):
             return Response({'error': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -242,6 +270,7 @@ class DeliveryAssignmentViewSet(viewsets.ViewSet):
         try:
             agent = DeliveryAgentProfile.objects.get(user=request.user)
             assignment = DeliveryAssignment.objects.select_related('order', 'order__user').get(id=pk, agent=agent)
+            assignment.agent = agent
 
             if assignment.status not in ['picked_up', 'in_transit']:
                 return Response({'error': 'Delivery must be in transit or picked up to complete'}, status=status.HTTP_400_BAD_REQUEST)
@@ -256,35 +285,38 @@ class DeliveryAssignmentViewSet(viewsets.ViewSet):
                 return Response({'error': 'Incorrect OTP. Please ask the customer to check their email or in-app notification.'}, status=status.HTTP_400_BAD_REQUEST)
 
             # Handle optional proof of delivery (Binary Storage)
+            proof_fields = []
             if 'signature_image' in request.FILES:
                 sig_file = request.FILES['signature_image']
-                assignment.signature_image_data = sig_file.read()
+                assignment.signature_image_data, assignment.signature_image_hash = read_upload(sig_file)
                 assignment.signature_image_mimetype = sig_file.content_type
                 assignment.signature_image_filename = sig_file.name
+                proof_fields += ['signature_image_data', 'signature_image_mimetype', 'signature_image_filename', 'signature_image_hash']
                 
             if 'delivery_photo' in request.FILES:
                 photo_file = request.FILES['delivery_photo']
-                assignment.delivery_photo_data = photo_file.read()
+                assignment.delivery_photo_data, assignment.delivery_photo_hash = read_upload(photo_file)
                 assignment.delivery_photo_mimetype = photo_file.content_type
                 assignment.delivery_photo_filename = photo_file.name
-
-            assignment.otp_verified = True
-            assignment.save(update_fields=[
-                'otp_verified', 
-                'signature_image_data', 'signature_image_mimetype', 'signature_image_filename',
-                'delivery_photo_data', 'delivery_photo_mimetype', 'delivery_photo_filename'
-            ])
+                proof_fields += ['delivery_photo_data', 'delivery_photo_mimetype', 'delivery_photo_filename', 'delivery_photo_hash']
 
             from django.db import transaction
+            from .completion import complete_delivery
 
             with transaction.atomic():
-                assignment.mark_delivered()
-
-                agent.total_deliveries += 1
-                agent.completed_deliveries += 1
-                agent.save()
+                if proof_fields:
+                    assignment.save(update_fields=proof_fields)
+                # Counters (agent totals included) are updated by complete_delivery.
+                if complete_delivery(assignment, otp_verified=True) is None:
+                    return Response({'error': 'This delivery has already been completed'}, status=status.HTTP_409_CONFLICT)
+                from user.models import OrderStatusHistory
+                OrderStatusHistory.objects.create(
+                    order=assignment.order,
+                    status='delivered',
+                    notes='OTP verified by delivery agent. Order delivered successfully.',
+                )
 
-            serializer = DeliveryAssignmentDetailSerializer(assignment)
+            serializer = DeliveryAssignmentDetailSerializer(assignment, context={'request': request})
             return Response(serializer.data, status=status.HTTP_200_OK)
         except (DeliveryAgentProfile.DoesNotExist, DeliveryAssignment.DoesNotExist):
             return Response({'error': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -321,10 +353,9 @@ class DeliveryAssignmentViewSet(viewsets.ViewSet):
             active = DeliveryAssignment.objects.filter(
                 agent=agent,
                 status__in=['assigned', 'accepted', 'picked_up', 'in_transit']
-            ).order_by('-assigned_at')
+            )
             
-            serializer = DeliveryAssignmentListSerializer(active, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return self._list_response(request, active)
         except DeliveryAgentProfile.DoesNotExist:
             return Response({'error': 'Agent profile not found'}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
@@ -339,38 +370,45 @@ class DeliveryTrackingViewSet(viewsets.ViewSet):
     """Real-time delivery tracking"""
     permission_classes = [IsAuthenticated]
     
+    def _ingest(self, request, pk):
+        from .location_ingest import InvalidLocation, ingest_points, parse_points
+
+        assignment = (
+            DeliveryAssignment.objects.filter(id=pk, agent__user=request.user)
+            .only('id', 'agent_id', 'order_id').first()
+        )
+        if assignment is None:
+            return None, Response({'error': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            points = parse_points(request.data)
+        except InvalidLocation as e:
+            return None, Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return (points, ingest_points(assignment, points)), None
+
     @action(detail=True, methods=['post'])
     def update_location(self, request, pk=None):
         """Update current delivery location (real-time tracking)"""
-        try:
-            agent = DeliveryAgentProfile.objects.get(user=request.user)
-            assignment = DeliveryAssignment.objects.get(id=pk, agent=agent)
-            
-            # Create tracking record
-            tracking = DeliveryTracking.objects.create(
-                delivery_assignment=assignment,
-                latitude=request.data.get('latitude'),
-                longitude=request.data.get('longitude'),
-                address=request.data.get('address', ''),
-                status=request.data.get('status', 'In Transit'),
-                speed=request.data.get('speed', None),
-                notes=request.data.get('notes', '')
-            )
-            
-            # Update assignment current location
-            assignment.current_location = {
-                'latitude': float(request.data.get('latitude', 0)),
-                'longitude': float(request.data.get('longitude', 0)),
-                'address': request.data.get('address', '')
-            }
-            assignment.save()
-            
-            serializer = DeliveryTrackingSerializer(tracking)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        except (DeliveryAgentProfile.DoesNotExist, DeliveryAssignment.DoesNotExist):
-            return Response({'error': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        result, error = self._ingest(request, pk)
+        if error:
+            return error
+        points, kept = result
+        if not kept:
+            # Stationary ping dropped by thinning; the last stored point still stands.
+            return Response({'recorded': False}, status=status.HTTP_200_OK)
+        serializer = DeliveryTrackingSerializer(kept[-1])
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def locations(self, request, pk=None):
+        """
+        Batched location upload: {"points": [{"latitude", "longitude",
+        "recorded_at", "status", "speed", "address", "notes"}, ...]}
+        """
+        result, error = self._ingest(request, pk)
+        if error:
+            return error
+        points, kept = result
+        return Response({'received': len(points), 'recorded': len(kept)}, status=status.HTTP_202_ACCEPTED)
     
     @action(detail=True, methods=['get'])
     def get_tracking_history(self, request, pk=None):
@@ -378,7 +416,9 @@ class DeliveryTrackingViewSet(viewsets.ViewSet):
         try:
             agent = DeliveryAgentProfile.objects.get(user=request.user)
             assignment = DeliveryAssignment.objects.get(id=pk, agent=agent)
-            
+
+            from .location_ingest import flush_location_buffer
+            flush_location_buffer()
             tracking = DeliveryTracking.objects.filter(
                 delivery_assignment=assignment
             ).order_by('-tracked_at')
@@ -644,7 +684,8 @@ class DeliveryAgentDashboardView(generics.RetrieveAPIView):
     
     def get_object(self):
         try:
-            return DeliveryAgentProfile.objects.get(user=self.request.user)
+            # The snapshot (dashboard.py) comes along in the same query.
+            return DeliveryAgentProfile.objects.select_related('user', 'dashboard').get(user=self.request.user)
         except DeliveryAgentProfile.DoesNotExist:
             from django.http import Http404
             raise Http404("Delivery agent profile not found")
@@ -827,62 +868,57 @@ class UpdateOrderStatusView(APIView):
         }, status=status.HTTP_200_OK)
 
 
-from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 
+def _serve_agent_document(request, agent_id, prefix):
+    agent = get_object_or_404(DeliveryAgentProfile, id=agent_id)
+    response = document_response(request, agent, prefix, 'application/pdf', last_modified=agent.updated_at)
+    if response is None:
+        return Response({'error': 'Data not found'}, status=404)
+    return response
+
+def _serve_assignment_document(request, assignment_id, prefix, default_content_type):
+    assignment = get_object_or_404(DeliveryAssignment, id=assignment_id)
+    response = document_response(request, assignment, prefix, default_content_type)
+    if response is None:
+        return Response({'error': 'Data not found'}, status=404)
+    return response
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def serve_agent_vehicle_registration(request, agent_id):
     """Serve agent vehicle registration from BinaryField"""
-    agent = get_object_or_404(DeliveryAgentProfile, id=agent_id)
-    if not agent.vehicle_registration_data:
-        return Response({'error': 'Data not found'}, status=404)
-    return HttpResponse(agent.vehicle_registration_data, content_type=agent.vehicle_registration_mimetype or 'application/pdf')
+    return _serve_agent_document(request, agent_id, 'vehicle_registration')
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def serve_agent_vehicle_insurance(request, agent_id):
     """Serve agent vehicle insurance from BinaryField"""
-    agent = get_object_or_404(DeliveryAgentProfile, id=agent_id)
-    if not agent.vehicle_insurance_data:
-        return Response({'error': 'Data not found'}, status=404)
-    return HttpResponse(agent.vehicle_insurance_data, content_type=agent.vehicle_insurance_mimetype or 'application/pdf')
+    return _serve_agent_document(request, agent_id, 'vehicle_insurance')
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def serve_agent_license(request, agent_id):
     """Serve agent license from BinaryField"""
-    agent = get_object_or_404(DeliveryAgentProfile, id=agent_id)
-    if not agent.license_file_data:
-        return Response({'error': 'Data not found'}, status=404)
-    return HttpResponse(agent.license_file_data, content_type=agent.license_file_mimetype or 'application/pdf')
+    return _serve_agent_document(request, agent_id, 'license_file')
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def serve_agent_id_proof(request, agent_id):
     """Serve agent ID proof from BinaryField"""
-    agent = get_object_or_404(DeliveryAgentProfile, id=agent_id)
-    if not agent.id_proof_data:
-        return Response({'error': 'Data not found'}, status=404)
-    return HttpResponse(agent.id_proof_data, content_type=agent.id_proof_mimetype or 'application/pdf')
+    return _serve_agent_document(request, agent_id, 'id_proof')
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def serve_delivery_signature(request, assignment_id):
     """Serve delivery signature from BinaryField"""
-    assignment = get_object_or_404(DeliveryAssignment, id=assignment_id)
-    if not assignment.signature_image_data:
-        return Response({'error': 'Data not found'}, status=404)
-    return HttpResponse(assignment.signature_image_data, content_type=assignment.signature_image_mimetype or 'image/png')
+    return _serve_assignment_document(request, assignment_id, 'signature_image', 'image/png')
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def serve_delivery_photo(request, assignment_id):
     """Serve delivery photo from BinaryField"""
-    assignment = get_object_or_404(DeliveryAssignment, id=assignment_id)
-    if not assignment.delivery_photo_data:
-        return Response({'error': 'Data not found'}, status=404)
-    return HttpResponse(assignment.delivery_photo_data, content_type=assignment.delivery_photo_mimetype or 'image/jpeg')
+    return _serve_assignment_document(request, assignment_id, 'delivery_photo', 'image/jpeg')
 
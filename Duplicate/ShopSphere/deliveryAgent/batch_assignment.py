@@ -0,0 +1,330 @@
+"""
+deliveryAgent/batch_assignment.py
+
+Assigns a backlog of unassigned paid orders (services.get_unassigned_confirmed_orders)
+to available agents in one pass, minimising the total cost of the batch rather
+than picking the nearest agent order by order.
+
+Each (order, agent slot) pair is priced from the service-area tier
+(pincode < region < city), the distance when both sides have coordinates,
+and the agent's load (active assignments plus the slots already used in
+this batch). Agents that do not serve an order's area cannot take it. The
+resulting cost matrix is solved as a rectangular min-cost assignment
+problem: scipy.optimize.linear_sum_assignment when scipy is installed,
+otherwise the NumPy Hungarian implementation below.
+
+plan_batch_assignment() only reads; commit_batch_assignment() writes every
+assignment of a plan in a single transaction, skipping pairs that went
+stale in between (order assigned elsewhere, agent no longer available).
+"""
+from collections import namedtuple
+
+import numpy as np
+from django.db import transaction
+
+from .agent_index import (
+    TIER_CITY, TIER_PINCODE, TIER_REGION,
+    active_assignment_counts, get_agent_index, publish_agent_changes,
+)
+from .geo import distance_matrix
+
+DEFAULT_BATCH_LIMIT = 500
+DEFAULT_SLOTS_PER_AGENT = 1      # auto_assign_order takes an agent off duty after one order
+# Upper bounds for API callers (BatchAssignmentView); the solver is
+# O(n^2 m) in orders x agent slots and runs inside the request.
+MAX_BATCH_LIMIT = 1000
+MAX_SLOTS_PER_AGENT = 5
+
+# Cost weights, in "km equivalents".
+TIER_COST = {TIER_PINCODE: 0.0, TIER_REGION: 5.0, TIER_CITY: 15.0}
+LOAD_COST = 10.0                 # per active (or already planned) assignment
+INFEASIBLE = 1e9
+
+CLOSED_ORDER_STATUSES = ('cancelled', 'rejected', 'delivered', 'returned')
+
+PlannedAssignment = namedtuple('PlannedAssignment', ['order_id', 'agent_id', 'tier', 'distance_km', 'cost'])
+BatchPlan = namedtuple('BatchPlan', ['assignments', 'unassigned', 'total_cost'])
+
+
+# -- solver -------------------------------------------------------------------
+
+def _hungarian(cost):
+    """
+    Min-cost assignment of every row of `cost` (n x m, n <= m) to a distinct
+    column: shortest augmenting paths with row/column potentials, O(n^2 m),
+    with the per-column relaxation vectorised. Returns (rows, cols).
+    """
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    match = np.zeros(m + 1, dtype=np.int64)   # column -> row (1-based), 0 = free
+    way = np.zeros(m + 1, dtype=np.int64)
+
+    for i in range(1, n + 1):
+        match[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = match[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            u[match[used]] += delta
+            v[used] -= delta
+            minv[~used] -= delta
+            j0 = j1
+            if match[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+
+    cols = np.nonzero(match[1:])[0]
+    rows = match[1:][cols] - 1
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+
+def solve_assignment(cost):
+    """(rows, cols) of a min-cost assignment for a rectangular cost matrix."""
+    cost = np.asarray(cost, dtype=float)
+    if cost.size == 0:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    try:
+        from scipy.optimize import linear_sum_assignment
+    except ImportError:
+        linear_sum_assignment = None
+    if linear_sum_assignment is not None:
+        return linear_sum_assignment(cost)
+    if cost.shape[0] > cost.shape[1]:
+        cols, rows = _hungarian(cost.T)
+        order = np.argsort(rows)
+        return rows[order], cols[order]
+    return _hungarian(cost)
+
+
+# -- cost matrix --------------------------------------------------------------
+
+def _tier_matrix(index, orders, columns):
+    """Best tier each agent column reaches for each order (0 = does not serve it)."""
+    tiers = np.zeros((len(orders), len(columns)), dtype=np.int8)
+    for row, order in enumerate(orders):
+        address = order.delivery_address
+        for agent_id, tier in index.serving(address.pincode, address.city, address.state).items():
+            col = columns.get(agent_id)
+            if col is not None:
+                tiers[row, col] = tier
+    return tiers
+
+
+def build_cost_matrix(index, orders, entries, loads, slots_per_agent):
+    """
+    (cost, tiers, distances, slot_agents): one column per agent slot, so an
+    agent with `slots_per_agent` slots appears that many times, each slot
+    costing LOAD_COST more than the last.
+    """
+    columns = {entry.id: col for col, entry in enumerate(entries)}
+    tiers = _tier_matrix(index, orders, columns)
+
+    distances = distance_matrix(
+        [getattr(o.delivery_address, 'latitude', None) for o in orders],
+        [getattr(o.delivery_address, 'longitude', None) for o in orders],
+        [e.lat for e in entries],
+        [e.lon for e in entries],
+    )
+
+    tier_cost = np.full(tiers.shape, INFEASIBLE)
+    for tier, value in TIER_COST.items():
+        tier_cost[tiers == tier] = value
+    base = tier_cost + np.nan_to_num(distances, nan=0.0)
+
+    load = np.array([loads.get(entry.id, 0) for entry in entries], dtype=float)
+    slot = np.arange(slots_per_agent, dtype=float)
+    # Columns are agent-major: agent 0 slot 0..s-1, agent 1 slot 0..s-1, ...
+    cost = np.repeat(base, slots_per_agent, axis=1) + LOAD_COST * (load[:, None] + slot[None, :]).ravel()
+    cost[np.repeat(tiers == 0, slots_per_agent, axis=1)] = INFEASIBLE
+    slot_agents = np.repeat(np.arange(len(entries)), slots_per_agent)
+    return cost, tiers, distances, slot_agents
+
+
+# -- planning and commit ------------------------------------------------------
+
+def plan_batch_assignment(limit=DEFAULT_BATCH_LIMIT, slots_per_agent=DEFAULT_SLOTS_PER_AGENT, orders=None):
+    """Compute (without writing) the min-cost assignment for the oldest `limit` unassigned orders."""
+    from .services import get_unassigned_confirmed_orders
+
+    if orders is None:
+        orders = list(
+            get_unassigned_confirmed_orders()
+            .exclude(status__in=CLOSED_ORDER_STATUSES)
+            .filter(delivery_address__isnull=False)
+            .order_by('created_at')[:limit]
+        )
+    orders = [order for order in orders if order.delivery_address is not None]
+
+    index = get_agent_index()
+    entries = index.snapshot()
+    if not orders or not entries:
+        return BatchPlan([], [order.id for order in orders], 0.0)
+
+    loads = active_assignment_counts([entry.id for entry in entries])
+    cost, tiers, distances, slot_agents = build_cost_matrix(index, orders, entries, loads, max(1, slots_per_agent))
+    rows, cols = solve_assignment(cost)
+
+    assignments, assigned_rows = [], set()
+    for row, col in zip(rows.tolist(), cols.tolist()):
+        if cost[row, col] >= INFEASIBLE:
+            continue
+        agent_col = int(slot_agents[col])
+        distance = distances[row, agent_col]
+        assignments.append(PlannedAssignment(
+            order_id=orders[row].id,
+            agent_id=entries[agent_col].id,
+            tier=int(tiers[row, agent_col]),
+            distance_km=None if np.isnan(distance) else round(float(distance), 2),
+            cost=round(float(cost[row, col]), 2),
+        ))
+        assigned_rows.add(row)
+
+    unassigned = [order.id for row, order in enumerate(orders) if row not in assigned_rows]
+    return BatchPlan(assignments, unassigned, round(sum(a.cost for a in assignments), 2))
+
+
+def commit_batch_assignment(plan):
+    """
+    Create every assignment of `plan` in one transaction. Returns the created
+    DeliveryAssignments; pairs whose order or agent changed since planning
+    are left out.
+    """
+    from django.contrib.auth import get_user_model
+    from ShopSphere.cache import invalidate_tags
+    from superAdmin.metrics import schedule_refresh as refresh_metrics
+    from user.models import Notification, Order, OrderItem, OrderStatusHistory
+    from .dashboard import schedule_refresh
+    from .live_tracking import publish_status
+    from .models import DeliveryAgentProfile, DeliveryAssignment
+    from .services import build_assignment
+
+    if not plan.assignments:
+        return []
+
+    with transaction.atomic():
+        agents = {
+            agent.id: agent
+            for agent in DeliveryAgentProfile.objects.select_for_update().select_related('user').filter(
+                id__in={a.agent_id for a in plan.assignments},
+                approval_status='approved',
+                availability_status='available',
+                is_blocked=False,
+                is_active=True,
+            )
+        }
+        orders = {
+            order.id: order
+            for order in Order.objects.select_for_update().select_related('delivery_address', 'user').filter(
+                id__in=[a.order_id for a in plan.assignments],
+                payment_status='completed',
+            ).exclude(status__in=CLOSED_ORDER_STATUSES)
+        }
+        already_assigned = set(
+            DeliveryAssignment.objects.filter(order_id__in=list(orders)).values_list('order_id', flat=True)
+        )
+
+        assignments = [
+            build_assignment(orders[a.order_id], agents[a.agent_id])
+            for a in plan.assignments
+            if a.agent_id in agents and a.order_id in orders and a.order_id not in already_assigned
+        ]
+        if not assignments:
+            return []
+        DeliveryAssignment.objects.bulk_create(assignments)
+
+        for assignment in assignments:
+            assignment.order.status = 'delivery_assigned'
+            assignment.order.delivery_agent = assignment.agent
+        Order.objects.bulk_update([a.order for a in assignments], ['status', 'delivery_agent'])
+
+        # Same as auto_assign_order: an agent with an assignment is on delivery.
+        busy = {a.agent.id: a.agent for a in assignments}
+        DeliveryAgentProfile.objects.filter(id__in=list(busy)).update(availability_status='on_delivery')
+        for agent in busy.values():
+            agent.availability_status = 'on_delivery'
+        publish_agent_changes(busy.values())
+
+        def agent_name(agent):
+            return agent.user.get_full_name() or agent.user.username
+
+        history = OrderStatusHistory.objects.bulk_create([
+            OrderStatusHistory(
+                order=a.order,
+                status='delivery_assigned',
+                notes=f"Batch-assigned to delivery agent: {agent_name(a.agent)}",
+            )
+            for a in assignments
+        ])
+
+        notifications = []
+        for a in assignments:
+            notifications.append(Notification(
+                user=a.order.user,
+                notification_type='delivery',
+                title='🚚 Delivery Agent Assigned',
+                message=(
+                    f'A delivery agent has been assigned for your order #{a.order.order_number}. '
+                    f'Agent: {agent_name(a.agent)}.'
+                ),
+                related_order=a.order,
+            ))
+        by_order = {a.order.id: a for a in assignments}
+        vendor_users = (
+            OrderItem.objects.filter(order_id__in=list(by_order), vendor__isnull=False)
+            .values_list('order_id', 'vendor__user_id').distinct()
+        )
+        for order_id, vendor_user_id in vendor_users:
+            a = by_order[order_id]
+            notifications.append(Notification(
+                user_id=vendor_user_id,
+                notification_type='delivery',
+                title='📦 Delivery Agent Assigned for Order',
+                message=(
+                    f'Delivery agent {agent_name(a.agent)} ({a.agent.phone_number}) has been assigned '
+                    f'to pick up items for order #{a.order.order_number}.'
+                ),
+                related_order=a.order,
+            ))
+        for admin in get_user_model().objects.filter(is_superuser=True):
+            notifications.append(Notification(
+                user=admin,
+                notification_type='delivery',
+                title='🛡️ Batch Assignment Completed (Admin)',
+                message=f'{len(assignments)} orders were assigned to {len(busy)} delivery agents.',
+            ))
+        Notification.objects.bulk_create(notifications)
+
+        # bulk_create/bulk_update skip the post_save signals that normally do this.
+        transaction.on_commit(lambda: invalidate_tags('orders'))
+        for row in history:
+            publish_status(row)
+        schedule_refresh(busy, 'assignments')
+        refresh_metrics({a.order.created_at.date() for a in assignments})
+
+    return assignments
+
+
+def describe_plan(plan):
+    """JSON-ready summary of a BatchPlan."""
+    return {
+        'assignments': [a._asdict() for a in plan.assignments],
+        'assigned_count': len(plan.assignments),
+        'unassigned_order_ids': plan.unassigned,
+        'unassigned_count': len(plan.unassigned),
+        'total_cost': plan.total_cost,
+    }
@@ -0,0 +1,215 @@
+"""
+deliveryAgent/dashboard.py
+
+Materialised agent dashboard (DeliveryAgentDashboardView).
+
+The dashboard's derived parts live in one DeliveryAgentDashboard row per
+agent, split into sections that are recomputed independently:
+
+    assignments  active_assignments (latest 5, with order items), active_orders
+    commissions  pending_commission, pending_commissions (latest 20 pending)
+    feedback     recent_feedback (latest 5)
+    stats        today_stats, stats_date
+
+signals.py schedules a refresh of the affected section whenever an
+assignment, order, commission, feedback or daily stats row of the agent
+changes; code that writes with update()/bulk_create() (completion.py,
+batch_assignment.py) calls schedule_refresh() itself. Refreshes run after
+the transaction commits. Reading the dashboard is then the agent row plus
+its snapshot; a missing snapshot is built on first read.
+
+`python manage.py check_agent_dashboards` recomputes snapshots from the
+source tables and reports (or with --fix, rewrites) the ones that drifted.
+"""
+import logging
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+ACTIVE_ASSIGNMENT_STATUSES = ('assigned', 'accepted', 'picked_up', 'in_transit')
+ACTIVE_ORDER_STATUSES = ('assigned', 'picked_up', 'in_transit')     # as in get_current_active_orders()
+RECENT_ASSIGNMENTS = 5
+RECENT_FEEDBACK = 5
+PENDING_COMMISSIONS = 20
+
+logger = logging.getLogger(__name__)
+
+SECTIONS = {
+    'assignments': ('active_assignments', 'active_orders'),
+    'commissions': ('pending_commission', 'pending_commissions'),
+    'feedback': ('recent_feedback',),
+    'stats': ('today_stats', 'stats_date'),
+}
+
+
+def empty_today_stats():
+    return {
+        'total_deliveries_assigned': 0,
+        'total_deliveries_completed': 0,
+        'total_deliveries_failed': 0,
+        'total_hours_worked': '0.00',
+        'average_delivery_time': '0.00',
+        'total_distance': '0.00',
+        'average_distance_per_delivery': '0.00',
+        'total_earnings': '0.00',
+        'total_bonus': '0.00',
+        'customer_ratings_received': 0,
+        'average_rating': '0.00',
+    }
+
+
+# -- computing sections ---------------------------------------------------------
+
+def _assignments(agent_id):
+    from .models import DeliveryAssignment
+    from .serializers import DeliveryAssignmentListSerializer
+
+    active = DeliveryAssignmentListSerializer.setup_eager_loading(
+        DeliveryAssignment.objects.filter(agent_id=agent_id, status__in=ACTIVE_ASSIGNMENT_STATUSES)
+    ).order_by('-assigned_at')[:RECENT_ASSIGNMENTS]
+    return {
+        'active_assignments': DeliveryAssignmentListSerializer(active, many=True).data,
+        'active_orders': DeliveryAssignment.objects.filter(
+            agent_id=agent_id, status__in=ACTIVE_ORDER_STATUSES,
+        ).count(),
+    }
+
+
+def _commissions(agent_id):
+    from django.db.models import Sum
+    from .models import DeliveryAgentProfile, DeliveryCommission
+    from .serializers import DeliveryCommissionSerializer
+
+    pending = DeliveryCommission.objects.filter(agent_id=agent_id, status='pending')
+    latest = (
+        pending.select_related('agent__user')
+        .defer(*DeliveryAgentProfile.document_defer_paths('agent'))
+        .order_by('-created_at')[:PENDING_COMMISSIONS]
+    )
+    return {
+        'pending_commission': pending.aggregate(total=Sum('total_commission'))['total'] or Decimal('0.00'),
+        'pending_commissions': DeliveryCommissionSerializer(latest, many=True).data,
+    }
+
+
+def _feedback(agent_id):
+    from .models import DeliveryAgentProfile, DeliveryFeedback
+    from .serializers import DeliveryFeedbackSerializer
+
+    feedback = (
+        DeliveryFeedback.objects.filter(agent_id=agent_id)
+        .select_related('agent__user')
+        .defer(*DeliveryAgentProfile.document_defer_paths('agent'))
+        .order_by('-created_at')[:RECENT_FEEDBACK]
+    )
+    return {'recent_feedback': DeliveryFeedbackSerializer(feedback, many=True).data}
+
+
+def _stats(agent_id):
+    from .models import DeliveryDailyStats
+    from .serializers import DeliveryDailyStatsSerializer
+
+    today = timezone.now().date()
+    stats = DeliveryDailyStats.objects.filter(agent_id=agent_id, date=today).first()
+    return {
+        'today_stats': DeliveryDailyStatsSerializer(stats).data if stats else empty_today_stats(),
+        'stats_date': today,
+    }
+
+
+_COMPUTE = {
+    'assignments': _assignments,
+    'commissions': _commissions,
+    'feedback': _feedback,
+    'stats': _stats,
+}
+
+
+def compute_sections(agent_id, sections=None):
+    """Field values of the given sections (all by default), from the source tables."""
+    values = {}
+    for section in sections or SECTIONS:
+        values.update(_COMPUTE[section](agent_id))
+    return values
+
+
+# -- maintaining snapshots ------------------------------------------------------
+
+def refresh_dashboard(agent_id, sections=None):
+    """Recompute `sections` of the agent's snapshot now. Returns the snapshot."""
+    from .models import DeliveryAgentDashboard
+
+    snapshot, created = DeliveryAgentDashboard.objects.get_or_create(agent_id=agent_id)
+    if created:
+        sections = None     # a new row needs every section
+    values = compute_sections(agent_id, sections)
+    for field, value in values.items():
+        setattr(snapshot, field, value)
+    snapshot.save(update_fields=[*values, 'updated_at'])
+    return snapshot
+
+
+def schedule_refresh(agent_ids, *sections):
+    """Refresh `sections` of these agents' snapshots once the current transaction commits."""
+    agent_ids = {agent_id for agent_id in agent_ids if agent_id}
+    if not agent_ids:
+        return
+
+    def refresh():
+        from .models import DeliveryAgentProfile
+
+        # Agents deleted in the meantime have no snapshot to keep.
+        for agent_id in DeliveryAgentProfile.objects.filter(id__in=agent_ids).values_list('id', flat=True):
+            try:
+                refresh_dashboard(agent_id, sections or None)
+            except Exception:
+                # The consistency check repairs a snapshot that missed an update.
+                logger.exception("Agent dashboard refresh failed for agent %s", agent_id)
+
+    transaction.on_commit(refresh)
+
+
+def get_dashboard(agent):
+    """The agent's snapshot, built on first use. Today's stats are reset after midnight."""
+    from .models import DeliveryAgentDashboard
+
+    try:
+        snapshot = agent.dashboard
+    except DeliveryAgentDashboard.DoesNotExist:
+        snapshot = refresh_dashboard(agent.id)
+        agent.dashboard = snapshot
+    if snapshot.stats_date != timezone.now().date():
+        # No stats row has been written for today yet (that would have refreshed it).
+        snapshot.today_stats = empty_today_stats()
+    return snapshot
+
+
+def find_inconsistent(agent_ids=None):
+    """[(agent_id, [field, ...])] of snapshots that differ from a recomputation."""
+    import json
+    from django.core.serializers.json import DjangoJSONEncoder
+    from .models import DeliveryAgentDashboard
+
+    def normalise(value):
+        if isinstance(value, Decimal):
+            return value
+        return json.loads(json.dumps(value, cls=DjangoJSONEncoder))
+
+    snapshots = DeliveryAgentDashboard.objects.order_by('agent_id')
+    if agent_ids:
+        snapshots = snapshots.filter(agent_id__in=agent_ids)
+
+    drifted = []
+    for snapshot in snapshots.iterator():
+        expected = compute_sections(snapshot.agent_id)
+        if snapshot.stats_date != expected.pop('stats_date'):
+            # A snapshot from another day serves empty stats (get_dashboard).
+            snapshot.today_stats = empty_today_stats()
+        fields = [
+            field for field, value in expected.items()
+            if normalise(getattr(snapshot, field)) != normalise(value)
+        ]
+        if fields:
+            drifted.append((snapshot.agent_id, fields))
+    return drifted
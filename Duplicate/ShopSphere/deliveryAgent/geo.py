@@ -0,0 +1,109 @@
+"""
+deliveryAgent/geo.py
+
+Great-circle distance helpers shared by assignment, the nearby check and
+tracking analytics.
+
+haversine_km() is the scalar version for one pair of points. The NumPy
+versions work on whole arrays at once: distances_from() for one point
+against many (an order against every candidate agent) and distance_matrix()
+for many against many (a batch of orders against all agents). Unknown
+coordinates (None) become NaN and produce NaN distances.
+
+For radius searches, bounding_box() gives the lat/lon rectangle that
+contains the circle. Filtering on it first (within_box(), or
+filter_bounding_box() on a queryset so the database does it) leaves only
+a few points for the exact haversine pass in within_radius().
+
+See `python manage.py benchmark_geo` for the scalar vs. vectorised timings.
+"""
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEG = EARTH_RADIUS_KM * math.pi / 180   # ~111.2 km per degree of latitude
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distance (km) between two points; inf if any coordinate is unknown."""
+    if lat1 is None or lon1 is None or lat2 is None or lon2 is None:
+        return math.inf
+    lat1, lon1, lat2, lon2 = map(math.radians, (float(lat1), float(lon1), float(lat2), float(lon2)))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def as_array(values):
+    """float64 array from floats, Decimals or strings, with None as NaN."""
+    if isinstance(values, np.ndarray) and values.dtype == np.float64:
+        return values
+    return np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    # Inputs in radians, already broadcastable against each other.
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def distances_from(lat, lon, lats, lons):
+    """Distances (km) from one point to each point of (lats, lons)."""
+    return _haversine(
+        math.radians(float(lat)), math.radians(float(lon)),
+        np.radians(as_array(lats)), np.radians(as_array(lons)),
+    )
+
+
+def distance_matrix(lats1, lons1, lats2, lons2):
+    """len(lats1) x len(lats2) matrix of distances (km) between two point sets."""
+    return _haversine(
+        np.radians(as_array(lats1))[:, None], np.radians(as_array(lons1))[:, None],
+        np.radians(as_array(lats2))[None, :], np.radians(as_array(lons2))[None, :],
+    )
+
+
+def bounding_box(lat, lon, radius_km):
+    """(min_lat, max_lat, min_lon, max_lon) of a rectangle containing the circle."""
+    lat, lon = float(lat), float(lon)
+    dlat = radius_km / KM_PER_DEG
+    cos_lat = math.cos(math.radians(lat))
+    if cos_lat < 1e-6 or abs(lat) + dlat >= 90:
+        # Near a pole every longitude can be within reach.
+        return (max(lat - dlat, -90.0), min(lat + dlat, 90.0), -180.0, 180.0)
+    # Widest longitude span is at the edge of the box nearest the pole.
+    dlon = radius_km / (KM_PER_DEG * math.cos(math.radians(abs(lat) + dlat)))
+    if lon - dlon < -180 or lon + dlon > 180:
+        # Crossing the antimeridian: keep every longitude rather than split the box.
+        return (lat - dlat, lat + dlat, -180.0, 180.0)
+    return (lat - dlat, lat + dlat, lon - dlon, lon + dlon)
+
+
+def within_box(lats, lons, box):
+    """Boolean mask of the points inside `box` (False for unknown coordinates)."""
+    min_lat, max_lat, min_lon, max_lon = box
+    lats, lons = as_array(lats), as_array(lons)
+    return (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+
+
+def within_radius(lat, lon, lats, lons, radius_km):
+    """
+    (indices, distances) of the points within `radius_km` of (lat, lon),
+    nearest first. Only points inside the bounding box get the exact check.
+    """
+    lats, lons = as_array(lats), as_array(lons)
+    candidates = np.flatnonzero(within_box(lats, lons, bounding_box(lat, lon, radius_km)))
+    distances = distances_from(lat, lon, lats[candidates], lons[candidates])
+    keep = distances <= radius_km
+    candidates, distances = candidates[keep], distances[keep]
+    order = np.argsort(distances, kind='stable')
+    return candidates[order], distances[order]
+
+
+def filter_bounding_box(queryset, lat, lon, radius_km, lat_field='latitude', lon_field='longitude'):
+    """Narrow `queryset` to rows whose coordinates fall in the bounding box of the circle."""
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+    return queryset.filter(**{
+        f'{lat_field}__gte': min_lat, f'{lat_field}__lte': max_lat,
+        f'{lon_field}__gte': min_lon, f'{lon_field}__lte': max_lon,
+    })
@@ -0,0 +1,193 @@
+"""
+deliveryAgent/live_tracking.py
+
+Push channel behind the customer's live tracking stream
+(GET /api/delivery/track/<order_number>/stream/, order_lifecycle_views.py).
+
+Producers call publish_location() / publish_status() and the message is sent
+once the surrounding transaction commits:
+  - location: DeliveryAssignment.current_location, from location_ingest.py
+    (update_location and the batched locations endpoint),
+  - status: every new OrderStatusHistory row (signals.py): NearbyOTPView,
+    VerifyDeliveryOTPView, the accept and complete assignment actions and
+    auto-assignment. batch_assignment.py writes its rows with bulk_create(),
+    which sends no signal, and calls publish_status() itself.
+
+Messages go through a broker, one channel per order:
+  - InProcessBroker: asyncio queues in this process. Used in development and
+    tests, and whenever REDIS_URL is not set.
+  - RedisBroker: Redis pub/sub (requires the redis package) so a stream
+    served by one worker sees events produced by another.
+Set LIVE_TRACKING_BROKER to 'memory' or 'redis' to override the choice.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+SUBSCRIBER_QUEUE_SIZE = 100     # older undelivered events are dropped beyond this
+
+logger = logging.getLogger(__name__)
+
+
+def channel_for(order_id):
+    return f'tracking:order:{order_id}'
+
+
+def _offer(queue, message):
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(message)
+
+
+class LocalSubscription:
+
+    def __init__(self, broker, channel):
+        self._broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    async def get(self, timeout):
+        """Next message, or None if nothing arrives within `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        self._broker._unsubscribe(self)
+
+
+class InProcessBroker:
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)    # channel -> {LocalSubscription}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(_offer, subscription.queue, message)
+            except RuntimeError:
+                # The subscriber's loop has closed; its close() unregisters it.
+                pass
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._subscribers.get(channel, ()))
+
+    async def subscribe(self, channel):
+        """Subscription receiving every message published to `channel` from now on."""
+        subscription = LocalSubscription(self, channel)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+
+class RedisSubscription:
+
+    def __init__(self, client, pubsub):
+        self._client = client
+        self._pubsub = pubsub
+
+    async def get(self, timeout):
+        item = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        return json.loads(item['data']) if item else None
+
+    async def close(self):
+        await self._pubsub.aclose()
+        await self._client.aclose()
+
+
+class RedisBroker:
+
+    def __init__(self, url):
+        import redis
+        self._url = url
+        self._client = redis.Redis.from_url(url)
+
+    def publish(self, channel, message):
+        self._client.publish(channel, json.dumps(message, default=str))
+
+    async def subscribe(self, channel):
+        import redis.asyncio as aioredis
+
+        client = aioredis.Redis.from_url(self._url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(channel)
+        return RedisSubscription(client, pubsub)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                kind = getattr(settings, 'LIVE_TRACKING_BROKER', None)
+                redis_url = getattr(settings, 'REDIS_URL', None)
+                if kind is None:
+                    kind = 'redis' if redis_url else 'memory'
+                _broker = RedisBroker(redis_url) if kind == 'redis' else InProcessBroker()
+    return _broker
+
+
+def _publish_on_commit(order_id, message):
+    channel = channel_for(order_id)
+
+    def publish():
+        try:
+            get_broker().publish(channel, message)
+        except Exception:
+            # Best effort: a reconnecting client gets the current state anyway.
+            logger.exception("Live tracking publish failed on %s", channel)
+
+    transaction.on_commit(publish)
+
+
+def publish_location(order_id, current_location):
+    _publish_on_commit(order_id, {'event': 'location', 'data': current_location})
+
+
+def status_message(history):
+    return {
+        'event': 'status',
+        'id': history.id,
+        'data': {
+            'status': history.status,
+            'notes': history.notes,
+            'timestamp': history.timestamp.isoformat(),
+        },
+    }
+
+
+def publish_status(history):
+    _publish_on_commit(history.order_id, status_message(history))
+
+
+def format_event(message):
+    """One Server-Sent Events frame for a broker message."""
+    lines = []
+    if message.get('id') is not None:
+        lines.append(f"id: {message['id']}")
+    lines.append(f"event: {message['event']}")
+    lines.append(f"data: {json.dumps(message['data'], default=str)}")
+    return ('\n'.join(lines) + '\n\n').encode()
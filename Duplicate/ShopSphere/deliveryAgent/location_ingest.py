@@ -0,0 +1,266 @@
+"""
+deliveryAgent/location_ingest.py
+
+Write path for agent GPS pings (DeliveryTrackingViewSet.update_location and
+.locations).
+
+A request may carry one point or a batch. Per request the pipeline does:
+  1. one lookup of the assignment (joined to the agent's user),
+  2. thinning: a point within LOCATION_MIN_DISTANCE_M of the last kept point
+     of the same assignment, with the same status and less than
+     LOCATION_HEARTBEAT_SECONDS after it, is dropped (agent is stationary),
+  3. one UPDATE of DeliveryAssignment.current_location and one of the agent's
+     last known position, both from the newest kept point only; the new
+     location is also pushed to live tracking streams (live_tracking.py),
+  4. the kept points go to an in-process buffer that is written with
+     bulk_create once it holds LOCATION_BUFFER_SIZE rows or its oldest row is
+     LOCATION_BUFFER_MAX_AGE seconds old (a timer thread covers idle periods).
+
+LOCATION_BUFFER_SIZE = 0 writes every request's points immediately. The
+tracking history endpoint calls flush_location_buffer() first so this
+process's pending points are included; the compact track
+(track_compaction.track_for) merges one assignment's buffered_points() in
+memory instead. Points buffered by other workers appear within
+LOCATION_BUFFER_MAX_AGE seconds. Thinning state is per process
+too, so with several workers a stationary agent keeps slightly more points.
+"""
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from .geo import haversine_km
+
+MAX_POINTS_PER_REQUEST = 500
+MAX_CLIENT_CLOCK_SKEW = timedelta(hours=1)
+THINNING_STATE_SIZE = 10000     # assignments whose last kept point is remembered
+
+
+class InvalidLocation(ValueError):
+    pass
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _decimal(value, field, low=None, high=None, places=6):
+    try:
+        number = Decimal(str(value))
+    except (InvalidOperation, TypeError, ValueError):
+        raise InvalidLocation(f'{field} must be a number')
+    if not number.is_finite() or (low is not None and not low <= number <= high):
+        raise InvalidLocation(f'{field} must be between {low} and {high}')
+    return number.quantize(Decimal(1).scaleb(-places))
+
+
+def _timestamp(value, now):
+    """Client-side capture time, clamped to [now - MAX_CLIENT_CLOCK_SKEW, now]."""
+    if value in (None, ''):
+        return now
+    from django.utils.dateparse import parse_datetime
+
+    try:
+        if isinstance(value, (int, float)):
+            recorded = datetime.fromtimestamp(value / 1000 if value > 1e11 else value)
+        else:
+            recorded = parse_datetime(str(value))
+    except (OverflowError, OSError, ValueError):
+        # Out of range (1e20, inf), NaN, or an impossible date such as Feb 30.
+        recorded = None
+    if recorded is None:
+        raise InvalidLocation('recorded_at must be an ISO 8601 datetime or a UNIX timestamp')
+    if timezone.is_aware(recorded) and not settings.USE_TZ:
+        recorded = timezone.make_naive(recorded)
+    elif timezone.is_naive(recorded) and settings.USE_TZ:
+        recorded = timezone.make_aware(recorded)
+    return min(max(recorded, now - MAX_CLIENT_CLOCK_SKEW), now)
+
+
+def parse_points(data):
+    """
+    Validated point dicts from a request body: either {"points": [...]} or a
+    single point {"latitude", "longitude", "address", "status", "speed",
+    "notes", "recorded_at"}. Returned oldest first.
+    """
+    raw = data.get('points') if hasattr(data, 'get') else None
+    if raw is None:
+        raw = [data]
+    if not isinstance(raw, list) or not raw:
+        raise InvalidLocation('points must be a non-empty list')
+    if len(raw) > MAX_POINTS_PER_REQUEST:
+        raise InvalidLocation(f'At most {MAX_POINTS_PER_REQUEST} points per request')
+
+    now = timezone.now()
+    points = []
+    for item in raw:
+        if not hasattr(item, 'get'):
+            raise InvalidLocation('Each point must be an object')
+        if item.get('latitude') in (None, '') or item.get('longitude') in (None, ''):
+            raise InvalidLocation('latitude and longitude are required')
+        speed = item.get('speed')
+        points.append({
+            'latitude': _decimal(item.get('latitude'), 'latitude', -90, 90),
+            'longitude': _decimal(item.get('longitude'), 'longitude', -180, 180),
+            'address': item.get('address') or '',
+            'status': item.get('status') or 'In Transit',
+            'speed': _decimal(speed, 'speed', 0, 999, places=2) if speed not in (None, '') else None,
+            'notes': item.get('notes') or '',
+            'tracked_at': _timestamp(item.get('recorded_at'), now),
+        })
+    points.sort(key=lambda point: point['tracked_at'])
+    return points
+
+
+# -- thinning -----------------------------------------------------------------
+
+_last_kept = OrderedDict()      # assignment id -> (latitude, longitude, status, tracked_at)
+_last_kept_lock = threading.Lock()
+
+
+def thin_points(assignment_id, points):
+    """Drop points recorded while the agent stood still; remembers the last kept one."""
+    min_distance_km = _setting('LOCATION_MIN_DISTANCE_M', 15) / 1000
+    heartbeat = timedelta(seconds=_setting('LOCATION_HEARTBEAT_SECONDS', 60))
+    if min_distance_km <= 0:
+        return points
+
+    with _last_kept_lock:
+        last = _last_kept.get(assignment_id)
+        kept = []
+        for point in points:
+            if last is not None:
+                lat, lon, status, tracked_at = last
+                if point['tracked_at'] < tracked_at:
+                    # Late upload from before the last kept point: history only.
+                    kept.append(point)
+                    continue
+                if (point['status'] == status
+                        and point['tracked_at'] - tracked_at < heartbeat
+                        and haversine_km(lat, lon, point['latitude'], point['longitude']) < min_distance_km):
+                    continue
+            kept.append(point)
+            last = (point['latitude'], point['longitude'], point['status'], point['tracked_at'])
+        if last is not None:
+            _last_kept[assignment_id] = last
+            _last_kept.move_to_end(assignment_id)
+            while len(_last_kept) > THINNING_STATE_SIZE:
+                _last_kept.popitem(last=False)
+    return kept
+
+
+# -- buffer -------------------------------------------------------------------
+
+class TrackingBuffer:
+    """Pending DeliveryTracking rows of this process, written with bulk_create."""
+
+    def __init__(self):
+        self._rows = []
+        self._oldest = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, rows):
+        size = _setting('LOCATION_BUFFER_SIZE', 200)
+        max_age = _setting('LOCATION_BUFFER_MAX_AGE', 2)
+        with self._lock:
+            self._rows.extend(rows)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            due = len(self._rows) >= size or time.monotonic() - self._oldest >= max_age
+            if not due and self._timer is None:
+                self._timer = threading.Timer(max_age, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if due:
+            self.flush()
+
+    def pending_for(self, assignment_id):
+        """The unwritten rows of one assignment, without writing anything."""
+        with self._lock:
+            return [row for row in self._rows if row.delivery_assignment_id == assignment_id]
+
+    def _take(self):
+        with self._lock:
+            rows, self._rows, self._oldest = self._rows, [], None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return rows
+
+    def flush(self):
+        """Write every pending row; returns how many were written."""
+        from .models import DeliveryTracking
+
+        rows = self._take()
+        if rows:
+            DeliveryTracking.objects.bulk_create(rows, batch_size=500)
+        return len(rows)
+
+    def _flush_from_timer(self):
+        close_old_connections()
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+
+_buffer = TrackingBuffer()
+atexit.register(_buffer.flush)
+
+
+def flush_location_buffer():
+    return _buffer.flush()
+
+
+def buffered_points(assignment_id):
+    """DeliveryTracking rows of `assignment_id` still waiting in this process's buffer."""
+    return _buffer.pending_for(assignment_id)
+
+
+# -- ingestion ----------------------------------------------------------------
+
+def ingest_points(assignment, points):
+    """
+    Record `points` (from parse_points) for `assignment`. Returns the
+    DeliveryTracking rows kept after thinning; while they sit in the buffer
+    they have no primary key yet.
+    """
+    from .agent_index import record_agent_location
+    from .live_tracking import publish_location
+    from .models import DeliveryAssignment, DeliveryTracking
+
+    previous = _last_kept.get(assignment.id)
+    kept = thin_points(assignment.id, points)
+    if not kept:
+        return []
+
+    rows = [DeliveryTracking(delivery_assignment_id=assignment.id, **point) for point in kept]
+    newest = kept[-1]
+
+    if previous is None or newest['tracked_at'] >= previous[3]:
+        current_location = {
+            'latitude': float(newest['latitude']),
+            'longitude': float(newest['longitude']),
+            'address': newest['address'],
+            'recorded_at': newest['tracked_at'].isoformat(),
+        }
+        # Only the hot columns: never rewrite the assignment's other fields or blobs.
+        DeliveryAssignment.objects.filter(id=assignment.id).update(current_location=current_location)
+        record_agent_location(assignment.agent_id, newest['latitude'], newest['longitude'])
+        publish_location(assignment.order_id, current_location)
+
+    if _setting('LOCATION_BUFFER_SIZE', 200) > 0:
+        _buffer.add(rows)
+    else:
+        DeliveryTracking.objects.bulk_create(rows)
+    return rows
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from deliveryAgent.batch_assignment import (
+    DEFAULT_BATCH_LIMIT, DEFAULT_SLOTS_PER_AGENT, commit_batch_assignment, plan_batch_assignment,
+)
+
+
+class Command(BaseCommand):
+    help = 'Assign the backlog of unassigned paid orders to delivery agents as one min-cost batch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=DEFAULT_BATCH_LIMIT,
+                            help='Maximum number of orders to assign (oldest first).')
+        parser.add_argument('--per-agent', type=int, default=DEFAULT_SLOTS_PER_AGENT,
+                            help='Maximum number of orders given to one agent in this batch.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Print the plan without creating assignments.')
+
+    def handle(self, *args, **options):
+        plan = plan_batch_assignment(limit=options['limit'], slots_per_agent=options['per_agent'])
+        for a in plan.assignments:
+            distance = f'{a.distance_km} km' if a.distance_km is not None else 'distance unknown'
+            self.stdout.write(f'  order {a.order_id} -> agent {a.agent_id} (tier {a.tier}, {distance}, cost {a.cost})')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Planned {len(plan.assignments)} assignments (total cost {plan.total_cost}); '
+                f'{len(plan.unassigned)} orders have no eligible agent.'
+            ))
+            return
+
+        created = commit_batch_assignment(plan)
+        self.stdout.write(self.style.SUCCESS(
+            f'Assigned {len(created)} of {len(plan.assignments)} planned orders; '
+            f'{len(plan.unassigned)} orders have no eligible agent.'
+        ))
@@ -0,0 +1,54 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from deliveryAgent.geo import distance_matrix, distances_from, haversine_km, within_radius
+
+
+class Command(BaseCommand):
+    help = 'Time scalar vs. NumPy distance computations on random points around a city.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--points', type=int, default=10000, help='Number of agent positions.')
+        parser.add_argument('--orders', type=int, default=200, help='Rows of the many-to-many matrix.')
+        parser.add_argument('--radius', type=float, default=5.0, help='Radius (km) for the prefilter test.')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement (best is reported).')
+
+    def _best(self, repeat, fn):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return best * 1000
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        n, m, repeat = options['points'], options['orders'], options['repeat']
+        # ~50 x 50 km around Bengaluru.
+        lats = [12.75 + rng.random() * 0.45 for _ in range(n)]
+        lons = [77.35 + rng.random() * 0.45 for _ in range(n)]
+        order_lats = [12.75 + rng.random() * 0.45 for _ in range(m)]
+        order_lons = [77.35 + rng.random() * 0.45 for _ in range(m)]
+        lat, lon = 12.97, 77.59
+
+        rows = [
+            (f'point-to-{n}, scalar loop',
+             self._best(repeat, lambda: [haversine_km(lat, lon, a, b) for a, b in zip(lats, lons)])),
+            (f'point-to-{n}, distances_from',
+             self._best(repeat, lambda: distances_from(lat, lon, lats, lons))),
+            (f'{m}x{n}, scalar loop',
+             self._best(1, lambda: [[haversine_km(x, y, a, b) for a, b in zip(lats, lons)]
+                                    for x, y in zip(order_lats, order_lons)])),
+            (f'{m}x{n}, distance_matrix',
+             self._best(repeat, lambda: distance_matrix(order_lats, order_lons, lats, lons))),
+            (f'within {options["radius"]} km, scalar filter',
+             self._best(repeat, lambda: [i for i, (a, b) in enumerate(zip(lats, lons))
+                                         if haversine_km(lat, lon, a, b) <= options['radius']])),
+            (f'within {options["radius"]} km, box prefilter',
+             self._best(repeat, lambda: within_radius(lat, lon, lats, lons, options['radius']))),
+        ]
+        width = max(len(label) for label, _ in rows)
+        for label, ms in rows:
+            self.stdout.write(f'{label.ljust(width)}  {ms:10.2f} ms')
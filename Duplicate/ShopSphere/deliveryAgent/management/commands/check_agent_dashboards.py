@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from deliveryAgent.dashboard import find_inconsistent, refresh_dashboard
+
+
+class Command(BaseCommand):
+    help = 'Compare agent dashboard snapshots with their source tables and optionally rebuild the stale ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--agent', type=int, action='append', dest='agents',
+                            help='Only check this agent id (repeatable).')
+        parser.add_argument('--fix', action='store_true',
+                            help='Rebuild the snapshots that differ.')
+
+    def handle(self, *args, **options):
+        drifted = find_inconsistent(options['agents'])
+        for agent_id, fields in drifted:
+            self.stdout.write(f"  agent {agent_id}: {', '.join(fields)}")
+            if options['fix']:
+                refresh_dashboard(agent_id)
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('All agent dashboards are consistent.'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(drifted)} agent dashboards.'))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'{len(drifted)} agent dashboards are out of date; run with --fix to rebuild them.'
+            ))
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from deliveryAgent.track_compaction import archive_tracking, compact_assignments
+
+
+class Command(BaseCommand):
+    help = 'Store simplified routes of finished deliveries and archive old raw tracking points.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=500,
+                            help='Maximum number of assignments to compact in this run.')
+        parser.add_argument('--archive-days', type=int,
+                            default=getattr(settings, 'TRACKING_ARCHIVE_AFTER_DAYS', 30),
+                            help='Archive raw points older than this many days.')
+        parser.add_argument('--no-archive', action='store_true',
+                            help='Only compact; keep every raw point in the table.')
+
+    def handle(self, *args, **options):
+        compacted = compact_assignments(limit=options['limit'])
+        self.stdout.write(f'Compacted {compacted} finished assignments.')
+        if options['no_archive']:
+            return
+        archived = archive_tracking(older_than_days=options['archive_days'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} tracking points.'))
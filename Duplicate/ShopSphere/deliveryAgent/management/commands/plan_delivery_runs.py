@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from deliveryAgent.route_batching import (
+    DEFAULT_RUN_LIMIT, commit_delivery_runs, describe_plan, plan_delivery_runs,
+)
+
+
+class Command(BaseCommand):
+    help = 'Group packed, unassigned orders into multi-stop delivery runs with an optimised stop order.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=DEFAULT_RUN_LIMIT,
+                            help='Maximum number of orders to plan in this pass.')
+        parser.add_argument('--max-stops', type=int, default=getattr(settings, 'ROUTE_MAX_STOPS', 8),
+                            help='Maximum number of stops per run.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Print the planned runs without assigning anything.')
+
+    def handle(self, *args, **options):
+        plan = plan_delivery_runs(limit=options['limit'], max_stops=options['max_stops'])
+        summary = describe_plan(plan)
+        for run in summary['runs']:
+            stops = ' -> '.join(str(stop['order_id']) for stop in run['stops'])
+            self.stdout.write(
+                f"agent {run['agent_id']} [{run['group_key']}] {len(run['stops'])} stops, "
+                f"{run['total_distance_km']} km: {stops}"
+            )
+        self.stdout.write(f"{summary['unassigned_count']} orders without a suitable agent.")
+        if options['dry_run']:
+            return
+        runs = commit_delivery_runs(plan)
+        self.stdout.write(self.style.SUCCESS(f'Created {len(runs)} delivery runs.'))
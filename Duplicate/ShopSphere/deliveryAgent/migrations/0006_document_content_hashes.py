@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deliveryAgent', '0005_remove_deliveryagentprofile_id_proof_file_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliveryagentprofile',
+            name='id_proof_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='deliveryagentprofile',
+            name='license_file_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='deliveryagentprofile',
+            name='vehicle_insurance_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='deliveryagentprofile',
+            name='vehicle_registration_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='deliveryassignment',
+            name='delivery_photo_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='deliveryassignment',
+            name='signature_image_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
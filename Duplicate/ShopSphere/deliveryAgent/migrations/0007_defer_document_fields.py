@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:45
+
+import hashlib
+
+from django.db import migrations
+
+
+def backfill_document_hashes(model, prefixes):
+    """Record <prefix>_hash for documents uploaded before hashes existed."""
+    for prefix in prefixes:
+        data_field, hash_field = f'{prefix}_data', f'{prefix}_hash'
+        pending = model.objects.filter(
+            **{f'{data_field}__isnull': False, f'{hash_field}__isnull': True}
+        ).values_list('id', flat=True)
+        for pk in list(pending):
+            data = model.objects.filter(pk=pk).values_list(data_field, flat=True).first()
+            if data:
+                digest = hashlib.sha256(bytes(data)).hexdigest()
+                model.objects.filter(pk=pk).update(**{hash_field: digest})
+
+
+def forwards(apps, schema_editor):
+    backfill_document_hashes(
+        apps.get_model('deliveryAgent', 'DeliveryAgentProfile'),
+        ('vehicle_registration', 'vehicle_insurance', 'license_file', 'id_proof'),
+    )
+    backfill_document_hashes(
+        apps.get_model('deliveryAgent', 'DeliveryAssignment'),
+        ('signature_image', 'delivery_photo'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deliveryAgent', '0006_document_content_hashes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='deliveryagentprofile',
+            options={'base_manager_name': 'objects', 'ordering': ['-created_at']},
+        ),
+        migrations.AlterModelOptions(
+            name='deliveryassignment',
+            options={'base_manager_name': 'objects', 'ordering': ['-assigned_at']},
+        ),
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:01
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deliveryAgent', '0007_defer_document_fields'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='deliverytracking',
+            name='tracked_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deliveryAgent', '0008_tracking_recorded_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliveryassignment',
+            name='track_compacted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='deliveryassignment',
+            name='track_point_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='deliveryassignment',
+            name='track_polyline',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.CreateModel(
+            name='DeliveryTrackingArchive',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('blob_hash', models.CharField(max_length=64)),
+                ('size', models.IntegerField(default=0)),
+                ('row_count', models.IntegerField(default=0)),
+                ('first_tracked_at', models.DateTimeField()),
+                ('last_tracked_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Delivery Tracking Archives',
+                'ordering': ['-month', '-created_at'],
+                'indexes': [models.Index(fields=['month'], name='deliveryAge_month_cb66dd_idx')],
+            },
+        ),
+    ]
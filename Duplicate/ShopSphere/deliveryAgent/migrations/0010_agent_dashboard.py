@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:11
+
+import django.core.serializers.json
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deliveryAgent', '0009_track_compaction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryAgentDashboard',
+            fields=[
+                ('agent', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='dashboard', serialize=False, to='deliveryAgent.deliveryagentprofile')),
+                ('active_assignments', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('active_orders', models.IntegerField(default=0)),
+                ('pending_commission', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('pending_commissions', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('recent_feedback', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('today_stats', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('stats_date', models.DateField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -1,16 +1,19 @@
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db.models import Sum, Avg
 from decimal import Decimal
 
+from vendor.documents import DeferredDocumentsManager, DocumentsMixin
+
 
 # ===============================================
 #        DELIVERY AGENT PROFILE MODEL
 # ===============================================
 
-class DeliveryAgentProfile(models.Model):
+class DeliveryAgentProfile(DocumentsMixin, models.Model):
     """Delivery Agent Profile for order delivery management"""
     
     VEHICLE_CHOICES = [
@@ -54,11 +57,13 @@ class DeliveryAgentProfile(models.Model):
     vehicle_registration_data = models.BinaryField(null=True, blank=True)
     vehicle_registration_mimetype = models.CharField(max_length=50, null=True, blank=True)
     vehicle_registration_filename = models.CharField(max_length=255, null=True, blank=True)
+    vehicle_registration_hash = models.CharField(max_length=64, null=True, blank=True)
     
     # Vehicle Insurance (Binary Storage)
     vehicle_insurance_data = models.BinaryField(null=True, blank=True)
     vehicle_insurance_mimetype = models.CharField(max_length=50, null=True, blank=True)
     vehicle_insurance_filename = models.CharField(max_length=255, null=True, blank=True)
+    vehicle_insurance_hash = models.CharField(max_length=64, null=True, blank=True)
     
     # License & Documentation
     license_number = models.CharField(max_length=50, unique=True, blank=True, null=True)
@@ -68,6 +73,7 @@ class DeliveryAgentProfile(models.Model):
     license_file_data = models.BinaryField(null=True, blank=True)
     license_file_mimetype = models.CharField(max_length=50, null=True, blank=True)
     license_file_filename = models.CharField(max_length=255, null=True, blank=True)
+    license_file_hash = models.CharField(max_length=64, null=True, blank=True)
     
     # Identity Verification
     id_type = models.CharField(max_length=20, default='aadhar', choices=[
@@ -82,6 +88,7 @@ class DeliveryAgentProfile(models.Model):
     id_proof_data = models.BinaryField(null=True, blank=True)
     id_proof_mimetype = models.CharField(max_length=50, null=True, blank=True)
     id_proof_filename = models.CharField(max_length=255, null=True, blank=True)
+    id_proof_hash = models.CharField(max_length=64, null=True, blank=True)
     
     # Bank Details for Payout
     bank_holder_name = models.CharField(max_length=100)
@@ -136,8 +143,16 @@ class DeliveryAgentProfile(models.Model):
     # Last online
     last_online = models.DateTimeField(null=True, blank=True)
 
+    # Document byte columns; only the serve_agent_* endpoints need them.
+    DOCUMENT_DATA_FIELDS = (
+        'vehicle_registration_data', 'vehicle_insurance_data', 'license_file_data', 'id_proof_data',
+    )
+
+    objects = DeferredDocumentsManager()
+
     class Meta:
         ordering = ['-created_at']
+        base_manager_name = 'objects'
         indexes = [
             models.Index(fields=['approval_status']),
             models.Index(fields=['availability_status']),
@@ -171,7 +186,7 @@ class DeliveryAgentProfile(models.Model):
 #      DELIVERY ASSIGNMENT MODEL
 # ===============================================
 
-class DeliveryAssignment(models.Model):
+class DeliveryAssignment(DocumentsMixin, models.Model):
     """Assignment of orders to delivery agents"""
     
     STATUS_CHOICES = [
@@ -215,6 +230,17 @@ class DeliveryAssignment(models.Model):
     # Tracking
     current_location = models.JSONField(default=dict, blank=True)  # Real-time GPS location
     route_distance = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)  # in km
+
+    # Compacted route (see track_compaction.py): the DeliveryTracking points
+    # simplified with Douglas-Peucker and stored as an encoded polyline.
+    track_polyline = models.TextField(blank=True, default='')
+    track_point_count = models.IntegerField(default=0)  # raw points before simplification
+    track_compacted_at = models.DateTimeField(null=True, blank=True)
+
+    # Multi-stop run (see route_batching.py): position of this drop in the
+    # agent's route; route_distance is then the leg from the previous stop.
+    run = models.ForeignKey('DeliveryRun', on_delete=models.SET_NULL, null=True, blank=True, related_name='stops')
+    run_sequence = models.PositiveIntegerField(null=True, blank=True)
     
     # Earnings
     delivery_fee = models.DecimalField(max_digits=10, decimal_places=2)
@@ -233,16 +259,24 @@ class DeliveryAssignment(models.Model):
     signature_image_data = models.BinaryField(null=True, blank=True)
     signature_image_mimetype = models.CharField(max_length=50, null=True, blank=True)
     signature_image_filename = models.CharField(max_length=255, null=True, blank=True)
+    signature_image_hash = models.CharField(max_length=64, null=True, blank=True)
 
     delivery_photo_data = models.BinaryField(null=True, blank=True)
     delivery_photo_mimetype = models.CharField(max_length=50, null=True, blank=True)
     delivery_photo_filename = models.CharField(max_length=255, null=True, blank=True)
+    delivery_photo_hash = models.CharField(max_length=64, null=True, blank=True)
     
     otp_verified = models.BooleanField(default=False)
     otp_code = models.CharField(max_length=6, blank=True)
 
+    # Proof-of-delivery byte columns; only the serve_delivery_* endpoints need them.
+    DOCUMENT_DATA_FIELDS = ('signature_image_data', 'delivery_photo_data')
+
+    objects = DeferredDocumentsManager()
+
     class Meta:
         ordering = ['-assigned_at']
+        base_manager_name = 'objects'
         indexes = [
             models.Index(fields=['agent', 'status']),
             models.Index(fields=['order']),
@@ -262,6 +296,12 @@ class DeliveryAssignment(models.Model):
         if self.order:
             self.order.status = 'shipping'
             self.order.save()
+            from user.models import OrderStatusHistory
+            OrderStatusHistory.objects.create(
+                order=self.order,
+                status='shipping',
+                notes='Delivery accepted by the agent.',
+            )
     
     def start_delivery(self):
         """Mark delivery as started (picked up from vendor)"""
@@ -275,69 +315,56 @@ class DeliveryAssignment(models.Model):
         self.save()
     
     def mark_delivered(self):
-        """Mark delivery as completed, credit agent wallet and create commission record"""
-        from user.models import UserWallet, Order
-        
-        # Update order status to delivered
-        if self.order:
-            self.order.status = 'delivered'
-            self.order.delivered_at = timezone.now()
-            self.order.save()
-        
-        self.status = 'delivered'
-        self.delivery_time = timezone.now()
-        self.completed_at = timezone.now()
-        self.save()
-
-        # 2. Calculate Commission Based on Type (Local vs Out-of-city)
-        # Assuming local is within the same city
-        is_local = self.delivery_city.lower() == self.agent.city.lower()
-        
-        distance_bonus = Decimal('0.00')
-        if not is_local:
-            # Out-of-city bonus: 20% of base fee
-            distance_bonus = self.delivery_fee * Decimal('0.20')
-        
-        # Rating bonus could be added later when feedback is received
-        total_commission = self.delivery_fee + distance_bonus
-
-        # Create commission record
-        commission = DeliveryCommission.objects.create(
-            agent=self.agent,
-            delivery_assignment=self,
-            base_fee=self.delivery_fee,
-            distance_bonus=distance_bonus,
-            total_commission=total_commission,
-            status='approved',
-            approved_at=timezone.now(),
-            notes="Local Delivery" if is_local else "Out-of-city Delivery"
-        )
-        
-        # 3. Credit agent's wallet
-        wallet, created = UserWallet.objects.get_or_create(user=self.agent.user)
-        wallet.add_balance(total_commission, f"Delivery Commission for Order {self.order.order_number}")
-        
-        # 4. Update Agent Profile Aggregate Stats
-        self.agent.total_deliveries += 1
-        self.agent.completed_deliveries += 1
-        # Convert to Decimal to avoid "float + Decimal" TypeError
-        self.agent.total_earnings = Decimal(str(self.agent.total_earnings)) + total_commission
-        self.agent.save()
-
-        # 5. Update daily stats
-        stats, created = DeliveryDailyStats.objects.get_or_create(
-            agent=self.agent,
-            date=timezone.now().date()
-        )
-        stats.total_deliveries_completed += 1
-        stats.total_earnings = Decimal(str(stats.total_earnings)) + total_commission
-        stats.save()
+        """
+        Mark delivery as completed, credit agent wallet and create commission
+        record (see completion.py). Returns the commission, or None if the
+        assignment was already delivered.
+        """
+        from .completion import complete_delivery
+        return complete_delivery(self)
     
     def mark_failed(self):
-        """Mark delivery as failed"""
+        """Mark delivery as failed; the last open stop of a run frees the agent"""
         self.status = 'failed'
         self.attempts_count += 1
         self.save()
+        if self.run_id:
+            from .route_batching import finish_run_if_done
+            if finish_run_if_done(self.run_id):
+                self.agent.availability_status = 'available'
+                self.agent.save(update_fields=['availability_status', 'updated_at'])
+
+
+# ===============================================
+#          DELIVERY RUN MODEL
+# ===============================================
+
+class DeliveryRun(models.Model):
+    """Several assignments delivered by one agent in one trip, in route order"""
+
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('completed', 'Completed'),
+    ]
+
+    agent = models.ForeignKey(DeliveryAgentProfile, on_delete=models.CASCADE, related_name='runs')
+    group_key = models.CharField(max_length=50)  # e.g. "vendor:12" or "pincode:411"
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+
+    stop_count = models.IntegerField(default=0)
+    total_distance = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)  # in km, stops with coordinates
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['agent', 'status']),
+        ]
+
+    def __str__(self):
+        return f"Run #{self.id} - {self.agent_id} ({self.stop_count} stops)"
 
 
 # ===============================================
@@ -358,8 +385,8 @@ class DeliveryTracking(models.Model):
     status = models.CharField(max_length=50)  # e.g., "Picked Up", "In Transit", "Arrived"
     speed = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)  # in km/h
     
-    # Timestamp
-    tracked_at = models.DateTimeField(auto_now_add=True)
+    # Timestamp (when the point was recorded on the device; batched uploads set it)
+    tracked_at = models.DateTimeField(default=timezone.now)
     
     # Additional Info
     notes = models.TextField(blank=True, null=True)
@@ -376,6 +403,32 @@ class DeliveryTracking(models.Model):
         return f"Tracking: {self.delivery_assignment.order.id} at {self.tracked_at}"
 
 
+class DeliveryTrackingArchive(models.Model):
+    """
+    A file of raw DeliveryTracking rows from one calendar month, moved out of
+    the hot table by `manage.py compact_tracking` and kept in the blob store
+    (gzipped CSV: assignment_id, tracked_at, latitude, longitude, speed, status, address, notes).
+    """
+
+    month = models.DateField()  # first day of the month the points were recorded in
+    blob_hash = models.CharField(max_length=64)
+    size = models.IntegerField(default=0)
+    row_count = models.IntegerField(default=0)
+    first_tracked_at = models.DateTimeField()
+    last_tracked_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-month', '-created_at']
+        indexes = [
+            models.Index(fields=['month']),
+        ]
+        verbose_name_plural = "Delivery Tracking Archives"
+
+    def __str__(self):
+        return f"Tracking archive {self.month:%Y-%m} ({self.row_count} points)"
+
+
 # ===============================================
 #        DELIVERY COMMISSION MODEL
 # ===============================================
@@ -561,6 +614,39 @@ class DeliveryDailyStats(models.Model):
         return f"{self.agent.user.username} - {self.date}"
 
 
+# ===============================================
+#      AGENT DASHBOARD SNAPSHOT MODEL
+# ===============================================
+
+class DeliveryAgentDashboard(models.Model):
+    """
+    Precomputed parts of the agent dashboard (deliveryAgent/dashboard.py),
+    refreshed section by section when assignments, commissions, feedback or
+    daily stats of the agent change.
+    """
+    agent = models.OneToOneField(DeliveryAgentProfile, on_delete=models.CASCADE, primary_key=True, related_name='dashboard')
+
+    # Assignments
+    active_assignments = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    active_orders = models.IntegerField(default=0)
+
+    # Commissions
+    pending_commission = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    pending_commissions = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+
+    # Feedback
+    recent_feedback = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+
+    # Daily stats of `stats_date`
+    today_stats = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    stats_date = models.DateField(null=True, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Dashboard - {self.agent_id}"
+
+
 # ===============================================
 #      DELIVERY FEEDBACK/RATING MODEL
 # ===============================================
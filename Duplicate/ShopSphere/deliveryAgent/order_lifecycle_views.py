@@ -5,8 +5,9 @@ Additional API views for the delivery agent order lifecycle:
   - NearbyOTPView       : Delivery agent signals "nearby" → generates & emails OTP
   - VerifyDeliveryOTPView: Delivery agent verifies OTP entered by customer → marks delivered
   - CustomerOrderTrackingView: Customer checks full order tracking status + history
+  - customer_order_tracking_stream: the same order pushed live over Server-Sent Events
 """
-import math
+import asyncio
 import random
 from django.db import transaction
 from django.utils import timezone
@@ -15,6 +16,8 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 
+from .completion import complete_delivery
+from .geo import haversine_km
 from .models import DeliveryAgentProfile, DeliveryAssignment
 
 
@@ -58,14 +61,7 @@ class NearbyOTPView(APIView):
             dest_lat = coords.get('latitude')
             dest_lon = coords.get('longitude')
             if dest_lat and dest_lon:
-                R = 6371000
-                phi1 = math.radians(float(agent_lat))
-                phi2 = math.radians(float(dest_lat))
-                dphi = math.radians(float(dest_lat) - float(agent_lat))
-                dlambda = math.radians(float(dest_lon) - float(agent_lon))
-                a = (math.sin(dphi / 2) ** 2
-                     + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2)
-                distance_m = 2 * R * math.asin(math.sqrt(a))
+                distance_m = haversine_km(agent_lat, agent_lon, dest_lat, dest_lon) * 1000
                 if distance_m > self.NEARBY_RADIUS_M:
                     return Response({
                         'error': (
@@ -167,6 +163,7 @@ class VerifyDeliveryOTPView(APIView):
             assignment = DeliveryAssignment.objects.select_related(
                 'order', 'order__user'
             ).get(id=pk, agent=agent)
+            assignment.agent = agent
         except DeliveryAssignment.DoesNotExist:
             return Response({'error': 'Assignment not found'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -178,17 +175,13 @@ class VerifyDeliveryOTPView(APIView):
             )
 
         try:
-            with transaction.atomic():
-                assignment.otp_verified = True
-                assignment.save(update_fields=['otp_verified'])
-
-                # use the model's built-in mark_delivered to handle status,
-                # timestamps, wallet credits, and commissions.
-                assignment.mark_delivered()
-
-                # Ensure agent is back to available
-                assignment.agent.availability_status = 'available'
-                assignment.agent.save(update_fields=['availability_status'])
+            # Status, timestamps, wallet credit, commission and counters in
+            # one transaction; the agent is made available again.
+            if complete_delivery(assignment, otp_verified=True, release_agent=True) is None:
+                return Response(
+                    {'error': 'This delivery has already been completed'},
+                    status=status.HTTP_409_CONFLICT,
+                )
 
             # Log
             try:
@@ -315,3 +308,153 @@ class CustomerOrderTrackingView(APIView):
                 for item in order.items.all()
             ],
         })
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+TRACKING_FINAL_STATUSES = ('delivered', 'cancelled', 'returned', 'rejected')
+
+
+def _stream_user(request):
+    """Session user, or the JWT from the Authorization header / ?token= (EventSource cannot set headers)."""
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+    auth = JWTAuthentication()
+    raw_token = request.GET.get('token')
+    header = auth.get_header(request)
+    if raw_token is None and header is not None:
+        raw_token = auth.get_raw_token(header)
+    if raw_token:
+        try:
+            return auth.get_user(auth.get_validated_token(raw_token))
+        except (InvalidToken, TokenError, AuthenticationFailed):
+            return None
+    user = request.user
+    return user if user.is_authenticated else None
+
+
+def _tracking_orders(user, order_number):
+    from django.db.models import Q
+    from user.models import Order
+    return Order.objects.filter(Q(order_number=order_number) | Q(transaction_id=order_number), user=user)
+
+
+def _tracking_order_id(user, order_number):
+    return _tracking_orders(user, order_number).values_list('id', flat=True).first()
+
+
+def _tracking_snapshot(user, order_number, last_event_id):
+    """(order, initial SSE messages) for the stream, or (None, None) if not the user's order."""
+    from .live_tracking import status_message
+
+    order = _tracking_orders(user, order_number).only('id', 'order_number', 'status').first()
+    if order is None:
+        return None, None
+
+    history = order.status_history.order_by('id')
+    if last_event_id is not None:
+        # Reconnect: replay only what the client missed.
+        messages = [status_message(h) for h in history.filter(id__gt=last_event_id)]
+    else:
+        messages = [{
+            'event': 'snapshot',
+            'id': max((h.id for h in history), default=None),
+            'data': {
+                'order_number': order.order_number,
+                'status': order.status,
+                'status_history': [status_message(h)['data'] for h in history],
+            },
+        }]
+    location = (
+        DeliveryAssignment.objects.filter(order_id=order.id)
+        .values_list('current_location', flat=True).first()
+    )
+    if location:
+        messages.append({'event': 'location', 'data': location})
+    return order, messages
+
+
+async def customer_order_tracking_stream(request, order_number):
+    """
+    GET /api/delivery/track/<order_number>/stream/
+    Live version of CustomerOrderTrackingView for the order owner, as
+    Server-Sent Events: a 'snapshot' event, then 'location' and 'status'
+    events as they happen (status event ids are OrderStatusHistory ids, so
+    EventSource reconnects with Last-Event-ID and only gets what it missed).
+    The stream ends when the order reaches a final status or after
+    LIVE_TRACKING_MAX_SECONDS; clients reconnect after the retry delay.
+
+    Needs an ASGI server (ShopSphere/asgi.py). Under WSGI the initial events
+    are sent and the response ends, so EventSource falls back to polling.
+    """
+    from asgiref.sync import sync_to_async
+    from django.conf import settings
+    from django.core.handlers.asgi import ASGIRequest
+    from django.http import JsonResponse, StreamingHttpResponse
+    from .live_tracking import channel_for, format_event, get_broker
+
+    user = await sync_to_async(_stream_user)(request)
+    if user is None:
+        return JsonResponse({'error': 'Authentication credentials were not provided.'}, status=401)
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    last_event_id = int(last_event_id) if str(last_event_id or '').isdigit() else None
+
+    heartbeat = getattr(settings, 'LIVE_TRACKING_HEARTBEAT_SECONDS', 15)
+    max_seconds = getattr(settings, 'LIVE_TRACKING_MAX_SECONDS', 1800)
+    retry_ms = getattr(settings, 'LIVE_TRACKING_RETRY_MS', 3000)
+    live = isinstance(request, ASGIRequest)
+
+    subscription = None
+    if live:
+        # Subscribe before reading the snapshot so nothing falls in between.
+        order_id = await sync_to_async(_tracking_order_id)(user, order_number)
+        if order_id is not None:
+            subscription = await get_broker().subscribe(channel_for(order_id))
+
+    order, messages = await sync_to_async(_tracking_snapshot)(user, order_number, last_event_id)
+    if order is None:
+        if subscription is not None:
+            await subscription.close()
+        return JsonResponse({'error': 'Order not found.'}, status=404)
+
+    if not live:
+        initial = [f'retry: {retry_ms}\n\n'.encode()] + [format_event(m) for m in messages]
+        response = StreamingHttpResponse(initial, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    async def events():
+        sent_id = last_event_id or 0
+        final = order.status in TRACKING_FINAL_STATUSES
+        try:
+            yield f'retry: {retry_ms}\n\n'.encode()
+            for message in messages:
+                sent_id = max(sent_id, message.get('id') or 0)
+                yield format_event(message)
+            if final:
+                return
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + max_seconds
+            while loop.time() < deadline:
+                message = await subscription.get(timeout=min(heartbeat, deadline - loop.time()))
+                if message is None:
+                    yield b': keepalive\n\n'
+                    continue
+                if message.get('id') is not None:
+                    if message['id'] <= sent_id:
+                        continue
+                    sent_id = message['id']
+                yield format_event(message)
+                if message['event'] == 'status' and message['data']['status'] in TRACKING_FINAL_STATUSES:
+                    return
+        finally:
+            if subscription is not None:
+                await subscription.close()
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,19 @@
+"""
+deliveryAgent/pagination.py
+
+Cursor pagination for delivery assignment lists. Pages are keyed on
+assigned_at (ties broken by id), so deep pages cost the same as the first
+and new assignments arriving between requests do not shift them.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class AssignmentCursorPagination(CursorPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-assigned_at', '-id')
+
+    def is_requested(self, request):
+        """Whether the client asked for pages (?cursor= or ?page_size=)."""
+        return self.cursor_query_param in request.query_params or self.page_size_query_param in request.query_params
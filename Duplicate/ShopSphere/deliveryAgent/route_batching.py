@@ -0,0 +1,361 @@
+"""
+deliveryAgent/route_batching.py
+
+Multi-drop runs: packed, unassigned orders that share a pickup are handed to
+one agent as a single trip with an optimised stop sequence, instead of one
+agent per parcel (auto_assign_order takes an agent off duty per order).
+
+1. Grouping. An order whose items all come from one vendor joins that
+   vendor's group ("vendor:<id>"); other orders group by the delivery
+   pincode's first ROUTE_PINCODE_PREFIX digits ("pincode:<prefix>").
+2. Splitting. A group larger than ROUTE_MAX_STOPS is toured and cut into
+   consecutive legs of the tour, which keeps every run compact. Groups
+   above ROUTE_TOUR_MAX_STOPS are first cut in two at the median of their
+   wider coordinate axis (repeatedly) and each part is toured on its own,
+   so the distance matrix and 2-opt stay bounded.
+3. Agent. Each run goes to an available agent serving every stop (best
+   common tier, then nearest to the first stop, then least loaded); an
+   agent gets at most one run per pass.
+4. Sequence. The stops are ordered from the agent's position with nearest
+   neighbour followed by 2-opt on the geo.distance_matrix() of the stops.
+   Stops without coordinates (Address.latitude/longitude unset) follow the
+   routed ones in pincode order.
+
+plan_delivery_runs() only reads; commit_delivery_runs() creates the
+assignments through batch_assignment.commit_batch_assignment() (same
+staleness checks, history and notifications) and records the DeliveryRun
+and each assignment's run_sequence. The agent stays on delivery until the
+run's last stop is delivered or failed (finish_run_if_done()); completion.py
+and DeliveryAssignment.mark_failed() then make the agent available again.
+"""
+from collections import defaultdict, namedtuple
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .geo import distance_matrix
+
+DEFAULT_RUN_LIMIT = 500
+MAX_RUN_LIMIT = 1000             # API bounds (RouteBatchingView)
+MAX_RUN_STOPS = 25
+TOUR_MAX_STOPS = 200             # largest part of a group toured at once (n x n matrix, O(n^2) 2-opt passes)
+RUN_ORDER_STATUSES = ('packed',)
+FINISHED_STOP_STATUSES = ('delivered', 'failed', 'cancelled', 'rejected')
+
+PlannedStop = namedtuple('PlannedStop', ['order_id', 'sequence', 'latitude', 'longitude', 'pincode', 'leg_km'])
+PlannedRun = namedtuple('PlannedRun', ['agent_id', 'group_key', 'tier', 'stops', 'total_distance_km'])
+RoutePlan = namedtuple('RoutePlan', ['runs', 'unassigned'])
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# -- route solver -------------------------------------------------------------
+
+def nearest_neighbour(dist, start=0):
+    """Visiting order of every node of `dist` greedily from `start`."""
+    n = len(dist)
+    visited = np.zeros(n, dtype=bool)
+    route = [start]
+    visited[start] = True
+    for _ in range(n - 1):
+        row = np.where(visited, np.inf, dist[route[-1]])
+        nxt = int(np.argmin(row))
+        route.append(nxt)
+        visited[nxt] = True
+    return route
+
+
+def two_opt(route, dist, max_passes=50):
+    """
+    Improve `route` by reversing segments while that shortens it. The first
+    and last nodes stay in place (the caller pins the start and uses a
+    zero-distance end node for open paths). Each candidate move is scored
+    for all segment ends at once.
+    """
+    route = np.asarray(route)
+    n = len(route)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, n - 2):
+            a, b = route[i - 1], route[i]
+            c, d = route[i + 1:n - 1], route[i + 2:n]
+            delta = dist[a, c] + dist[b, d] - dist[a, b] - dist[c, d]
+            j = int(np.argmin(delta))
+            if delta[j] < -1e-9:
+                route[i:i + j + 2] = route[i:i + j + 2][::-1]
+                improved = True
+        if not improved:
+            break
+    return route.tolist()
+
+
+def solve_route(latitudes, longitudes, start=None):
+    """
+    (order, legs_km): visiting order of the points (indices) and the length
+    of each leg, starting from `start` (lat, lon) when given or from
+    whichever end is best otherwise. The path is open: it ends at the last
+    stop. Points must all have coordinates.
+    """
+    n = len(latitudes)
+    if n == 0:
+        return [], []
+    if start is not None:
+        lats = [start[0], *latitudes]
+        lons = [start[1], *longitudes]
+    else:
+        lats, lons = [latitudes[0], *latitudes], [longitudes[0], *longitudes]
+    dist = np.zeros((n + 2, n + 2))
+    dist[:n + 1, :n + 1] = distance_matrix(lats, lons, lats, lons)
+    if start is None:
+        # Free start: node 0 is a dummy at zero distance from every stop.
+        dist[0, :] = dist[:, 0] = 0.0
+    # Node n + 1 is the open end: zero distance from every stop.
+    dist[n + 1, :] = dist[:, n + 1] = 0.0
+
+    route = nearest_neighbour(dist[:n + 1, :n + 1], 0) + [n + 1]
+    route = two_opt(route, dist)
+    stops = route[1:-1]
+    legs = [float(dist[prev, node]) for prev, node in zip(route[:-2], stops)]
+    return [node - 1 for node in stops], legs
+
+
+# -- planning -----------------------------------------------------------------
+
+def _coordinates(address):
+    lat, lon = getattr(address, 'latitude', None), getattr(address, 'longitude', None)
+    return (float(lat), float(lon)) if lat is not None and lon is not None else (None, None)
+
+
+def group_orders(orders, vendors_by_order):
+    """{group_key: [order, ...]} from orders with their delivery address loaded."""
+    prefix = _setting('ROUTE_PINCODE_PREFIX', 3)
+    groups = defaultdict(list)
+    for order in orders:
+        vendors = vendors_by_order.get(order.id, set())
+        if len(vendors) == 1:
+            key = f'vendor:{next(iter(vendors))}'
+        else:
+            key = f'pincode:{(order.delivery_address.pincode or "")[:prefix]}'
+        groups[key].append(order)
+    return groups
+
+
+def _sequence(orders, start=None):
+    """Orders in route order with their legs: routed stops first, the rest by pincode."""
+    located = [o for o in orders if _coordinates(o.delivery_address)[0] is not None]
+    unlocated = sorted(
+        (o for o in orders if _coordinates(o.delivery_address)[0] is None),
+        key=lambda o: (o.delivery_address.pincode or '', o.id),
+    )
+    coords = [_coordinates(o.delivery_address) for o in located]
+    order, legs = solve_route([c[0] for c in coords], [c[1] for c in coords], start)
+    return [located[i] for i in order] + unlocated, legs + [None] * len(unlocated)
+
+
+def _partition(orders, size, unit):
+    """
+    Orders with coordinates in spatially compact parts of at most `size`:
+    recursive cuts at the median of the wider axis. Every part but the last
+    holds a multiple of `unit` orders, so legs cut from the parts' tours
+    never straddle two parts.
+    """
+    if len(orders) <= size:
+        return [orders]
+    coords = np.array([_coordinates(o.delivery_address) for o in orders])
+    axis = int(np.argmax(coords.max(axis=0) - coords.min(axis=0)))
+    ranked = [orders[i] for i in np.argsort(coords[:, axis], kind='stable')]
+    half = max(unit, len(orders) // 2 // unit * unit)
+    return _partition(ranked[:half], size, unit) + _partition(ranked[half:], size, unit)
+
+
+def _split(orders, max_stops):
+    """Consecutive legs of the tours through the group, at most `max_stops` each."""
+    if len(orders) <= max_stops:
+        return [orders]
+    located = [o for o in orders if _coordinates(o.delivery_address)[0] is not None]
+    unlocated = [o for o in orders if _coordinates(o.delivery_address)[0] is None]
+    tour_size = max(_setting('ROUTE_TOUR_MAX_STOPS', TOUR_MAX_STOPS), max_stops)
+    ordered = []
+    for part in _partition(located, tour_size, max_stops):
+        ordered.extend(_sequence(part)[0])
+    ordered.extend(_sequence(unlocated)[0])
+    return [ordered[i:i + max_stops] for i in range(0, len(ordered), max_stops)]
+
+
+def _choose_agent(index, entries, loads, used, orders):
+    """(agent_id, tier) of the best available agent serving every order, or (None, None)."""
+    common = None
+    for order in orders:
+        address = order.delivery_address
+        serving = index.serving(address.pincode, address.city, address.state)
+        if common is None:
+            common = serving
+        else:
+            # Worst tier across the stops is the run's tier.
+            common = {a: max(t, serving[a]) for a, t in common.items() if a in serving}
+        if not common:
+            return None, None
+    candidates = [a for a in common if a not in used and a in entries]
+    if not candidates:
+        return None, None
+
+    first_lat, first_lon = next(
+        (_coordinates(o.delivery_address) for o in orders if _coordinates(o.delivery_address)[0] is not None),
+        (None, None),
+    )
+    if first_lat is not None:
+        distances = distance_matrix(
+            [first_lat], [first_lon],
+            [entries[a].lat for a in candidates], [entries[a].lon for a in candidates],
+        )[0]
+        distances = np.nan_to_num(distances, nan=np.inf)
+    else:
+        distances = np.full(len(candidates), np.inf)
+    best = min(
+        range(len(candidates)),
+        key=lambda i: (common[candidates[i]], distances[i], loads.get(candidates[i], 0), candidates[i]),
+    )
+    return candidates[best], common[candidates[best]]
+
+
+def plan_delivery_runs(limit=DEFAULT_RUN_LIMIT, max_stops=None, orders=None):
+    """Compute (without writing) multi-stop runs for the oldest `limit` packed, unassigned orders."""
+    from user.models import OrderItem
+    from .agent_index import active_assignment_counts, get_agent_index
+    from .services import get_unassigned_confirmed_orders
+
+    max_stops = max_stops or _setting('ROUTE_MAX_STOPS', 8)
+    if orders is None:
+        orders = list(
+            get_unassigned_confirmed_orders()
+            .filter(status__in=RUN_ORDER_STATUSES, delivery_address__isnull=False)
+            .order_by('created_at')[:limit]
+        )
+    orders = [order for order in orders if order.delivery_address is not None]
+    if not orders:
+        return RoutePlan([], [])
+
+    vendors_by_order = defaultdict(set)
+    for order_id, vendor_id in (
+        OrderItem.objects.filter(order_id__in=[o.id for o in orders], vendor__isnull=False)
+        .values_list('order_id', 'vendor_id').distinct()
+    ):
+        vendors_by_order[order_id].add(vendor_id)
+
+    index = get_agent_index()
+    entries = {entry.id: entry for entry in index.snapshot()}
+    loads = active_assignment_counts(list(entries)) if entries else {}
+
+    runs, unassigned, used = [], [], set()
+    # Largest groups first: they gain the most from sharing an agent.
+    groups = sorted(group_orders(orders, vendors_by_order).items(), key=lambda item: (-len(item[1]), item[0]))
+    for group_key, group in groups:
+        for chunk in _split(group, max_stops):
+            agent_id, tier = _choose_agent(index, entries, loads, used, chunk)
+            if agent_id is None:
+                unassigned.extend(order.id for order in chunk)
+                continue
+            used.add(agent_id)
+            entry = entries[agent_id]
+            start = (entry.lat, entry.lon) if entry.lat is not None and entry.lon is not None else None
+            ordered, legs = _sequence(chunk, start)
+            stops = []
+            for sequence, (order, leg) in enumerate(zip(ordered, legs), start=1):
+                lat, lon = _coordinates(order.delivery_address)
+                stops.append(PlannedStop(
+                    order_id=order.id, sequence=sequence, latitude=lat, longitude=lon,
+                    pincode=order.delivery_address.pincode,
+                    leg_km=None if leg is None else round(leg, 2),
+                ))
+            runs.append(PlannedRun(
+                agent_id=agent_id, group_key=group_key, tier=tier, stops=stops,
+                total_distance_km=round(sum(leg for leg in legs if leg is not None), 2),
+            ))
+    return RoutePlan(runs, unassigned)
+
+
+# -- commit -------------------------------------------------------------------
+
+def commit_delivery_runs(plan):
+    """
+    Create the assignments of every planned run, one transaction per run.
+    Returns the created DeliveryRuns; stops whose order or agent changed
+    since planning are left out (a run left with no stops is skipped).
+    """
+    from .batch_assignment import BatchPlan, PlannedAssignment, commit_batch_assignment
+    from .models import DeliveryAssignment, DeliveryRun
+
+    created_runs = []
+    for planned in plan.runs:
+        with transaction.atomic():
+            assignments = commit_batch_assignment(BatchPlan(
+                [PlannedAssignment(s.order_id, planned.agent_id, planned.tier, s.leg_km, 0.0) for s in planned.stops],
+                [], 0.0,
+            ))
+            if not assignments:
+                continue
+            by_order = {a.order_id: a for a in assignments}
+            stops = [s for s in planned.stops if s.order_id in by_order]
+            run = DeliveryRun.objects.create(
+                agent_id=planned.agent_id,
+                group_key=planned.group_key,
+                stop_count=len(stops),
+                total_distance=planned.total_distance_km if len(stops) == len(planned.stops) else None,
+            )
+            for sequence, stop in enumerate(stops, start=1):
+                assignment = by_order[stop.order_id]
+                assignment.run = run
+                assignment.run_sequence = sequence
+                assignment.route_distance = stop.leg_km
+            DeliveryAssignment.objects.bulk_update(assignments, ['run', 'run_sequence', 'route_distance'])
+            created_runs.append(run)
+    return created_runs
+
+
+def finish_run_if_done(run_id):
+    """Close the run once none of its stops is still open. Returns whether it is finished."""
+    from django.utils import timezone
+    from .models import DeliveryAssignment, DeliveryRun
+
+    if DeliveryAssignment.objects.filter(run_id=run_id).exclude(status__in=FINISHED_STOP_STATUSES).exists():
+        return False
+    DeliveryRun.objects.filter(id=run_id, status='active').update(status='completed', completed_at=timezone.now())
+    return True
+
+
+def describe_route(run, assignments):
+    """JSON-ready route of a run from its assignments (any order)."""
+    return {
+        'run_id': run.id,
+        'status': run.status,
+        'stop_count': run.stop_count,
+        'total_distance_km': float(run.total_distance) if run.total_distance is not None else None,
+        'stops': [
+            {
+                'assignment_id': a.id,
+                'sequence': a.run_sequence,
+                'status': a.status,
+                'delivery_address': a.delivery_address,
+                'coordinates': a.delivery_coordinates or None,
+                'leg_km': float(a.route_distance) if a.route_distance is not None else None,
+            }
+            for a in sorted(assignments, key=lambda a: (a.run_sequence or 0, a.id))
+        ],
+    }
+
+
+def describe_plan(plan):
+    """JSON-ready summary of a RoutePlan."""
+    return {
+        'runs': [
+            {**run._asdict(), 'stops': [stop._asdict() for stop in run.stops]}
+            for run in plan.runs
+        ],
+        'run_count': len(plan.runs),
+        'order_count': sum(len(run.stops) for run in plan.runs),
+        'unassigned_order_ids': plan.unassigned,
+        'unassigned_count': len(plan.unassigned),
+    }
@@ -46,6 +46,7 @@ class DeliveryAssignmentListSerializer(serializers.ModelSerializer):
     delivery_time = serializers.DateTimeField(read_only=True)
     assigned_at = serializers.DateTimeField(read_only=True)
     order_status = serializers.CharField(source='order.status', read_only=True)
+    run_id = serializers.IntegerField(read_only=True)
 
     def get_estimated_delivery_date(self, obj):
         if not obj.estimated_delivery_date: return None
@@ -53,6 +54,23 @@ class DeliveryAssignmentListSerializer(serializers.ModelSerializer):
             return obj.estimated_delivery_date.date()
         return obj.estimated_delivery_date
     items = serializers.SerializerMethodField()
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Prefetch plan for this serializer: the agent and customer are joined,
+        order items come in one extra query for the whole list.
+        """
+        from django.db.models import Prefetch
+        from user.models import OrderItem
+
+        return queryset.select_related('agent__user', 'order__user').defer(
+            *DeliveryAgentProfile.document_defer_paths('agent')
+        ).prefetch_related(
+            Prefetch('order__items', queryset=OrderItem.objects.only(
+                'id', 'order_id', 'product_name', 'quantity', 'product_price',
+            ))
+        )
     
     def get_items(self, obj):
         return [
@@ -70,15 +88,24 @@ class DeliveryAssignmentListSerializer(serializers.ModelSerializer):
             'delivery_city', 'delivery_address', 'pickup_address',
             'status', 'order_status', 'estimated_delivery_date',
             'pickup_time', 'delivery_time', 'delivery_fee', 'assigned_at',
-            'items'
+            'items', 'run_id', 'run_sequence'
         ]
-        read_only_fields = ['id', 'assigned_at']
+        read_only_fields = ['id', 'assigned_at', 'run_id', 'run_sequence']
 
 
 class DeliveryAssignmentDetailSerializer(serializers.ModelSerializer):
-    """Detailed delivery assignment serializer"""
+    """
+    Detailed delivery assignment serializer.
+
+    The route comes as `track`, the simplified polyline (track_compaction.py).
+    The raw `tracking_history` points are only included when the request asks
+    for them with ?tracking_history=full. `route` lists the stops of the
+    assignment's multi-stop run (route_batching.py) in delivery order.
+    """
     agent = serializers.SerializerMethodField()
     order_details = serializers.SerializerMethodField()
+    track = serializers.SerializerMethodField()
+    route = serializers.SerializerMethodField()
     tracking_history = DeliveryTrackingSerializer(many=True, read_only=True)
     
     estimated_delivery_date = serializers.SerializerMethodField()
@@ -106,19 +133,40 @@ class DeliveryAssignmentDetailSerializer(serializers.ModelSerializer):
             'delivery_fee', 'customer_contact', 'agent_contact_allowed',
             'assigned_at', 'accepted_at', 'started_at', 'completed_at',
             'signature_image', 'delivery_photo', 'otp_verified',
-            'tracking_history'
+            'track', 'route', 'tracking_history'
         ]
         read_only_fields = [
             'id', 'assigned_at', 'accepted_at', 'started_at', 'completed_at',
             'otp_verified', 'tracking_history'
         ]
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        params = getattr(request, 'query_params', None) or getattr(request, 'GET', {})
+        if params.get('tracking_history') != 'full':
+            self.fields.pop('tracking_history')
+
+    def get_track(self, obj):
+        from .track_compaction import track_for
+        return track_for(obj)
+
+    def get_route(self, obj):
+        """Every stop of the assignment's multi-stop run in delivery order, or None."""
+        if not obj.run_id:
+            return None
+        from .route_batching import describe_route
+        stops = DeliveryAssignment.objects.filter(run_id=obj.run_id).only(
+            'id', 'run_sequence', 'status', 'delivery_address', 'delivery_coordinates', 'route_distance',
+        )
+        return describe_route(obj.run, stops)
+
     signature_image = serializers.SerializerMethodField()
     delivery_photo = serializers.SerializerMethodField()
 
     def get_signature_image(self, obj):
         request = self.context.get('request')
-        if obj.signature_image_data:
+        if obj.has_document('signature_image'):
             from django.urls import reverse
             path = reverse('serve_delivery_signature', kwargs={'assignment_id': obj.id})
             return request.build_absolute_uri(path) if request else path
@@ -126,7 +174,7 @@ class DeliveryAssignmentDetailSerializer(serializers.ModelSerializer):
 
     def get_delivery_photo(self, obj):
         request = self.context.get('request')
-        if obj.delivery_photo_data:
+        if obj.has_document('delivery_photo'):
             from django.urls import reverse
             path = reverse('serve_delivery_photo', kwargs={'assignment_id': obj.id})
             return request.build_absolute_uri(path) if request else path
@@ -346,7 +394,7 @@ class DeliveryAgentProfileDetailSerializer(serializers.ModelSerializer):
 
     def get_vehicle_registration(self, obj):
         request = self.context.get('request')
-        if obj.vehicle_registration_data:
+        if obj.has_document('vehicle_registration'):
             from django.urls import reverse
             path = reverse('serve_agent_vehicle_registration', kwargs={'agent_id': obj.id})
             return request.build_absolute_uri(path) if request else path
@@ -354,7 +402,7 @@ class DeliveryAgentProfileDetailSerializer(serializers.ModelSerializer):
 
     def get_vehicle_insurance(self, obj):
         request = self.context.get('request')
-        if obj.vehicle_insurance_data:
+        if obj.has_document('vehicle_insurance'):
             from django.urls import reverse
             path = reverse('serve_agent_vehicle_insurance', kwargs={'agent_id': obj.id})
             return request.build_absolute_uri(path) if request else path
@@ -362,7 +410,7 @@ class DeliveryAgentProfileDetailSerializer(serializers.ModelSerializer):
 
     def get_license_file(self, obj):
         request = self.context.get('request')
-        if obj.license_file_data:
+        if obj.has_document('license_file'):
             from django.urls import reverse
             path = reverse('serve_agent_license', kwargs={'agent_id': obj.id})
             return request.build_absolute_uri(path) if request else path
@@ -370,16 +418,22 @@ class DeliveryAgentProfileDetailSerializer(serializers.ModelSerializer):
 
     def get_id_proof_file(self, obj):
         request = self.context.get('request')
-        if obj.id_proof_data:
+        if obj.has_document('id_proof'):
             from django.urls import reverse
             path = reverse('serve_agent_id_proof', kwargs={'agent_id': obj.id})
             return request.build_absolute_uri(path) if request else path
         return None
     
     def get_pending_commission(self, obj):
+        dashboard = self.context.get('dashboard')
+        if dashboard is not None:
+            return str(dashboard.pending_commission)
         return str(obj.get_pending_commission())
     
     def get_active_orders(self, obj):
+        dashboard = self.context.get('dashboard')
+        if dashboard is not None:
+            return dashboard.active_orders
         return obj.get_current_active_orders()
 
 
@@ -549,50 +603,38 @@ class DeliveryAgentProfileCreateSerializer(serializers.ModelSerializer):
 # ===============================================
 
 class DeliveryAgentDashboardSerializer(serializers.Serializer):
-    """Comprehensive delivery agent dashboard data"""
-    profile = DeliveryAgentProfileDetailSerializer(source='*', read_only=True)
+    """
+    Comprehensive delivery agent dashboard data. Everything but the profile
+    comes from the agent's DeliveryAgentDashboard snapshot (dashboard.py).
+    """
+    profile = serializers.SerializerMethodField()
     active_assignments = serializers.SerializerMethodField()
     today_stats = serializers.SerializerMethodField()
     recent_feedback = serializers.SerializerMethodField()
-    pending_commissions = DeliveryCommissionSerializer(source='delivery_commissions', many=True, read_only=True)
-    
+    pending_commissions = serializers.SerializerMethodField()
+
+    def _dashboard(self, obj):
+        if 'dashboard' not in self.context:
+            from .dashboard import get_dashboard
+            self.context['dashboard'] = get_dashboard(obj)
+        return self.context['dashboard']
+
+    def get_profile(self, obj):
+        self._dashboard(obj)
+        return DeliveryAgentProfileDetailSerializer(obj, context=self.context).data
+
     def get_active_assignments(self, obj):
         """Get currently active delivery assignments"""
-        active = DeliveryAssignment.objects.filter(
-            agent=obj,
-            status__in=['assigned', 'accepted', 'picked_up', 'in_transit']
-        ).order_by('-assigned_at')[:5]
-        return DeliveryAssignmentListSerializer(active, many=True).data
+        return self._dashboard(obj).active_assignments
     
     def get_today_stats(self, obj):
         """Get today's statistics"""
-        from django.utils import timezone
-        today = timezone.now().date()
-        stats = DeliveryDailyStats.objects.filter(
-            agent=obj,
-            date=today
-        ).first()
-        
-        if stats:
-            return DeliveryDailyStatsSerializer(stats).data
-        
-        return {
-            'total_deliveries_assigned': 0,
-            'total_deliveries_completed': 0,
-            'total_deliveries_failed': 0,
-            'total_hours_worked': '0.00',
-            'average_delivery_time': '0.00',
-            'total_distance': '0.00',
-            'average_distance_per_delivery': '0.00',
-            'total_earnings': '0.00',
-            'total_bonus': '0.00',
-            'customer_ratings_received': 0,
-            'average_rating': '0.00',
-        }
+        return self._dashboard(obj).today_stats
     
     def get_recent_feedback(self, obj):
         """Get recent customer feedback"""
-        feedback = DeliveryFeedback.objects.filter(
-            agent=obj
-        ).order_by('-created_at')[:5]
-        return DeliveryFeedbackSerializer(feedback, many=True).data
+        return self._dashboard(obj).recent_feedback
+
+    def get_pending_commissions(self, obj):
+        """Latest commissions awaiting payout"""
+        return self._dashboard(obj).pending_commissions
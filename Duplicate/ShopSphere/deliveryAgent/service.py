@@ -7,29 +7,11 @@ from django.utils import timezone
 from datetime import timedelta
 from decimal import Decimal
 
-from .models import DeliveryAgentProfile, DeliveryAssignment, DeliveryTracking
+from .agent_index import find_best_agent
+from .models import DeliveryAssignment, DeliveryTracking
 
+from .geo import haversine_km as haversine_distance  # noqa: F401  (kept importable from here)
 
-import math
-
-def haversine_distance(lat1, lon1, lat2, lon2):
-    """
-    Calculate the great circle distance between two points 
-    on the earth (specified in decimal degrees)
-    """
-    if None in [lat1, lon1, lat2, lon2]:
-        return float('inf')
-        
-    # convert decimal degrees to radians 
-    lat1, lon1, lat2, lon2 = map(math.radians, [float(lat1), float(lon1), float(lat2), float(lon2)])
-
-    # haversine formula 
-    dlon = lon2 - lon1 
-    dlat = lat2 - lat1 
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a)) 
-    r = 6371 # Radius of earth in kilometers. Use 3956 for miles
-    return c * r
 
 def auto_assign_order(order):
     """
@@ -49,10 +31,6 @@ def auto_assign_order(order):
         return None
 
     delivery_city = (delivery_address.city or '').strip().lower()
-    delivery_state = (delivery_address.state or '').strip().lower()
-    delivery_pincode = (delivery_address.pincode or '').strip()
-    delivery_lat = delivery_address.latitude
-    delivery_lon = delivery_address.longitude
 
     if not delivery_city:
         return None
@@ -61,74 +39,11 @@ def auto_assign_order(order):
     if DeliveryAssignment.objects.filter(order=order).exists():
         return None
 
-    # ── Find all eligible agents ─────────────────────────────────────────
-    candidates = DeliveryAgentProfile.objects.filter(
-        approval_status='approved',
-        availability_status='available',
-        is_blocked=False,
-        is_active=True,
-    )
-
-    matched_pincode = []  # Tier 1: Exact Pincode
-    matched_region = []   # Tier 2: Same Pincode Region (First 3 digits)
-    matched_city = []     # Tier 3: Same City
-
-    for agent in candidates:
-        agent_city = (agent.city or '').strip().lower()
-        service_cities = [c.strip().lower() for c in (agent.service_cities or []) if c]
-        service_pincodes = [str(p).strip() for p in (agent.service_pincodes or []) if p]
-        
-        # 1. Check Exact Pincode Match
-        pincode_match = delivery_pincode in service_pincodes or agent.postal_code == delivery_pincode
-        
-        # 2. Check Regional Match (First 3 digits of Pincode)
-        region_match = False
-        if not pincode_match and len(delivery_pincode) >= 3:
-            delivery_prefix = delivery_pincode[:3]
-            agent_prefixes = [p[:3] for p in service_pincodes if len(p) >= 3]
-            region_match = delivery_prefix in agent_prefixes or (agent.postal_code or '')[:3] == delivery_prefix
-
-        # 3. Check City/State Match
-        city_match = (
-            agent_city == delivery_city
-            or delivery_city in service_cities
-            or delivery_state in service_cities
-        )
-
-        if pincode_match or region_match or city_match:
-            active_count = DeliveryAssignment.objects.filter(
-                agent=agent,
-                status__in=['assigned', 'accepted', 'picked_up', 'in_transit']
-            ).count()
-            
-            # Calculate distance if coordinates available
-            distance = haversine_distance(delivery_lat, delivery_lon, agent.latitude, agent.longitude)
-            
-            # Tiered assignment
-            if pincode_match:
-                matched_pincode.append((agent, distance, active_count))
-            elif region_match:
-                matched_region.append((agent, distance, active_count))
-            else:
-                matched_city.append((agent, distance, active_count))
-
-    # Selection Priority: Tier 1 > Tier 2 > Tier 3
-    if matched_pincode:
-        tier_candidates = matched_pincode
-    elif matched_region:
-        tier_candidates = matched_region
-    else:
-        tier_candidates = matched_city
-
-    if not tier_candidates:
+    # ── Pick the agent: pincode > region > city tier, then distance, then load ──
+    best_agent, _tier = find_best_agent(delivery_address)
+    if best_agent is None:
         return None
 
-    # Sort logic: 
-    # 1. Proximity (Distance) if coordinate exists (distance != inf)
-    # 2. Number of active orders (Load balance)
-    tier_candidates.sort(key=lambda x: (x[1], x[2]))
-    best_agent = tier_candidates[0][0]
-
     # ── Compute delivery fee ─────────────────────────────────────────────────
     # Simple rule: ₹50 base, +₹30 if out-of-city vs agent's primary city
     is_same_city = (best_agent.city or '').strip().lower() == delivery_city
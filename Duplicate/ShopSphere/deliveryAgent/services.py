@@ -2,84 +2,36 @@
 deliveryAgent/services.py
 
 Auto-assignment of orders to the nearest available delivery agent.
-Uses the Haversine formula to calculate geodesic distance.
+Distances come from deliveryAgent/geo.py.
 """
-import math
 import random
 from datetime import timedelta
 from decimal import Decimal
 
 from django.utils import timezone
 
+from .geo import haversine_km  # noqa: F401  (kept importable from here)
 
-def haversine_km(lat1, lon1, lat2, lon2):
-    """Return the great-circle distance (km) between two GPS coordinates."""
-    R = 6371.0  # Earth radius in km
-    phi1, phi2 = math.radians(float(lat1)), math.radians(float(lat2))
-    dphi = math.radians(float(lat2) - float(lat1))
-    dlambda = math.radians(float(lon2) - float(lon1))
-    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
-    return 2 * R * math.asin(math.sqrt(a))
 
-
-def auto_assign_order(order):
+def get_unassigned_confirmed_orders():
     """
-    Find the nearest available approved delivery agent and create a
-    DeliveryAssignment for the given order.
-
-    Returns the created DeliveryAssignment, or None if no agent found.
+    Return queryset of confirmed/paid orders that have no DeliveryAssignment yet.
+    Useful for admin dashboard to see orders needing manual assignment.
     """
-    from .models import DeliveryAgentProfile, DeliveryAssignment
+    from user.models import Order
+    from .models import DeliveryAssignment
 
-    # Delivery address coordinates from order (if stored)
-    delivery_coords = {}
-    try:
-        if hasattr(order, 'delivery_assignment'):
-            # Already assigned – nothing to do
-            return order.delivery_assignment
-    except Exception:
-        pass
+    assigned_order_ids = DeliveryAssignment.objects.values_list('order_id', flat=True)
+    return Order.objects.filter(
+        payment_status='completed'
+    ).exclude(
+        id__in=assigned_order_ids
+    ).select_related('delivery_address', 'user').order_by('-created_at')
 
-    # Candidate agents: approved, available, not blocked
-    candidates = DeliveryAgentProfile.objects.filter(
-        approval_status='approved',
-        availability_status='available',
-        is_blocked=False,
-        latitude__isnull=False,
-        longitude__isnull=False,
-    )
-
-    if not candidates.exists():
-        # Fallback: pick any approved agent even if unavailable
-        candidates = DeliveryAgentProfile.objects.filter(
-            approval_status='approved',
-            is_blocked=False,
-        )
-        if not candidates.exists():
-            return None
 
-    # Try to get order delivery coordinates
-    dest_lat, dest_lon = None, None
-    if order.delivery_address:
-        # In a real system you'd geocode the address; for now use agent city matching
-        pass
-
-    # Sort by distance if we have destination coordinates; otherwise random
-    best_agent = None
-    if dest_lat and dest_lon:
-        min_dist = float('inf')
-        for agent in candidates:
-            if agent.latitude and agent.longitude:
-                dist = haversine_km(agent.latitude, agent.longitude, dest_lat, dest_lon)
-                if dist < min_dist:
-                    min_dist = dist
-                    best_agent = agent
-    else:
-        # No coordinates available – pick the first available agent
-        best_agent = candidates.first()
-
-    if not best_agent:
-        return None
+def build_assignment(order, agent):
+    """Unsaved DeliveryAssignment of `order` to `agent` with the default fee and ETA."""
+    from .models import DeliveryAssignment
 
     # Build address string
     address = order.delivery_address
@@ -88,22 +40,68 @@ def auto_assign_order(order):
         if address else "Address on file"
     )
 
-    # Create the assignment
+    coordinates = {}
+    if address and address.latitude is not None and address.longitude is not None:
+        coordinates = {'latitude': float(address.latitude), 'longitude': float(address.longitude)}
+
     otp = f"{random.randint(100000, 999999)}"
-    assignment = DeliveryAssignment.objects.create(
-        agent=best_agent,
+    return DeliveryAssignment(
+        agent=agent,
         order=order,
         status='assigned',
-        pickup_address=f"{best_agent.address}, {best_agent.city}",
+        pickup_address=f"{agent.address}, {agent.city}",
         delivery_address=addr_str,
-        delivery_city=address.city if address else best_agent.city,
-        delivery_coordinates={},
+        delivery_city=address.city if address else agent.city,
+        delivery_coordinates=coordinates,
         estimated_delivery_date=timezone.now().date() + timedelta(days=2),
         delivery_fee=Decimal('50.00'),
         customer_contact=address.phone if address else '',
         otp_code=otp,
     )
 
+
+def auto_assign_order(order):
+    """
+    Find the nearest available approved delivery agent and create a
+    DeliveryAssignment for the given order.
+
+    Returns the created DeliveryAssignment, or None if no agent found.
+    """
+    from .models import DeliveryAgentProfile
+
+    try:
+        if hasattr(order, 'delivery_assignment'):
+            # Already assigned – nothing to do
+            return order.delivery_assignment
+    except Exception:
+        pass
+
+    # Best agent serving the delivery area (pincode > region > city, then
+    # distance, then active load) from the in-memory agent index.
+    from .agent_index import find_best_agent
+    best_agent, _tier = find_best_agent(order.delivery_address)
+
+    if best_agent is None:
+        # No agent serves this area: any available agent, else any approved one.
+        best_agent = (
+            DeliveryAgentProfile.objects.filter(
+                approval_status='approved',
+                availability_status='available',
+                is_blocked=False,
+            ).first()
+            or DeliveryAgentProfile.objects.filter(
+                approval_status='approved',
+                is_blocked=False,
+            ).first()
+        )
+
+    if not best_agent:
+        return None
+
+    # Create the assignment
+    assignment = build_assignment(order, best_agent)
+    assignment.save()
+
     # Mark agent as on_delivery
     best_agent.availability_status = 'on_delivery'
     best_agent.save(update_fields=['availability_status'])
@@ -0,0 +1,78 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .agent_index import get_agent_index, publish_agent_change
+from .models import DeliveryAgentProfile
+
+
+# ── Agent matching index (deliveryAgent/agent_index.py) ────────────────────
+
+@receiver(post_save, sender=DeliveryAgentProfile)
+def index_agent_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        publish_agent_change(instance)
+
+
+@receiver(post_delete, sender=DeliveryAgentProfile)
+def unindex_agent_on_delete(sender, instance, **kwargs):
+    get_agent_index().remove(instance.id)
+
+
+# ── Live tracking stream (deliveryAgent/live_tracking.py) ──────────────────
+
+from user.models import OrderStatusHistory
+from .live_tracking import publish_status
+
+
+@receiver(post_save, sender=OrderStatusHistory)
+def push_order_status(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        publish_status(instance)
+
+
+# ── Agent dashboard snapshot (deliveryAgent/dashboard.py) ──────────────────
+
+from user.models import Order
+from .dashboard import schedule_refresh
+from .models import DeliveryAssignment, DeliveryCommission, DeliveryDailyStats, DeliveryFeedback
+
+
+@receiver(post_save, sender=DeliveryAssignment)
+@receiver(post_delete, sender=DeliveryAssignment)
+def refresh_dashboard_on_assignment(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_refresh([instance.agent_id], 'assignments')
+
+
+@receiver(post_save, sender=Order)
+def refresh_dashboard_on_order(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Active assignments show the order's status and customer.
+    if raw or (update_fields is not None and 'status' not in update_fields):
+        return
+    agent_ids = (
+        [instance.delivery_agent_id] if instance.delivery_agent_id
+        else DeliveryAssignment.objects.filter(
+            order_id=instance.id,
+        ).exclude(status='delivered').values_list('agent_id', flat=True)
+    )
+    schedule_refresh(agent_ids, 'assignments')
+
+
+@receiver(post_save, sender=DeliveryCommission)
+@receiver(post_delete, sender=DeliveryCommission)
+def refresh_dashboard_on_commission(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_refresh([instance.agent_id], 'commissions')
+
+
+@receiver(post_save, sender=DeliveryFeedback)
+@receiver(post_delete, sender=DeliveryFeedback)
+def refresh_dashboard_on_feedback(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_refresh([instance.agent_id], 'feedback')
+
+
+@receiver(post_save, sender=DeliveryDailyStats)
+def refresh_dashboard_on_daily_stats(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_refresh([instance.agent_id], 'stats')
@@ -1,3 +1,279 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from user.models import Order, OrderItem
+from .models import DeliveryAgentProfile, DeliveryAssignment
+
+User = get_user_model()
+
+
+class AssignmentListQueryCountTests(APITestCase):
+    """
+    Delivery assignment lists must cost a fixed number of queries however
+    many assignments (and order items) they return.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user(
+            username='customer', email='customer@example.com', password='pass12345',
+            first_name='Cara', last_name='Customer',
+        )
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass12345',
+        )
+        cls.agent = cls.make_agent('agent', 'agent@example.com')
+        cls.other_agent = cls.make_agent('other', 'other@example.com')
+
+    @classmethod
+    def make_agent(cls, username, email):
+        user = User.objects.create_user(
+            username=username, email=email, password='pass12345', role='delivery',
+            first_name=username.title(), last_name='Agent',
+        )
+        return DeliveryAgentProfile.objects.create(
+            user=user, phone_number='9999999999', address='1 Depot Road', city='Pune',
+            state='Maharashtra', postal_code='411001', vehicle_type='scooter',
+            bank_holder_name=username, bank_account_number='000111222', bank_ifsc_code='TEST0000001',
+            bank_name='Test Bank', approval_status='approved',
+        )
+
+    def make_assignments(self, agent, count, status='assigned', items_per_order=2):
+        for _ in range(count):
+            n = Order.objects.count() + 1
+            order = Order.objects.create(
+                user=self.customer, order_number=f'QC-{agent.id}-{n}', payment_method='cod',
+                payment_status='completed', total_amount=Decimal('100.00'),
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order, product_name=f'Item {i}', product_price=Decimal('50.00'),
+                    quantity=1, subtotal=Decimal('50.00'),
+                )
+                for i in range(items_per_order)
+            ])
+            DeliveryAssignment.objects.create(
+                agent=agent, order=order, status=status, pickup_address='Warehouse',
+                delivery_address='221B Baker Street', delivery_city='Pune',
+                estimated_delivery_date='2030-01-01', customer_contact='9999999999',
+                delivery_fee=Decimal('40.00'),
+            )
+
+    def assertQueryCountIndependentOfSize(self, url, user, queries, agent=None, **params):
+        """Same query count for a short and a long list."""
+        self.client.force_authenticate(user)
+        self.make_assignments(agent or self.agent, 2)
+        with self.assertNumQueries(queries):
+            small = self.client.get(url, params)
+        self.make_assignments(agent or self.agent, 25, items_per_order=3)
+        with self.assertNumQueries(queries):
+            large = self.client.get(url, params)
+        self.assertEqual(small.status_code, 200)
+        self.assertEqual(large.status_code, 200)
+        return small, large
+
+    def test_agent_assignment_list(self):
+        # agent profile, assignments (with agent, order and customer joined), order items
+        small, large = self.assertQueryCountIndependentOfSize('/api/delivery/assignments/', self.agent.user, 3)
+        self.assertEqual(len(small.data), 2)
+        self.assertEqual(len(large.data), 27)
+        self.assertEqual(len(large.data[0]['items']), 3)
+
+    def test_agent_assignment_list_paginated(self):
+        small, large = self.assertQueryCountIndependentOfSize(
+            '/api/delivery/assignments/', self.agent.user, 3, page_size=10,
+        )
+        self.assertEqual(len(large.data['results']), 10)
+        self.assertIsNotNone(large.data['next'])
+
+        with self.assertNumQueries(3):
+            following = self.client.get(large.data['next'])
+        self.assertEqual(len(following.data['results']), 10)
+        seen = {row['id'] for row in large.data['results']}
+        self.assertFalse(seen & {row['id'] for row in following.data['results']})
+
+    def test_agent_active_assignments(self):
+        self.make_assignments(self.agent, 3, status='delivered')
+        small, large = self.assertQueryCountIndependentOfSize(
+            '/api/delivery/assignments/active/', self.agent.user, 3,
+        )
+        self.assertEqual(len(large.data), 27)
+        self.assertTrue(all(row['status'] == 'assigned' for row in large.data))
+
+    def test_agent_list_excludes_other_agents(self):
+        self.make_assignments(self.other_agent, 4)
+        small, large = self.assertQueryCountIndependentOfSize('/api/delivery/assignments/', self.agent.user, 3)
+        self.assertEqual(len(large.data), 27)
+
+    def test_admin_tracking_list(self):
+        # assignments (joined), order items; cursor pagination needs no COUNT
+        small, large = self.assertQueryCountIndependentOfSize('/superAdmin/api/tracking/', self.admin, 2)
+        self.assertEqual(len(large.data['results']), 20)
+        self.assertIsNotNone(large.data['next'])
+
+    def test_admin_tracking_list_filtered(self):
+        self.make_assignments(self.other_agent, 5, status='in_transit')
+        small, large = self.assertQueryCountIndependentOfSize(
+            '/superAdmin/api/tracking/', self.admin, 2, status='in_transit',
+        )
+        self.assertEqual(len(large.data['results']), 5)
+
+    def test_agent_dashboard(self):
+        self.client.force_authenticate(self.agent.user)
+        self.make_assignments(self.agent, 5)
+        self.client.get('/api/delivery/dashboard/')      # builds the snapshot
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_assignments(self.agent, 10)      # refreshed by the assignment signals
+        # agent with user and snapshot in one query
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/delivery/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['active_assignments']), 5)
+        self.assertEqual(response.data['profile']['active_orders'], 15)
+
+
+class LocationIngestValidationTests(APITestCase):
+    """Malformed recorded_at values are rejected with 400, not a server error."""
+
+    BAD_TIMESTAMPS = (1e20, float('nan'), float('inf'), '2024-02-30T10:00:00')
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = User.objects.create_user(username='customer', email='customer@example.com', password='pass12345')
+        cls.agent = AssignmentListQueryCountTests.make_agent('agent', 'agent@example.com')
+        order = Order.objects.create(
+            user=customer, order_number='LI-1', payment_method='cod',
+            payment_status='completed', total_amount=Decimal('100.00'),
+        )
+        cls.assignment = DeliveryAssignment.objects.create(
+            agent=cls.agent, order=order, status='in_transit', pickup_address='Warehouse',
+            delivery_address='221B Baker Street', delivery_city='Pune',
+            estimated_delivery_date='2030-01-01', customer_contact='9999999999',
+            delivery_fee=Decimal('40.00'),
+        )
+
+    def test_parse_points_rejects_bad_timestamps(self):
+        from .location_ingest import InvalidLocation, parse_points
+
+        for recorded_at in self.BAD_TIMESTAMPS:
+            with self.subTest(recorded_at=recorded_at):
+                with self.assertRaises(InvalidLocation):
+                    parse_points({'latitude': 18.52, 'longitude': 73.85, 'recorded_at': recorded_at})
+
+    def test_update_location_returns_400(self):
+        self.client.force_authenticate(self.agent.user)
+        url = f'/api/delivery/tracking/{self.assignment.id}/update_location/'
+        # NaN and infinity are not valid JSON, so only these reach parse_points() over HTTP.
+        for recorded_at in (1e20, '2024-02-30T10:00:00'):
+            with self.subTest(recorded_at=recorded_at):
+                response = self.client.post(
+                    url, {'latitude': 18.52, 'longitude': 73.85, 'recorded_at': recorded_at}, format='json',
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('recorded_at', response.data['error'])
+
+
+class CompleteDeliveryTests(APITestCase):
+    """complete_delivery() costs a fixed number of statements and pays out once."""
+
+    @classmethod
+    def setUpTestData(cls):
+        from user.models import UserWallet
+        from .models import DeliveryDailyStats
+
+        cls.customer = User.objects.create_user(username='customer', email='customer@example.com', password='pass12345')
+        cls.agent = AssignmentListQueryCountTests.make_agent('agent', 'agent@example.com')
+        UserWallet.objects.create(user=cls.agent.user)
+        DeliveryDailyStats.objects.create(agent=cls.agent, date=timezone.now().date())
+
+    def make_assignment(self, number):
+        order = Order.objects.create(
+            user=self.customer, order_number=f'CD-{number}', payment_method='cod',
+            payment_status='completed', status='delivery_assigned', total_amount=Decimal('100.00'),
+            delivery_agent=self.agent,
+        )
+        assignment = DeliveryAssignment.objects.create(
+            agent=self.agent, order=order, status='in_transit', pickup_address='Warehouse',
+            delivery_address='221B Baker Street', delivery_city='Pune',
+            estimated_delivery_date='2030-01-01', customer_contact='9999999999',
+            delivery_fee=Decimal('40.00'),
+        )
+        return DeliveryAssignment.objects.select_related('agent', 'order').get(id=assignment.id)
+
+    def test_query_count_with_existing_wallet_and_stats(self):
+        from .completion import complete_delivery
+
+        assignment = self.make_assignment(1)
+        # assignment, order, commission, wallet id, wallet, wallet transaction, agent, daily stats,
+        # plus the savepoint pair of the atomic block inside the test's transaction
+        with self.assertNumQueries(10):
+            commission = complete_delivery(assignment)
+        self.assertEqual(commission.total_commission, Decimal('40.00'))
+
+    def test_second_completion_pays_nothing(self):
+        from user.models import UserWallet, WalletTransaction
+        from .completion import complete_delivery
+        from .models import DeliveryCommission, DeliveryDailyStats
+
+        assignment = self.make_assignment(2)
+        complete_delivery(assignment, release_agent=True)
+        self.assertIsNone(complete_delivery(assignment, release_agent=True))
+
+        again = DeliveryAssignment.objects.select_related('agent', 'order').get(id=assignment.id)
+        self.assertIsNone(complete_delivery(again))
+
+        self.assertEqual(DeliveryCommission.objects.filter(delivery_assignment=assignment).count(), 1)
+        wallet = UserWallet.objects.get(user=self.agent.user)
+        self.assertEqual(wallet.balance, Decimal('40.00'))
+        self.assertEqual(WalletTransaction.objects.filter(wallet=wallet).count(), 1)
+
+        agent = DeliveryAgentProfile.objects.get(id=self.agent.id)
+        self.assertEqual(agent.total_deliveries, self.agent.total_deliveries + 1)
+        self.assertEqual(agent.completed_deliveries, self.agent.completed_deliveries + 1)
+        self.assertEqual(agent.availability_status, 'available')
+        stats = DeliveryDailyStats.objects.get(agent=self.agent, date=timezone.now().date())
+        self.assertEqual(stats.total_deliveries_completed, 1)
+        self.assertEqual(stats.total_earnings, Decimal('40.00'))
+
+        order = Order.objects.get(id=assignment.order_id)
+        self.assertEqual(order.status, 'delivered')
+
+
+class RunFailureTests(APITestCase):
+    """A run whose last open stop fails is closed and its agent freed."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user(username='customer', email='customer@example.com', password='pass12345')
+        cls.agent = AssignmentListQueryCountTests.make_agent('agent', 'agent@example.com')
+
+    def test_last_failed_stop_releases_agent(self):
+        from .models import DeliveryRun
+
+        DeliveryAgentProfile.objects.filter(id=self.agent.id).update(availability_status='on_delivery')
+        run = DeliveryRun.objects.create(agent=self.agent, group_key='pincode:411', stop_count=2)
+        stops = []
+        for sequence in (1, 2):
+            order = Order.objects.create(
+                user=self.customer, order_number=f'RF-{sequence}', payment_method='cod',
+                payment_status='completed', total_amount=Decimal('100.00'),
+            )
+            stops.append(DeliveryAssignment.objects.create(
+                agent=self.agent, order=order, status='in_transit', pickup_address='Warehouse',
+                delivery_address='221B Baker Street', delivery_city='Pune',
+                estimated_delivery_date='2030-01-01', customer_contact='9999999999',
+                delivery_fee=Decimal('40.00'), run=run, run_sequence=sequence,
+            ))
+
+        DeliveryAssignment.objects.get(id=stops[0].id).mark_failed()
+        run.refresh_from_db()
+        self.assertEqual(run.status, 'active')
+        self.assertEqual(DeliveryAgentProfile.objects.get(id=self.agent.id).availability_status, 'on_delivery')
+
+        DeliveryAssignment.objects.get(id=stops[1].id).mark_failed()
+        run.refresh_from_db()
+        self.assertEqual(run.status, 'completed')
+        self.assertEqual(DeliveryAgentProfile.objects.get(id=self.agent.id).availability_status, 'available')
@@ -0,0 +1,277 @@
+"""
+deliveryAgent/track_compaction.py
+
+Keeps DeliveryTracking bounded (run `python manage.py compact_tracking`
+from cron):
+
+1. compact_assignments(): once an assignment is finished, its route is
+   simplified with Douglas-Peucker (TRACKING_SIMPLIFY_TOLERANCE_M) and
+   stored on the assignment as an encoded polyline (Google's polyline
+   format, 1e-5 degree precision). A delivery's few hundred pings usually
+   shrink to a few dozen points, a few hundred bytes of text.
+2. archive_tracking(): raw points older than TRACKING_ARCHIVE_AFTER_DAYS
+   whose assignment has been compacted are written, one gzipped CSV per
+   calendar month, to the blob store (vendor/blobstore.py), recorded in
+   DeliveryTrackingArchive, and deleted from the hot table.
+
+The assignment detail API returns the compact track (track_for()); active
+assignments get theirs simplified on the fly from the raw points.
+"""
+import csv
+import gzip
+import io
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .geo import EARTH_RADIUS_KM
+
+FINISHED_STATUSES = ('delivered', 'failed', 'cancelled', 'rejected')
+POLYLINE_PRECISION = 5
+ARCHIVE_FIELDS = ('delivery_assignment_id', 'tracked_at', 'latitude', 'longitude', 'speed', 'status', 'address', 'notes')
+
+
+# -- simplification -----------------------------------------------------------
+
+def douglas_peucker(latitudes, longitudes, tolerance_m):
+    """
+    Indices of the points to keep so that no dropped point lies further than
+    `tolerance_m` from the simplified line. Points are projected onto a local
+    plane (equirectangular around the track's mean latitude), which is exact
+    enough at city scale; each split step is one vectorised distance pass.
+    """
+    n = len(latitudes)
+    if n <= 2:
+        return list(range(n))
+
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+    metres = EARTH_RADIUS_KM * 1000
+    x = lon * np.cos(lat.mean()) * metres
+    y = lat * metres
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        dx, dy = x[last] - x[first], y[last] - y[first]
+        px, py = x[first + 1:last] - x[first], y[first + 1:last] - y[first]
+        length_sq = dx * dx + dy * dy
+        if length_sq == 0:
+            distances = np.hypot(px, py)
+        else:
+            # Distance to the segment (not the infinite line), so back-and-forth
+            # movement along the same street is not collapsed.
+            t = np.clip((px * dx + py * dy) / length_sq, 0.0, 1.0)
+            distances = np.hypot(px - t * dx, py - t * dy)
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance_m:
+            split = first + 1 + index
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return np.flatnonzero(keep).tolist()
+
+
+# -- polyline encoding --------------------------------------------------------
+
+def _encode_value(value):
+    value = ~(value << 1) if value < 0 else value << 1
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+    return ''.join(chunks)
+
+
+def encode_polyline(points, precision=POLYLINE_PRECISION):
+    """Encode [(lat, lon), ...] in the Google encoded polyline format."""
+    factor = 10 ** precision
+    result, prev_lat, prev_lon = [], 0, 0
+    for latitude, longitude in points:
+        lat, lon = round(float(latitude) * factor), round(float(longitude) * factor)
+        result.append(_encode_value(lat - prev_lat))
+        result.append(_encode_value(lon - prev_lon))
+        prev_lat, prev_lon = lat, lon
+    return ''.join(result)
+
+
+def decode_polyline(encoded, precision=POLYLINE_PRECISION):
+    """[(lat, lon), ...] from an encoded polyline."""
+    factor = 10 ** precision
+    points, index, lat, lon = [], 0, 0, 0
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        points.append((lat / factor, lon / factor))
+    return points
+
+
+# -- compaction ---------------------------------------------------------------
+
+def _tolerance():
+    return getattr(settings, 'TRACKING_SIMPLIFY_TOLERANCE_M', 10)
+
+
+def simplify_track(assignment_id, pending=()):
+    """
+    (encoded polyline, raw point count) for an assignment's stored points,
+    plus `pending` DeliveryTracking rows that have not been written yet.
+    """
+    from .models import DeliveryTracking
+
+    rows = list(
+        DeliveryTracking.objects.filter(delivery_assignment_id=assignment_id)
+        .exclude(latitude=0, longitude=0)      # placeholder rows written at assignment time
+        .order_by('tracked_at', 'id')
+        .values_list('tracked_at', 'latitude', 'longitude')
+    )
+    rows += [
+        (row.tracked_at, row.latitude, row.longitude)
+        for row in pending if row.latitude or row.longitude
+    ]
+    if not rows:
+        return '', 0
+    rows.sort(key=lambda row: row[0])
+    latitudes = [float(lat) for _, lat, _ in rows]
+    longitudes = [float(lon) for _, _, lon in rows]
+    kept = douglas_peucker(latitudes, longitudes, _tolerance())
+    return encode_polyline((latitudes[i], longitudes[i]) for i in kept), len(rows)
+
+
+def compact_assignments(limit=500):
+    """Store the simplified track of finished, not yet compacted assignments. Returns how many."""
+    from .models import DeliveryAssignment
+
+    assignment_ids = list(
+        DeliveryAssignment.objects.filter(status__in=FINISHED_STATUSES, track_compacted_at__isnull=True)
+        .order_by('id').values_list('id', flat=True)[:limit]
+    )
+    now = timezone.now()
+    for assignment_id in assignment_ids:
+        polyline, count = simplify_track(assignment_id)
+        DeliveryAssignment.objects.filter(id=assignment_id).update(
+            track_polyline=polyline, track_point_count=count, track_compacted_at=now,
+        )
+    return len(assignment_ids)
+
+
+def track_for(assignment):
+    """Compact track for API responses: stored for finished assignments, simplified live otherwise."""
+    if assignment.track_compacted_at:
+        polyline, count = assignment.track_polyline, assignment.track_point_count
+    else:
+        # Points still in this worker's ingest buffer are merged in memory
+        # rather than flushing every agent's buffered pings on a read.
+        from .location_ingest import buffered_points
+        polyline, count = simplify_track(assignment.id, buffered_points(assignment.id))
+    return {
+        'polyline': polyline,
+        'points': decode_polyline(polyline),
+        'raw_point_count': count,
+    }
+
+
+# -- archival -----------------------------------------------------------------
+
+def _month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def _next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _as_datetime(day):
+    value = datetime(day.year, day.month, day.day)
+    return timezone.make_aware(value) if settings.USE_TZ else value
+
+
+def _archive_month(queryset, month):
+    from vendor.blobstore import get_blob_storage
+    from .models import DeliveryTrackingArchive
+
+    ids, first, last = [], None, None
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb') as gz:
+        text = io.TextIOWrapper(gz, encoding='utf-8', newline='')
+        writer = csv.writer(text)
+        writer.writerow(ARCHIVE_FIELDS)
+        rows = queryset.order_by('tracked_at', 'id').values_list('id', *ARCHIVE_FIELDS)
+        for row in rows.iterator(chunk_size=2000):
+            ids.append(row[0])
+            first = first or row[2]
+            last = row[2]
+            writer.writerow(['' if value is None else value for value in row[1:]])
+        text.flush()
+        text.detach()
+    if not ids:
+        return 0
+    digest, size = get_blob_storage().save(buffer.getvalue())
+
+    with transaction.atomic():
+        DeliveryTrackingArchive.objects.create(
+            month=month,
+            blob_hash=digest,
+            size=size,
+            row_count=len(ids),
+            first_tracked_at=first,
+            last_tracked_at=last,
+        )
+        for start in range(0, len(ids), 500):
+            queryset.model.objects.filter(id__in=ids[start:start + 500]).delete()
+    return len(ids)
+
+
+def archive_tracking(older_than_days=None):
+    """Move raw points of compacted assignments older than the cutoff to monthly archives."""
+    from .models import DeliveryTracking
+
+    if older_than_days is None:
+        older_than_days = getattr(settings, 'TRACKING_ARCHIVE_AFTER_DAYS', 30)
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    archivable = DeliveryTracking.objects.filter(
+        tracked_at__lt=cutoff,
+        delivery_assignment__track_compacted_at__isnull=False,
+    )
+    oldest = archivable.order_by('tracked_at').values_list('tracked_at', flat=True).first()
+    if oldest is None:
+        return 0
+
+    archived = 0
+    month = _month_start(oldest)
+    while month <= cutoff.date():
+        month_end = _next_month(month)
+        archived += _archive_month(
+            archivable.filter(tracked_at__gte=_as_datetime(month), tracked_at__lt=_as_datetime(month_end)),
+            month,
+        )
+        month = month_end
+    return archived
+
+
+def read_archive(archive):
+    """Rows of a DeliveryTrackingArchive as dicts (strings, as written)."""
+    from vendor.blobstore import get_blob_storage
+
+    with get_blob_storage().open(archive.blob_hash) as handle:
+        with gzip.open(handle, mode='rt', encoding='utf-8', newline='') as text:
+            return list(csv.DictReader(text))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0003_delete_commissionsetting'),
+        ('user', '0015_trending_products'),
+        ('vendor', '0010_defer_document_fields'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['created_at'], name='finance_led_created_68b7c5_idx'),
+        ),
+    ]
@@ -15,6 +15,10 @@ class LedgerEntry(models.Model):
 
     class Meta:
         verbose_name_plural = "Ledger Entries"
+        indexes = [
+            # One day's entries for the platform metrics (superAdmin/metrics.py)
+            models.Index(fields=['created_at']),
+        ]
 
     def __str__(self):
         return f"{self.vendor.shop_name} - {self.entry_type} - {self.amount}"
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import VendorApprovalLog, ProductApprovalLog
+from .models import VendorApprovalLog, ProductApprovalLog, DailyPlatformMetrics
 
 @admin.register(VendorApprovalLog)
 class VendorApprovalLogAdmin(admin.ModelAdmin):
@@ -14,3 +14,9 @@ class ProductApprovalLogAdmin(admin.ModelAdmin):
     list_filter = ('action', 'timestamp')
     search_fields = ('product__name', 'reason')
     readonly_fields = ('timestamp',)
+
+@admin.register(DailyPlatformMetrics)
+class DailyPlatformMetricsAdmin(admin.ModelAdmin):
+    list_display = ('date', 'orders', 'completed_orders', 'revenue', 'deliveries_done', 'deliveries_failed', 'computed_at')
+    date_hierarchy = 'date'
+    readonly_fields = ('computed_at',)
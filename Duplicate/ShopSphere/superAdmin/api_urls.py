@@ -5,7 +5,7 @@ from .api_views import (
     DeliveryRequestViewSet, DeliveryAgentManagementViewSet, DashboardView,
     CommissionSettingsViewSet, ReportsView,
     UserManagementView, UserBlockToggleView,
-    TriggerAssignmentView, UnassignedOrdersView,
+    TriggerAssignmentView, UnassignedOrdersView, BatchAssignmentView, RouteBatchingView,
     AdminOrderTrackingViewSet, AdminOrderViewSet,
     SettlePaymentView,
 )
@@ -33,6 +33,8 @@ urlpatterns = [
     # Delivery assignment management
     path('trigger-assignment/<int:order_id>/', TriggerAssignmentView.as_view(), name='trigger_assignment'),
     path('unassigned-orders/', UnassignedOrdersView.as_view(), name='unassigned_orders'),
+    path('batch-assignment/', BatchAssignmentView.as_view(), name='batch_assignment'),
+    path('route-batching/', RouteBatchingView.as_view(), name='route_batching'),
     path('settle-payment/<int:order_item_id>/', SettlePaymentView.as_view(), name='settle_payment'),
 
     # Router endpoints
@@ -14,6 +14,7 @@ from django.db.models import Q
 from vendor.models import VendorProfile, Product
 from .models import VendorApprovalLog, ProductApprovalLog, DeliveryAgentApprovalLog, CommissionSetting
 from deliveryAgent.models import DeliveryAgentProfile, DeliveryAssignment
+from deliveryAgent.pagination import AssignmentCursorPagination
 from deliveryAgent.serializers import DeliveryAssignmentDetailSerializer, DeliveryAssignmentListSerializer
 from .serializers import (
     VendorApprovalLogSerializer, ProductApprovalLogSerializer,
@@ -29,6 +30,7 @@ from .serializers import (
     CommissionSettingSerializer
 )
 from user.models import Order
+from ShopSphere.cache import cache_policy
 
 
 class StandardResultsSetPagination(PageNumberPagination):
@@ -267,7 +269,7 @@ class VendorManagementViewSet(AdminLoginRequiredMixin, viewsets.ModelViewSet):
         })
 
 class ProductManagementViewSet(AdminLoginRequiredMixin, viewsets.ModelViewSet):
-    queryset = Product.objects.select_related('vendor').prefetch_related('images').all()
+    queryset = Product.objects.select_related('vendor').defer(*VendorProfile.document_defer_paths('vendor')).prefetch_related('images').all()
     serializer_class = AdminProductListSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
     pagination_class = None  # We handle pagination manually below
@@ -276,7 +278,7 @@ class ProductManagementViewSet(AdminLoginRequiredMixin, viewsets.ModelViewSet):
         from django.core.paginator import Paginator
         PAGE_SIZE = 50
 
-        queryset = Product.objects.select_related('vendor').prefetch_related('images').all()
+        queryset = Product.objects.select_related('vendor').defer(*VendorProfile.document_defer_paths('vendor')).prefetch_related('images').all()
 
         # Status filter
         status_filter = request.query_params.get('status', None)
@@ -585,6 +587,7 @@ from django.utils import timezone
 class DashboardView(AdminLoginRequiredMixin, generics.GenericAPIView):
     permission_classes = [IsAuthenticated, IsAdminUser]
     
+    @cache_policy('admin_dashboard', tags=('vendors', 'products', 'orders'))
     def get(self, request):
         total_vendors = VendorProfile.objects.count()
         pending_vendors = VendorProfile.objects.filter(approval_status='pending').count()
@@ -713,154 +716,24 @@ from rest_framework.views import APIView
 class ReportsView(APIView):
     """
     GET /superAdmin/api/reports/
-    Returns live platform analytics for the React admin dashboard.
+    Returns platform analytics for the React admin dashboard.
     Requires superuser / staff privileges.
     """
     permission_classes = [IsAuthenticated, IsAdminUser]
 
+    @cache_policy('admin_reports', tags=('orders', 'products', 'vendors'))
     def get(self, request):
-        from django.db.models import Count, Avg, Sum
-        from django.db.models.functions import TruncDate
-        from django.utils import timezone
-        from datetime import timedelta
-        from user.models import Order, OrderItem
-        from deliveryAgent.models import DeliveryCommission, DeliveryAssignment, DeliveryAgentProfile
-        from finance.models import LedgerEntry
-
-        today = timezone.now().date()
-        thirty_days_ago = today - timedelta(days=30)
-        seven_days_ago = today - timedelta(days=7)
+        from .metrics import MetricsNotReady, platform_report
 
-        # ── Orders ───────────────────────────────
-        order_qs = Order.objects.all()
-        completed_qs = order_qs.filter(payment_status='completed')
-
-        order_status_breakdown = list(
-            order_qs.values('status').annotate(count=Count('id')).order_by('-count')
-        )
-        payment_status_breakdown = list(
-            order_qs.values('payment_status').annotate(count=Count('id')).order_by('-count')
-        )
-
-        # ── Revenue ───────────────────────────────
-        total_revenue = float(completed_qs.aggregate(t=Sum('total_amount'))['t'] or 0)
-        avg_order_value = float(completed_qs.aggregate(a=Avg('total_amount'))['a'] or 0)
-        revenue_today = float(completed_qs.filter(created_at__date=today).aggregate(t=Sum('total_amount'))['t'] or 0)
-        revenue_week = float(completed_qs.filter(created_at__date__gte=seven_days_ago).aggregate(t=Sum('total_amount'))['t'] or 0)
-        revenue_month = float(completed_qs.filter(created_at__date__gte=thirty_days_ago).aggregate(t=Sum('total_amount'))['t'] or 0)
-
-        # ── Daily trend ───────────────────────────
-        daily_revenue = list(
-            completed_qs.filter(created_at__date__gte=thirty_days_ago)
-            .annotate(day=TruncDate('created_at'))
-            .values('day')
-            .annotate(revenue=Sum('total_amount'), orders=Count('id'))
-            .order_by('day')
-        )
-        for d in daily_revenue:
+        # Closed days come pre-aggregated (superAdmin/metrics.py), today is live.
+        try:
+            report = platform_report()
+        except MetricsNotReady as e:
+            return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        for d in report['daily_revenue']:
             d['day'] = d['day'].strftime('%d %b')
-            d['revenue'] = float(d['revenue'])
-
-        # ── Finance (LedgerEntry only has 'amount' field) ────────────────
-        finance_total = float(LedgerEntry.objects.aggregate(t=Sum('amount'))['t'] or 0)
-        finance_agg = {
-            'total_gross': finance_total,
-            'total_commission': 0,
-            'total_net': finance_total,
-        }
-
-        # ── Top Vendors ───────────────────────────
-        top_vendors = list(
-            LedgerEntry.objects.filter(entry_type='credit')
-            .values('vendor__shop_name')
-            .annotate(
-                total_gross=Sum('amount'),
-                total_commission=Sum('amount'),
-                total_net=Sum('amount'),
-                order_count=Count('order', distinct=True)
-            )
-            .order_by('-total_net')[:10]
-        )
-        for v in top_vendors:
-            for k in ['total_gross', 'total_commission', 'total_net']:
-                v[k] = float(v[k] or 0)
-
-        # ── Top Products ──────────────────────────
-        top_products = list(
-            OrderItem.objects.values('product_name')
-            .annotate(
-                total_qty=Sum('quantity'),
-                total_revenue=Sum('subtotal'),
-                order_count=Count('order', distinct=True),
-            )
-            .order_by('-total_qty')[:10]
-        )
-        for p in top_products:
-            p['total_revenue'] = float(p['total_revenue'] or 0)
-
-        # ── Delivery ──────────────────────────────
-        total_commissions_paid = float(DeliveryCommission.objects.filter(status='paid').aggregate(t=Sum('total_commission'))['t'] or 0)
-        total_commissions_pending = float(DeliveryCommission.objects.filter(status__in=['pending', 'approved']).aggregate(t=Sum('total_commission'))['t'] or 0)
-        total_deliveries_done = DeliveryAssignment.objects.filter(status='delivered').count()
-        total_deliveries_failed = DeliveryAssignment.objects.filter(status='failed').count()
-
-        # ── Vendors & Products ────────────────────
-        total_vendors = VendorProfile.objects.count()
-        approved_vendors = VendorProfile.objects.filter(approval_status='approved').count()
-        blocked_vendors = VendorProfile.objects.filter(is_blocked=True).count()
-        inactive_vendors = VendorProfile.objects.filter(approval_status='pending').count()
-        total_products = Product.objects.count()
-        active_products = Product.objects.filter(is_blocked=False).count()
-        blocked_products = Product.objects.filter(is_blocked=True).count()
-        total_agents = DeliveryAgentProfile.objects.count()
-        approved_agents = DeliveryAgentProfile.objects.filter(approval_status='approved').count()
-
-        return Response({
-            # Orders
-            'total_orders': order_qs.count(),
-            'orders_today': order_qs.filter(created_at__date=today).count(),
-            'orders_this_week': order_qs.filter(created_at__date__gte=seven_days_ago).count(),
-            'orders_this_month': order_qs.filter(created_at__date__gte=thirty_days_ago).count(),
-            'order_status_breakdown': order_status_breakdown,
-            'payment_status_breakdown': payment_status_breakdown,
-
-            # Revenue
-            'total_revenue': total_revenue,
-            'avg_order_value': avg_order_value,
-            'revenue_today': revenue_today,
-            'revenue_week': revenue_week,
-            'revenue_month': revenue_month,
-            'daily_revenue': daily_revenue,
-
-            # Finance
-            'total_gross': float(finance_agg['total_gross'] or 0),
-            'total_platform_commission': float(finance_agg['total_commission'] or 0),
-            'total_net': float(finance_agg['total_net'] or 0),
-
-            # Vendors & Products
-            'total_vendors': total_vendors,
-            'approved_vendors': approved_vendors,
-            'blocked_vendors': blocked_vendors,
-            'inactive_vendors': inactive_vendors,
-            'total_products': total_products,
-            'active_products': active_products,
-            'blocked_products': blocked_products,
-            'top_vendors': top_vendors,
-
-            # Products
-            'top_products': top_products,
-
-            # Delivery
-            'total_delivery_commissions_paid': total_commissions_paid,
-            'total_delivery_commissions_pending': total_commissions_pending,
-            'total_deliveries_done': total_deliveries_done,
-            'total_deliveries_failed': total_deliveries_failed,
-            'total_agents': total_agents,
-            'approved_agents': approved_agents,
-
-            # Meta
-            'report_date': str(today),
-        })
+        report['report_date'] = str(report['report_date'])
+        return Response(report)
 
 
 class UserManagementView(APIView):
@@ -1077,6 +950,93 @@ class UnassignedOrdersView(APIView):
         return Response({'orders': orders, 'count': len(orders)})
 
 
+class BatchAssignmentView(APIView):
+    """
+    POST /superAdmin/api/batch-assignment/
+    Assign the whole unassigned backlog at once, minimising total cost
+    (service-area tier, distance, agent load) instead of order by order.
+    Body (all optional): {"dry_run": false, "limit": 500, "per_agent": 1}
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def post(self, request):
+        from deliveryAgent.batch_assignment import (
+            DEFAULT_BATCH_LIMIT, DEFAULT_SLOTS_PER_AGENT, MAX_BATCH_LIMIT, MAX_SLOTS_PER_AGENT,
+            commit_batch_assignment, describe_plan, plan_batch_assignment,
+        )
+
+        try:
+            limit = int(request.data.get('limit', DEFAULT_BATCH_LIMIT))
+            per_agent = int(request.data.get('per_agent', DEFAULT_SLOTS_PER_AGENT))
+        except (TypeError, ValueError):
+            return Response({'error': 'limit and per_agent must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1 or per_agent < 1:
+            return Response({'error': 'limit and per_agent must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+        max_limit = getattr(settings, 'BATCH_ASSIGN_MAX_LIMIT', MAX_BATCH_LIMIT)
+        max_per_agent = getattr(settings, 'BATCH_ASSIGN_MAX_SLOTS_PER_AGENT', MAX_SLOTS_PER_AGENT)
+        if limit > max_limit or per_agent > max_per_agent:
+            return Response(
+                {'error': f'limit must be at most {max_limit} and per_agent at most {max_per_agent}'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        plan = plan_batch_assignment(limit=limit, slots_per_agent=per_agent)
+        result = describe_plan(plan)
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        if dry_run:
+            result['message'] = f"Planned {len(plan.assignments)} assignments."
+            return Response(result)
+
+        created = commit_batch_assignment(plan)
+        result['created_count'] = len(created)
+        result['message'] = f"Assigned {len(created)} orders to delivery agents."
+        return Response(result)
+
+
+class RouteBatchingView(APIView):
+    """
+    POST /superAdmin/api/route-batching/
+    Group packed, unassigned orders by vendor or pincode prefix into
+    multi-stop runs, one agent per run, with the stops in route order.
+    Body (all optional): {"dry_run": false, "limit": 500, "max_stops": 8}
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def post(self, request):
+        from django.conf import settings
+        from deliveryAgent.route_batching import (
+            DEFAULT_RUN_LIMIT, MAX_RUN_LIMIT, MAX_RUN_STOPS,
+            commit_delivery_runs, describe_plan, plan_delivery_runs,
+        )
+
+        try:
+            limit = int(request.data.get('limit', DEFAULT_RUN_LIMIT))
+            max_stops = int(request.data.get('max_stops', getattr(settings, 'ROUTE_MAX_STOPS', 8)))
+        except (TypeError, ValueError):
+            return Response({'error': 'limit and max_stops must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1 or max_stops < 1:
+            return Response({'error': 'limit and max_stops must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+        max_limit = getattr(settings, 'ROUTE_MAX_RUN_LIMIT', MAX_RUN_LIMIT)
+        max_run_stops = getattr(settings, 'ROUTE_MAX_RUN_STOPS', MAX_RUN_STOPS)
+        if limit > max_limit or max_stops > max_run_stops:
+            return Response(
+                {'error': f'limit must be at most {max_limit} and max_stops at most {max_run_stops}'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        plan = plan_delivery_runs(limit=limit, max_stops=max_stops)
+        result = describe_plan(plan)
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        if dry_run:
+            result['message'] = f"Planned {len(plan.runs)} delivery runs."
+            return Response(result)
+
+        runs = commit_delivery_runs(plan)
+        result['created_run_ids'] = [run.id for run in runs]
+        result['message'] = f"Created {len(runs)} delivery runs."
+        return Response(result)
+
+
 class AdminOrderViewSet(viewsets.ReadOnlyModelViewSet):
     """
     Admin-only viewset to manage all orders.
@@ -1111,9 +1071,12 @@ class AdminOrderTrackingViewSet(viewsets.ReadOnlyModelViewSet):
     """
     permission_classes = [IsAuthenticated, IsAdminUser]
     
-    queryset = DeliveryAssignment.objects.all().select_related('agent', 'agent__user', 'order', 'order__user')
+    queryset = DeliveryAssignment.objects.all().select_related('agent', 'agent__user', 'order', 'order__user').defer(
+        *DeliveryAgentProfile.document_defer_paths('agent')
+    )
     serializer_class = DeliveryAssignmentDetailSerializer
-    pagination_class = StandardResultsSetPagination
+    pagination_class = AssignmentCursorPagination
+    ordering = AssignmentCursorPagination.ordering
 
     def get_serializer_class(self):
         if self.action == 'list':
@@ -1122,6 +1085,8 @@ class AdminOrderTrackingViewSet(viewsets.ReadOnlyModelViewSet):
 
     def get_queryset(self):
         queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = DeliveryAssignmentListSerializer.setup_eager_loading(queryset)
         status = self.request.query_params.get('status')
         if status:
             queryset = queryset.filter(status=status)
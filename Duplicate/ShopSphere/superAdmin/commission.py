@@ -0,0 +1,129 @@
+"""
+superAdmin/commission.py
+
+Commission rule lookup for checkout.
+
+The CommissionSetting table is tiny (a global row plus at most one row per
+category), so CommissionRules loads every active row in one query and
+resolves products against it in memory:
+category override > global setting > 10% default.
+
+get_rules() keeps one CommissionRules snapshot per process, tagged with a
+version stamp stored in the Django cache. Saving or deleting a
+CommissionSetting (superAdmin/signals.py) writes a new stamp once the
+transaction commits, so every worker sharing the cache reloads on its next
+lookup. Lookups cost one cache read and no queries while the stamp holds.
+"""
+import threading
+import uuid
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+VERSION_CACHE_KEY = 'superadmin:commission_rules:version'
+
+DEFAULT_RULE = {
+    'rate': Decimal('10.00'),
+    'type': 'percentage',
+    'basic_fee': Decimal('0.00'),
+}
+
+
+def _rule(setting):
+    return {
+        'rate': setting.percentage,
+        'type': setting.commission_type,
+        'basic_fee': setting.basic_fee,
+    }
+
+
+class CommissionRules:
+    """In-memory snapshot of the active CommissionSetting rows."""
+
+    def __init__(self, settings):
+        self.global_rule = None
+        self.by_category = {}
+        for setting in settings:
+            if setting.category is None:
+                if self.global_rule is None:
+                    self.global_rule = _rule(setting)
+            else:
+                self.by_category[setting.category] = _rule(setting)
+
+    @classmethod
+    def load(cls):
+        from .models import CommissionSetting
+        return cls(CommissionSetting.objects.filter(is_active=True).order_by('id'))
+
+    def for_category(self, category):
+        return self.by_category.get(category) or self.global_rule or DEFAULT_RULE
+
+    def for_product(self, product):
+        return self.for_category(product.category)
+
+
+def calculate_commission(rule, line_total):
+    """Commission owed on a line: percentage of the line total or a fixed amount, plus the basic fee."""
+    rate = Decimal(str(rule['rate']))
+    basic_fee = Decimal(str(rule.get('basic_fee', 0)))
+    if rule['type'] == 'percentage':
+        return (line_total * rate) / 100 + basic_fee
+    return rate + basic_fee
+
+
+def commission_for_lines(lines, rules=None):
+    """
+    Resolve a batch of (product, line_total) pairs in one pass.
+    Returns a list of (commission_rate, commission_amount) in the same order.
+    """
+    rules = rules or get_rules()
+    results = []
+    for product, line_total in lines:
+        rule = rules.for_product(product)
+        results.append((Decimal(str(rule['rate'])), calculate_commission(rule, line_total)))
+    return results
+
+
+_snapshot = None  # (version, CommissionRules)
+_snapshot_lock = threading.Lock()
+
+
+def _current_version():
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        # add() keeps a stamp another worker may have just written.
+        cache.add(VERSION_CACHE_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(VERSION_CACHE_KEY)
+    return version
+
+
+def get_rules():
+    """The process-local rules snapshot, reloaded when the version stamp changes."""
+    global _snapshot
+    version = _current_version()
+    snapshot = _snapshot
+    if snapshot is not None and version is not None and snapshot[0] == version:
+        return snapshot[1]
+
+    with _snapshot_lock:
+        snapshot = _snapshot
+        if snapshot is not None and version is not None and snapshot[0] == version:
+            return snapshot[1]
+        rules = CommissionRules.load()
+        _snapshot = (version, rules)
+        return rules
+
+
+def invalidate_rules():
+    """Drop this process's snapshot now and publish a new version stamp after commit."""
+    global _snapshot
+    _snapshot = None
+
+    def publish():
+        global _snapshot
+        cache.set(VERSION_CACHE_KEY, uuid.uuid4().hex, timeout=None)
+        _snapshot = None
+
+    transaction.on_commit(publish)
@@ -0,0 +1,33 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from superAdmin.metrics import first_activity_day, rollup
+
+
+class Command(BaseCommand):
+    help = 'Roll up closed days of orders, revenue, ledger and deliveries into the daily platform metrics.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', metavar='YYYY-MM-DD',
+                            help='Recompute stored days from this date on (default: only days not stored yet).')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recompute every day from the first order, ledger entry or delivery.')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['rebuild']:
+            since = first_activity_day()
+        elif options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError(f"Invalid --since date: {options['since']}")
+
+        stored = rollup(since)
+        if stored is None:
+            self.stdout.write(self.style.SUCCESS('Platform metrics are up to date.'))
+        else:
+            first, last = stored
+            days = (last - first).days + 1
+            self.stdout.write(self.style.SUCCESS(f'Stored platform metrics for {days} days ({first} to {last}).'))
@@ -0,0 +1,434 @@
+"""
+superAdmin/metrics.py
+
+Pre-aggregated platform metrics for the admin reports (ReportsView and
+admin_reports).
+
+Every closed day (before today) is rolled up once into
+
+    DailyPlatformMetrics  orders, status and payment breakdowns, completed
+                          orders and their revenue, ledger total, deliveries
+                          done / failed, delivery commissions paid / pending
+    DailyVendorMetrics    ledger credits and orders per vendor
+    DailyProductMetrics   units, revenue and orders per product name
+
+Orders and their items belong to the day the order was placed; ledger
+entries, delivery assignments and commissions to the day they were created.
+Stored days are contiguous: the latest one is the watermark, and
+catch_up() rolls up the days closed since (reading a report does this first,
+so the midnight rollover needs no cron job). A read stores at most
+PLATFORM_METRICS_CATCH_UP_DAYS days; further behind (a fresh install with
+history, or a long gap), the report raises MetricsNotReady until
+`python manage.py rollup_platform_metrics` has backfilled the days.
+
+A later change to a stored day's rows (an order delivered or paid, a
+commission paid out) recomputes that day after the transaction commits;
+signals.py schedules it for Order, OrderItem, LedgerEntry, DeliveryAssignment
+and DeliveryCommission saves and deletes. Today is never stored, it is
+computed live on each read, so the writes of the busy day cost nothing.
+Code that writes with update()/bulk_create()/bulk_update() (completion.py,
+batch_assignment.py) calls schedule_refresh() itself;
+`python manage.py rollup_platform_metrics --since <date>` recomputes days
+that missed an update (and, run once, backfills the history).
+
+A report is then the stored rows, the grouped top vendors and products, five
+queries for today and three for the vendor, product and agent counts.
+"""
+import logging
+from collections import Counter
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min, Q, Sum
+from django.utils import timezone
+
+TOP_N = 10
+CATCH_UP_MAX_DAYS = 7
+COMPLETED_PAYMENT_STATUS = 'completed'
+PENDING_COMMISSION_STATUSES = ('pending', 'approved')
+ZERO = Decimal('0')
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsNotReady(Exception):
+    """More closed days are missing than a report read may roll up."""
+
+
+def _today():
+    return timezone.now().date()
+
+
+def _day_bounds(day):
+    start = datetime.combine(day, time.min)
+    if settings.USE_TZ:
+        start = timezone.make_aware(start)
+    return start, start + timedelta(days=1)
+
+
+# -- computing one day ------------------------------------------------------------
+
+def compute_day(day):
+    """
+    (platform, vendors, products) of one day, from the source tables:
+    platform is a dict of DailyPlatformMetrics fields, vendors
+    {vendor_id: (credit_total, order_count)} and products
+    {product_name: (quantity, revenue, order_count)}.
+    """
+    from deliveryAgent.models import DeliveryAssignment, DeliveryCommission
+    from finance.models import LedgerEntry
+    from user.models import Order, OrderItem
+
+    start, end = _day_bounds(day)
+    platform = {
+        'orders': 0, 'status_counts': Counter(), 'payment_status_counts': Counter(),
+        'completed_orders': 0, 'revenue': ZERO, 'ledger_total': ZERO,
+        'deliveries_done': 0, 'deliveries_failed': 0,
+        'delivery_commissions_paid': ZERO, 'delivery_commissions_pending': ZERO,
+    }
+
+    for row in (
+        Order.objects.filter(created_at__gte=start, created_at__lt=end)
+        .values('status', 'payment_status').annotate(n=Count('id'), total=Sum('total_amount')).order_by()
+    ):
+        platform['orders'] += row['n']
+        platform['status_counts'][row['status']] += row['n']
+        platform['payment_status_counts'][row['payment_status']] += row['n']
+        if row['payment_status'] == COMPLETED_PAYMENT_STATUS:
+            platform['completed_orders'] += row['n']
+            platform['revenue'] += row['total'] or ZERO
+
+    vendors = {}
+    for row in (
+        LedgerEntry.objects.filter(created_at__gte=start, created_at__lt=end)
+        .values('vendor_id', 'entry_type')
+        .annotate(total=Sum('amount'), orders=Count('order', distinct=True)).order_by()
+    ):
+        platform['ledger_total'] += row['total'] or ZERO
+        if row['entry_type'] == 'credit':
+            vendors[row['vendor_id']] = (row['total'] or ZERO, row['orders'])
+
+    products = {
+        row['product_name']: (row['quantity'] or 0, row['revenue'] or ZERO, row['orders'])
+        for row in (
+            OrderItem.objects.filter(order__created_at__gte=start, order__created_at__lt=end)
+            .values('product_name')
+            .annotate(quantity=Sum('quantity'), revenue=Sum('subtotal'), orders=Count('order', distinct=True))
+            .order_by()
+        )
+    }
+
+    for status, n in (
+        DeliveryAssignment.objects.filter(
+            assigned_at__gte=start, assigned_at__lt=end, status__in=('delivered', 'failed'),
+        ).values_list('status').annotate(n=Count('id')).order_by()
+    ):
+        platform['deliveries_done' if status == 'delivered' else 'deliveries_failed'] = n
+
+    for status, total in (
+        DeliveryCommission.objects.filter(created_at__gte=start, created_at__lt=end)
+        .values_list('status').annotate(total=Sum('total_commission')).order_by()
+    ):
+        if status == 'paid':
+            platform['delivery_commissions_paid'] += total or ZERO
+        elif status in PENDING_COMMISSION_STATUSES:
+            platform['delivery_commissions_pending'] += total or ZERO
+
+    platform['status_counts'] = dict(platform['status_counts'])
+    platform['payment_status_counts'] = dict(platform['payment_status_counts'])
+    return platform, vendors, products
+
+
+def store_day(day):
+    """Recompute one day and replace its stored rows."""
+    from .models import DailyPlatformMetrics, DailyProductMetrics, DailyVendorMetrics
+
+    platform, vendors, products = compute_day(day)
+    with transaction.atomic():
+        DailyPlatformMetrics.objects.update_or_create(
+            date=day, defaults=dict(platform, computed_at=timezone.now()),
+        )
+        DailyVendorMetrics.objects.filter(date=day).delete()
+        DailyVendorMetrics.objects.bulk_create([
+            DailyVendorMetrics(date=day, vendor_id=vendor_id, credit_total=total, order_count=orders)
+            for vendor_id, (total, orders) in vendors.items()
+        ])
+        DailyProductMetrics.objects.filter(date=day).delete()
+        DailyProductMetrics.objects.bulk_create([
+            DailyProductMetrics(date=day, product_name=name, quantity=quantity, revenue=revenue, order_count=orders)
+            for name, (quantity, revenue, orders) in products.items()
+        ])
+
+
+# -- keeping the stored days --------------------------------------------------------
+
+def last_stored_day():
+    from .models import DailyPlatformMetrics
+
+    return DailyPlatformMetrics.objects.order_by('-date').values_list('date', flat=True).first()
+
+
+def first_activity_day():
+    """Day of the oldest order, ledger entry, assignment or commission (None without any)."""
+    from deliveryAgent.models import DeliveryAssignment, DeliveryCommission
+    from finance.models import LedgerEntry
+    from user.models import Order
+
+    moments = [
+        Order.objects.aggregate(first=Min('created_at'))['first'],
+        LedgerEntry.objects.aggregate(first=Min('created_at'))['first'],
+        DeliveryAssignment.objects.aggregate(first=Min('assigned_at'))['first'],
+        DeliveryCommission.objects.aggregate(first=Min('created_at'))['first'],
+    ]
+    moments = [moment for moment in moments if moment is not None]
+    return min(moments).date() if moments else None
+
+
+def rollup(since=None):
+    """
+    Store every closed day from `since` to yesterday. Without `since`, and
+    never later than that, this starts the day after the last stored one
+    (or on the first day with activity), so the stored days stay contiguous.
+    Returns the (first, last) day stored, or None when there was nothing to do.
+    """
+    last = last_stored_day()
+    first = last + timedelta(days=1) if last else first_activity_day()
+    if first is None:
+        return None
+    if since:
+        # Days before the first activity are empty.
+        since = min(max(since, first_activity_day() or since), first)
+    else:
+        since = first
+    yesterday = _today() - timedelta(days=1)
+    if since > yesterday:
+        return None
+    day = since
+    while day <= yesterday:
+        store_day(day)
+        day += timedelta(days=1)
+    return since, yesterday
+
+
+def catch_up():
+    """
+    Roll up the days closed since the last stored one, if there are at most
+    PLATFORM_METRICS_CATCH_UP_DAYS of them. Returns the number of days still
+    missing (0 when the stored days reach yesterday).
+    """
+    last = last_stored_day()
+    first = last + timedelta(days=1) if last else first_activity_day()
+    yesterday = _today() - timedelta(days=1)
+    if first is None or first > yesterday:
+        return 0
+    missing = (yesterday - first).days + 1
+    if missing > getattr(settings, 'PLATFORM_METRICS_CATCH_UP_DAYS', CATCH_UP_MAX_DAYS):
+        return missing
+    rollup()
+    return 0
+
+
+def schedule_refresh(days):
+    """Recompute these stored days once the current transaction commits."""
+    today = _today()
+    days = {day for day in days if day and day < today}
+    if not days:
+        return
+
+    def refresh():
+        last = last_stored_day()
+        for day in sorted(days):
+            # Days after the watermark are stored by the next catch_up().
+            if last is None or day > last:
+                continue
+            try:
+                store_day(day)
+            except Exception:
+                # rollup_platform_metrics --since repairs a day that missed an update.
+                logger.exception("Platform metrics refresh failed for %s", day)
+
+    transaction.on_commit(refresh)
+
+
+# -- the report -------------------------------------------------------------------
+
+def _top(stored, live, top_n):
+    """
+    Merge today's {key: (value, ...)} into the stored all-time totals and
+    return the top_n keys by the first value. `stored(keys)` sums the stored
+    rows, for the top_n best keys when keys is None.
+    """
+    totals = {}
+    for row_key, values in stored(None).items():
+        totals[row_key] = list(values)
+    missing = [row_key for row_key in live if row_key not in totals]
+    if missing:
+        for row_key, values in stored(missing).items():
+            totals[row_key] = list(values)
+    for row_key, values in live.items():
+        current = totals.setdefault(row_key, [0] * len(values))
+        totals[row_key] = [a + b for a, b in zip(current, values)]
+    return sorted(totals.items(), key=lambda item: (-item[1][0], str(item[0])))[:top_n]
+
+
+def _stored_vendors(vendor_ids, top_n=TOP_N):
+    from .models import DailyVendorMetrics
+
+    qs = DailyVendorMetrics.objects.values('vendor_id').annotate(
+        total=Sum('credit_total'), orders=Sum('order_count'),
+    )
+    qs = qs.filter(vendor_id__in=vendor_ids) if vendor_ids is not None else qs.order_by('-total', 'vendor_id')[:top_n]
+    return {row['vendor_id']: (row['total'], row['orders']) for row in qs}
+
+
+def _stored_products(names, top_n=TOP_N):
+    from .models import DailyProductMetrics
+
+    qs = DailyProductMetrics.objects.values('product_name').annotate(
+        quantity=Sum('quantity'), revenue=Sum('revenue'), orders=Sum('order_count'),
+    )
+    qs = qs.filter(product_name__in=names) if names is not None else qs.order_by('-quantity', 'product_name')[:top_n]
+    return {row['product_name']: (row['quantity'], row['revenue'], row['orders']) for row in qs}
+
+
+def _breakdown(counts, field):
+    return [
+        {field: value, 'count': n}
+        for value, n in sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    ]
+
+
+def platform_report(top_n=TOP_N):
+    """
+    The admin report: stored closed days plus today, computed live. Raises
+    MetricsNotReady when too many closed days are not stored yet.
+    """
+    from deliveryAgent.models import DeliveryAgentProfile
+    from vendor.models import Product, VendorProfile
+    from .models import DailyPlatformMetrics
+
+    missing = catch_up()
+    if missing:
+        raise MetricsNotReady(
+            f'Platform metrics are missing {missing} closed days; '
+            f'run `python manage.py rollup_platform_metrics` to store them.'
+        )
+    today = _today()
+    seven_days_ago = today - timedelta(days=7)
+    thirty_days_ago = today - timedelta(days=30)
+
+    live, live_vendors, live_products = compute_day(today)
+    days = list(DailyPlatformMetrics.objects.filter(date__lt=today).values(
+        'date', 'orders', 'status_counts', 'payment_status_counts', 'completed_orders', 'revenue',
+        'ledger_total', 'deliveries_done', 'deliveries_failed',
+        'delivery_commissions_paid', 'delivery_commissions_pending',
+    ))
+    days.append(dict(live, date=today))
+
+    totals = Counter()
+    status_counts, payment_status_counts = Counter(), Counter()
+    orders_week = orders_month = 0
+    revenue_week = revenue_month = ZERO
+    daily_revenue = []
+    for day in sorted(days, key=lambda row: row['date']):
+        for field in ('orders', 'completed_orders', 'revenue', 'ledger_total', 'deliveries_done',
+                      'deliveries_failed', 'delivery_commissions_paid', 'delivery_commissions_pending'):
+            totals[field] += day[field]
+        status_counts.update(day['status_counts'])
+        payment_status_counts.update(day['payment_status_counts'])
+        if day['date'] >= seven_days_ago:
+            orders_week += day['orders']
+            revenue_week += day['revenue']
+        if day['date'] >= thirty_days_ago:
+            orders_month += day['orders']
+            revenue_month += day['revenue']
+            if day['completed_orders']:
+                daily_revenue.append({
+                    'day': day['date'], 'revenue': float(day['revenue']), 'orders': day['completed_orders'],
+                })
+
+    top_vendors = _top(_stored_vendors, live_vendors, top_n)
+    shop_names = dict(
+        VendorProfile.objects.filter(id__in=[vendor_id for vendor_id, _ in top_vendors])
+        .values_list('id', 'shop_name')
+    )
+    top_products = _top(_stored_products, live_products, top_n)
+
+    vendor_counts = VendorProfile.objects.aggregate(
+        total=Count('id'),
+        approved=Count('id', filter=Q(approval_status='approved')),
+        blocked=Count('id', filter=Q(is_blocked=True)),
+        pending=Count('id', filter=Q(approval_status='pending')),
+    )
+    product_counts = Product.objects.aggregate(
+        total=Count('id'), blocked=Count('id', filter=Q(is_blocked=True)),
+    )
+    agent_counts = DeliveryAgentProfile.objects.aggregate(
+        total=Count('id'), approved=Count('id', filter=Q(approval_status='approved')),
+    )
+
+    revenue = totals['revenue']
+    return {
+        # Orders
+        'total_orders': totals['orders'],
+        'orders_today': live['orders'],
+        'orders_this_week': orders_week,
+        'orders_this_month': orders_month,
+        'order_status_breakdown': _breakdown(status_counts, 'status'),
+        'payment_status_breakdown': _breakdown(payment_status_counts, 'payment_status'),
+
+        # Revenue
+        'total_revenue': float(revenue),
+        'avg_order_value': float(revenue / totals['completed_orders']) if totals['completed_orders'] else 0.0,
+        'revenue_today': float(live['revenue']),
+        'revenue_week': float(revenue_week),
+        'revenue_month': float(revenue_month),
+        'daily_revenue': daily_revenue,
+
+        # Finance (LedgerEntry only has an 'amount' field)
+        'total_gross': float(totals['ledger_total']),
+        'total_platform_commission': 0.0,
+        'total_net': float(totals['ledger_total']),
+
+        # Vendors & Products
+        'total_vendors': vendor_counts['total'],
+        'approved_vendors': vendor_counts['approved'],
+        'blocked_vendors': vendor_counts['blocked'],
+        'inactive_vendors': vendor_counts['pending'],
+        'total_products': product_counts['total'],
+        'active_products': product_counts['total'] - product_counts['blocked'],
+        'blocked_products': product_counts['blocked'],
+        'top_vendors': [
+            {
+                'vendor__id': vendor_id,
+                'vendor__shop_name': shop_names.get(vendor_id),
+                'total_gross': float(total),
+                'total_commission': float(total),
+                'total_net': float(total),
+                'order_count': orders,
+            }
+            for vendor_id, (total, orders) in top_vendors
+        ],
+        'top_products': [
+            {
+                'product_name': name,
+                'total_qty': quantity,
+                'total_revenue': float(revenue),
+                'order_count': orders,
+            }
+            for name, (quantity, revenue, orders) in top_products
+        ],
+
+        # Delivery
+        'total_delivery_commissions_paid': float(totals['delivery_commissions_paid']),
+        'total_delivery_commissions_pending': float(totals['delivery_commissions_pending']),
+        'total_deliveries_done': totals['deliveries_done'],
+        'total_deliveries_failed': totals['deliveries_failed'],
+        'total_agents': agent_counts['total'],
+        'approved_agents': agent_counts['approved'],
+
+        # Meta
+        'report_date': today,
+    }
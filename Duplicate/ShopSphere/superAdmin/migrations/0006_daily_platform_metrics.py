@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('superAdmin', '0005_commissionsetting_basic_fee'),
+        ('vendor', '0010_defer_document_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPlatformMetrics',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('orders', models.IntegerField(default=0)),
+                ('status_counts', models.JSONField(default=dict)),
+                ('payment_status_counts', models.JSONField(default=dict)),
+                ('completed_orders', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('ledger_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('deliveries_done', models.IntegerField(default=0)),
+                ('deliveries_failed', models.IntegerField(default=0)),
+                ('delivery_commissions_paid', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('delivery_commissions_pending', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name_plural': 'Daily platform metrics',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductMetrics',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('product_name', models.CharField(max_length=255)),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('order_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily product metrics',
+                'unique_together': {('date', 'product_name')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyVendorMetrics',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('credit_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('order_count', models.IntegerField(default=0)),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_metrics', to='vendor.vendorprofile')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily vendor metrics',
+                'unique_together': {('date', 'vendor')},
+            },
+        ),
+    ]
@@ -107,25 +107,72 @@ class CommissionSetting(models.Model):
     def get_commission_for_product(product):
         """
         Determine the commission rate for a specific product.
-        Priority: Category-specific override > Global setting.
+        Priority: Category-specific override > Global setting > 10% default.
+        Served from the cached rules table in superAdmin/commission.py;
+        use commission_for_lines() there to price a whole order at once.
         """
-        # 1. Check for category-specific override
-        setting = CommissionSetting.objects.filter(category=product.category, is_active=True).first()
-        
-        # 2. Fallback to global setting if no override found
-        if not setting:
-            setting = CommissionSetting.objects.filter(category=None, is_active=True).first()
-            
-        if setting:
-            return {
-                'rate': setting.percentage,
-                'type': setting.commission_type,
-                'basic_fee': setting.basic_fee
-            }
-            
-        # 3. Final default (10%) if no rows exist at all
-        return {
-            'rate': 10.00,
-            'type': 'percentage',
-            'basic_fee': 0.00
-        }
+        from .commission import get_rules
+        return get_rules().for_product(product)
+
+
+class DailyPlatformMetrics(models.Model):
+    """
+    One closed day of platform activity for the admin reports, kept by
+    superAdmin/metrics.py. Orders and their items count on the day the order
+    was placed, ledger entries, assignments and commissions on the day they
+    were created.
+    """
+    date = models.DateField(unique=True)
+
+    orders = models.IntegerField(default=0)
+    status_counts = models.JSONField(default=dict)          # {order status: count}
+    payment_status_counts = models.JSONField(default=dict)  # {payment status: count}
+    completed_orders = models.IntegerField(default=0)       # payment_status 'completed'
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # of the completed orders
+
+    ledger_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    deliveries_done = models.IntegerField(default=0)
+    deliveries_failed = models.IntegerField(default=0)
+    delivery_commissions_paid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    delivery_commissions_pending = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-date']
+        verbose_name_plural = "Daily platform metrics"
+
+    def __str__(self):
+        return f"{self.date}: {self.orders} orders, {self.revenue} revenue"
+
+
+class DailyVendorMetrics(models.Model):
+    """A vendor's ledger credits of one closed day (top vendors report)."""
+    date = models.DateField()
+    vendor = models.ForeignKey(VendorProfile, on_delete=models.CASCADE, related_name='daily_metrics')
+    credit_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('date', 'vendor')
+        verbose_name_plural = "Daily vendor metrics"
+
+    def __str__(self):
+        return f"{self.date}: vendor {self.vendor_id} {self.credit_total}"
+
+
+class DailyProductMetrics(models.Model):
+    """Units and revenue of one product name on one closed day (top products report)."""
+    date = models.DateField()
+    product_name = models.CharField(max_length=255)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('date', 'product_name')
+        verbose_name_plural = "Daily product metrics"
+
+    def __str__(self):
+        return f"{self.date}: {self.product_name} x{self.quantity}"
@@ -101,7 +101,7 @@ class AdminVendorDetailSerializer(serializers.ModelSerializer):
 
     def get_id_proof_file(self, obj):
         request = self.context.get('request')
-        if not obj.id_proof_data: return None
+        if not obj.has_document('id_proof'): return None
         path = reverse('serve_vendor_id_proof', kwargs={'vendor_id': obj.id})
         if request:
             return request.build_absolute_uri(path)
@@ -109,7 +109,7 @@ class AdminVendorDetailSerializer(serializers.ModelSerializer):
 
     def get_pan_card_file(self, obj):
         request = self.context.get('request')
-        if not obj.pan_card_data: return None
+        if not obj.has_document('pan_card'): return None
         path = reverse('serve_vendor_pan_card', kwargs={'vendor_id': obj.id})
         if request:
             return request.build_absolute_uri(path)
@@ -221,7 +221,7 @@ class AdminDeliveryAgentDetailSerializer(serializers.ModelSerializer):
 
     def get_id_proof_file(self, obj):
         request = self.context.get('request')
-        if not obj.id_proof_data: return None
+        if not obj.has_document('id_proof'): return None
         path = reverse('serve_agent_id_proof', kwargs={'agent_id': obj.id})
         if request:
             return request.build_absolute_uri(path)
@@ -229,7 +229,7 @@ class AdminDeliveryAgentDetailSerializer(serializers.ModelSerializer):
 
     def get_license_file(self, obj):
         request = self.context.get('request')
-        if not obj.license_file_data: return None
+        if not obj.has_document('license_file'): return None
         path = reverse('serve_agent_license', kwargs={'agent_id': obj.id})
         if request:
             return request.build_absolute_uri(path)
@@ -237,7 +237,7 @@ class AdminDeliveryAgentDetailSerializer(serializers.ModelSerializer):
 
     def get_vehicle_registration(self, obj):
         request = self.context.get('request')
-        if not obj.vehicle_registration_data: return None
+        if not obj.has_document('vehicle_registration'): return None
         path = reverse('serve_agent_vehicle_registration', kwargs={'agent_id': obj.id})
         if request:
             return request.build_absolute_uri(path)
@@ -245,7 +245,7 @@ class AdminDeliveryAgentDetailSerializer(serializers.ModelSerializer):
 
     def get_vehicle_insurance(self, obj):
         request = self.context.get('request')
-        if not obj.vehicle_insurance_data: return None
+        if not obj.has_document('vehicle_insurance'): return None
         path = reverse('serve_agent_vehicle_insurance', kwargs={'agent_id': obj.id})
         if request:
             return request.build_absolute_uri(path)
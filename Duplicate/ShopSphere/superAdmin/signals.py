@@ -0,0 +1,63 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .commission import invalidate_rules
+from .models import CommissionSetting
+
+
+@receiver(post_save, sender=CommissionSetting)
+@receiver(post_delete, sender=CommissionSetting)
+def invalidate_commission_rules(sender, **kwargs):
+    invalidate_rules()
+
+
+# ── Platform metrics (superAdmin/metrics.py) ───────────────────────────────
+
+from deliveryAgent.models import DeliveryAssignment, DeliveryCommission
+from finance.models import LedgerEntry
+from user.models import Order, OrderItem
+from .metrics import schedule_refresh
+
+
+def _day(moment):
+    return moment.date() if moment else None
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def refresh_metrics_on_order(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_refresh([_day(instance.created_at)])
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def refresh_metrics_on_order_item(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if OrderItem.order.is_cached(instance):
+        placed_at = instance.order.created_at
+    else:
+        placed_at = Order.objects.filter(id=instance.order_id).values_list('created_at', flat=True).first()
+    schedule_refresh([_day(placed_at)])
+
+
+@receiver(post_save, sender=LedgerEntry)
+@receiver(post_delete, sender=LedgerEntry)
+def refresh_metrics_on_ledger_entry(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_refresh([_day(instance.created_at)])
+
+
+@receiver(post_save, sender=DeliveryAssignment)
+@receiver(post_delete, sender=DeliveryAssignment)
+def refresh_metrics_on_assignment(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_refresh([_day(instance.assigned_at)])
+
+
+@receiver(post_save, sender=DeliveryCommission)
+@receiver(post_delete, sender=DeliveryCommission)
+def refresh_metrics_on_commission(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_refresh([_day(instance.created_at)])
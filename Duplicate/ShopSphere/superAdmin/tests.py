@@ -1,3 +1,92 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.utils import timezone
+
+from deliveryAgent.completion import complete_delivery
+from deliveryAgent.models import DeliveryAgentProfile, DeliveryAssignment
+from user.models import Order
+from . import metrics
+from .models import DailyPlatformMetrics
+
+User = get_user_model()
+
+
+class PlatformMetricsTests(TestCase):
+    """Stored days of the admin report follow writes that skip the model signals."""
+
+    def setUp(self):
+        customer = User.objects.create_user(username='customer', email='customer@example.com', password='pass12345')
+        agent_user = User.objects.create_user(
+            username='agent', email='agent@example.com', password='pass12345', role='delivery',
+        )
+        self.agent = DeliveryAgentProfile.objects.create(
+            user=agent_user, phone_number='9999999999', address='1 Depot Road', city='Pune',
+            state='Maharashtra', postal_code='411001', vehicle_type='scooter',
+            bank_holder_name='agent', bank_account_number='000111222', bank_ifsc_code='TEST0000001',
+            bank_name='Test Bank', approval_status='approved', availability_status='on_delivery',
+        )
+        order = Order.objects.create(
+            user=customer, order_number='PM-1', payment_method='cod', payment_status='completed',
+            status='delivery_assigned', total_amount=Decimal('100.00'), delivery_agent=self.agent,
+        )
+        self.assignment = DeliveryAssignment.objects.create(
+            agent=self.agent, order=order, status='in_transit', pickup_address='Warehouse',
+            delivery_address='221B Baker Street', delivery_city='Pune',
+            estimated_delivery_date='2030-01-01', customer_contact='9999999999',
+            delivery_fee=Decimal('40.00'),
+        )
+        # Placed and assigned two days ago, so that day is stored.
+        self.day = timezone.now().date() - timedelta(days=2)
+        placed_at = timezone.now() - timedelta(days=2)
+        Order.objects.filter(id=order.id).update(created_at=placed_at)
+        DeliveryAssignment.objects.filter(id=self.assignment.id).update(assigned_at=placed_at)
+        metrics.rollup()
+
+    def test_complete_delivery_refreshes_stored_day(self):
+        stored = DailyPlatformMetrics.objects.get(date=self.day)
+        self.assertEqual(stored.status_counts, {'delivery_assigned': 1})
+        self.assertEqual(stored.deliveries_done, 0)
+
+        assignment = DeliveryAssignment.objects.select_related('agent', 'order').get(id=self.assignment.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            complete_delivery(assignment, release_agent=True)
+
+        stored.refresh_from_db()
+        self.assertEqual(stored.status_counts, {'delivered': 1})
+        self.assertEqual(stored.deliveries_done, 1)
+
+        report = metrics.platform_report()
+        self.assertEqual(report['order_status_breakdown'], [{'status': 'delivered', 'count': 1}])
+        self.assertEqual(report['total_deliveries_done'], 1)
+
+
+class PlatformMetricsCatchUpTests(TestCase):
+    """Reading the report stores a few missing days at most, never the whole history."""
+
+    def setUp(self):
+        customer = User.objects.create_user(username='customer', email='customer@example.com', password='pass12345')
+        for n, days_ago in enumerate((30, 3)):
+            order = Order.objects.create(
+                user=customer, order_number=f'CU-{n}', payment_method='cod', payment_status='completed',
+                status='delivered', total_amount=Decimal('100.00'),
+            )
+            Order.objects.filter(id=order.id).update(created_at=timezone.now() - timedelta(days=days_ago))
+
+    def test_history_needs_the_command(self):
+        with self.assertRaises(metrics.MetricsNotReady):
+            metrics.platform_report()
+        self.assertFalse(DailyPlatformMetrics.objects.exists())
+
+        metrics.rollup()
+        self.assertEqual(metrics.platform_report()['total_orders'], 2)
+
+    def test_short_gap_is_stored_on_read(self):
+        metrics.rollup()
+        last = metrics.last_stored_day()
+        DailyPlatformMetrics.objects.filter(date__gt=last - timedelta(days=3)).delete()
 
-# Create your tests here.
+        self.assertEqual(metrics.platform_report()['total_orders'], 2)
+        self.assertEqual(metrics.last_stored_day(), last)
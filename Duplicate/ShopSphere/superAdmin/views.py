@@ -367,7 +367,7 @@ def manage_products(request):
     vendor_filter = request.GET.get('vendor', '')
     block_filter = request.GET.get('blocked', '')
 
-    products = Product.objects.all().select_related('vendor')
+    products = Product.objects.all().select_related('vendor').defer(*VendorProfile.document_defer_paths('vendor'))
 
     if search_query:
         products = products.filter(
@@ -462,7 +462,7 @@ def manage_ledgers(request):
     vendor_id = request.GET.get('vendor')
     entry_type = request.GET.get('type')
     
-    ledgers = LedgerEntry.objects.all().select_related('vendor', 'order')
+    ledgers = LedgerEntry.objects.all().select_related('vendor', 'order').defer(*VendorProfile.document_defer_paths('vendor'))
     
     if vendor_id:
         ledgers = ledgers.filter(vendor_id=vendor_id)
@@ -693,158 +693,28 @@ def unblock_delivery_agent(request, agent_id):
 
 @admin_required
 def admin_reports(request):
-    """Live analytics and reports for the admin dashboard."""
-    from django.db.models import Count, Avg
-    from django.utils import timezone
-    from datetime import timedelta
-    from user.models import Order, OrderItem
-    from deliveryAgent.models import DeliveryCommission, DeliveryAssignment
-
-    # ── Date range ──────────────────────────────────────────────────────
-    today = timezone.now().date()
-    thirty_days_ago = today - timedelta(days=30)
-    seven_days_ago = today - timedelta(days=7)
-
-    # ── Order Stats ──────────────────────────────────────────────────────
-    order_qs = Order.objects.all()
-    total_orders = order_qs.count()
-    orders_today = order_qs.filter(created_at__date=today).count()
-    orders_this_week = order_qs.filter(created_at__date__gte=seven_days_ago).count()
-    orders_this_month = order_qs.filter(created_at__date__gte=thirty_days_ago).count()
-
-    # Status breakdown
-    order_status_breakdown = list(
-        order_qs.values('status')
-                .annotate(count=Count('id'))
-                .order_by('-count')
+    """Analytics and reports for the admin dashboard (closed days pre-aggregated, today live)."""
+    from .metrics import MetricsNotReady, platform_report
+
+    try:
+        report = platform_report()
+    except MetricsNotReady as e:
+        return render(request, 'mainApp/manage_reports.html', {'error': str(e)})
+    context = dict(
+        report,
+        total_commissions_paid=report['total_delivery_commissions_paid'],
+        total_commissions_pending=report['total_delivery_commissions_pending'],
     )
 
-    # Payment status breakdown
-    payment_status_breakdown = list(
-        order_qs.values('payment_status')
-                .annotate(count=Count('id'))
-                .order_by('-count')
-    )
-
-    # ── Revenue (from completed/delivered orders) ─────────────────────
-    completed_orders = order_qs.filter(payment_status='completed')
-    total_revenue = completed_orders.aggregate(total=Sum('total_amount'))['total'] or 0
-    avg_order_value = completed_orders.aggregate(avg=Avg('total_amount'))['avg'] or 0
-
-    # Revenue today / this week / this month
-    revenue_today = completed_orders.filter(created_at__date=today).aggregate(t=Sum('total_amount'))['t'] or 0
-    revenue_week = completed_orders.filter(created_at__date__gte=seven_days_ago).aggregate(t=Sum('total_amount'))['t'] or 0
-    revenue_month = completed_orders.filter(created_at__date__gte=thirty_days_ago).aggregate(t=Sum('total_amount'))['t'] or 0
-
-    # ── Daily Revenue Trend (last 30 days) ───────────────────────────
-    from django.db.models.functions import TruncDate
-    daily_revenue = list(
-        completed_orders.filter(created_at__date__gte=thirty_days_ago)
-        .annotate(day=TruncDate('created_at'))
-        .values('day')
-        .annotate(revenue=Sum('total_amount'), orders=Count('id'))
-        .order_by('day')
-    )
-
-    # ── Finance ──────────────────────────────────────────────────────
-    finance_agg = LedgerEntry.objects.aggregate(
-        total_gross=Sum('gross_amount'),
-        total_commission=Sum('commission_amount'),
-        total_net=Sum('net_amount'),
-    )
-    total_platform_commission = finance_agg['total_commission'] or 0
-
-    # ── Top Vendors by Net Earnings ──────────────────────────────────
-    top_vendors = list(
-        LedgerEntry.objects.filter(entry_type='REVENUE')
-        .values('vendor__shop_name', 'vendor__id')
-        .annotate(
-            total_gross=Sum('gross_amount'),
-            total_commission=Sum('commission_amount'),
-            total_net=Sum('net_amount'),
-            order_count=Count('order', distinct=True)
-        )
-        .order_by('-total_net')[:10]
-    )
-
-    # ── Most Ordered Products ─────────────────────────────────────────
-    top_products = list(
-        OrderItem.objects.values('product_name')
-        .annotate(
-            total_qty=Sum('quantity'),
-            total_revenue=Sum('subtotal'),
-            order_count=Count('order', distinct=True),
-        )
-        .order_by('-total_qty')[:10]
-    )
-
-    # ── Delivery Agent Performance ────────────────────────────────────
-    total_commissions_paid = DeliveryCommission.objects.filter(status='paid').aggregate(t=Sum('total_commission'))['t'] or 0
-    total_commissions_pending = DeliveryCommission.objects.filter(status__in=['pending', 'approved']).aggregate(t=Sum('total_commission'))['t'] or 0
-    total_deliveries_done = DeliveryAssignment.objects.filter(status='delivered').count()
-    total_deliveries_failed = DeliveryAssignment.objects.filter(status='failed').count()
-
-    # ── Vendor Stats ──────────────────────────────────────────────────
-    total_vendors = VendorProfile.objects.count()
-    approved_vendors = VendorProfile.objects.filter(approval_status='approved').count()
-    blocked_vendors = VendorProfile.objects.filter(is_blocked=True).count()
-
-    # ── Product Stats ─────────────────────────────────────────────────
-    total_products = Product.objects.count()
-    active_products = Product.objects.filter(is_blocked=False).count()
-    blocked_products = Product.objects.filter(is_blocked=True).count()
-
-    context = {
-        # Order stats
-        'total_orders': total_orders,
-        'orders_today': orders_today,
-        'orders_this_week': orders_this_week,
-        'orders_this_month': orders_this_month,
-        'order_status_breakdown': order_status_breakdown,
-        'payment_status_breakdown': payment_status_breakdown,
-
-        # Revenue
-        'total_revenue': total_revenue,
-        'avg_order_value': avg_order_value,
-        'revenue_today': revenue_today,
-        'revenue_week': revenue_week,
-        'revenue_month': revenue_month,
-        'daily_revenue': daily_revenue,
-
-        # Finance
-        'total_platform_commission': total_platform_commission,
-        'total_gross': finance_agg['total_gross'] or 0,
-        'total_net': finance_agg['total_net'] or 0,
-
-        # Vendors & products
-        'total_vendors': total_vendors,
-        'approved_vendors': approved_vendors,
-        'blocked_vendors': blocked_vendors,
-        'total_products': total_products,
-        'active_products': active_products,
-        'blocked_products': blocked_products,
-        'top_vendors': top_vendors,
-
-        # Products
-        'top_products': top_products,
-
-        # Delivery
-        'total_commissions_paid': total_commissions_paid,
-        'total_commissions_pending': total_commissions_pending,
-        'total_deliveries_done': total_deliveries_done,
-        'total_deliveries_failed': total_deliveries_failed,
-
-        # Meta
-        'report_date': today,
-    }
-
     return render(request, 'mainApp/manage_reports.html', context)
 @admin_required
 def manage_tracking(request):
     from deliveryAgent.models import DeliveryAssignment
     
     status_filter = request.GET.get('status', 'all')
-    assignments = DeliveryAssignment.objects.all().select_related('agent', 'agent__user', 'order', 'order__user')
+    assignments = DeliveryAssignment.objects.all().select_related('agent', 'agent__user', 'order', 'order__user').defer(
+        *DeliveryAgentProfile.document_defer_paths('agent')
+    )
     
     if status_filter != 'all':
         assignments = assignments.filter(status=status_filter)
@@ -859,7 +729,11 @@ def manage_tracking(request):
 def tracking_detail(request, assignment_id):
     from deliveryAgent.models import DeliveryAssignment, DeliveryTracking
     
-    assignment = get_object_or_404(DeliveryAssignment.objects.select_related('agent', 'agent__user', 'order', 'order__user'), id=assignment_id)
+    assignment = get_object_or_404(
+        DeliveryAssignment.objects.select_related('agent', 'agent__user', 'order', 'order__user')
+        .defer(*DeliveryAgentProfile.document_defer_paths('agent')),
+        id=assignment_id,
+    )
     tracking_history = DeliveryTracking.objects.filter(delivery_assignment=assignment).order_by('-tracked_at')
     
     context = {
@@ -0,0 +1,139 @@
+"""
+user/catalog.py
+
+Keyset (cursor) pagination for the public product catalog.
+
+Pages are ordered by (-created_at, -id) and the cursor encodes the last row
+of the previous page, so every page costs the same two queries:
+  1. products JOIN vendor JOIN rating summary (LIMIT page_size + 1)
+  2. images for the products on the page (prefetch, image bytes deferred)
+"""
+import base64
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Prefetch, Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.utils.urls import replace_query_param
+
+from vendor.models import Product, ProductImage, VendorProfile
+
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Query params that switch home_api from the legacy full list to a paginated page.
+CATALOG_PARAMS = ('cursor', 'page_size', 'category', 'min_price', 'max_price', 'vendor')
+
+
+class CatalogError(ValueError):
+    """Raised for malformed catalog query parameters."""
+
+
+def encode_cursor(product):
+    payload = json.dumps({'c': product.created_at.isoformat(), 'i': product.id})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        created_at = parse_datetime(payload['c'])
+        product_id = int(payload['i'])
+    except (ValueError, KeyError, TypeError):
+        raise CatalogError('Invalid cursor')
+    if created_at is None:
+        raise CatalogError('Invalid cursor')
+    return created_at, product_id
+
+
+def _decimal_param(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise CatalogError(f'Invalid {name}')
+
+
+def with_listing_relations(queryset):
+    """
+    Join/prefetch everything ProductSerializer reads: vendor (without its
+    document blobs), rating summary and images (without legacy image bytes).
+    """
+    return (
+        queryset
+        .select_related('vendor', 'rating_summary')
+        .defer(*VendorProfile.document_defer_paths('vendor'))
+        .prefetch_related(
+            Prefetch('images', queryset=ProductImage.objects.defer('image_data').order_by('id'))
+        )
+    )
+
+
+def catalog_queryset():
+    """Active, sellable products with everything ProductSerializer reads."""
+    return with_listing_relations(
+        Product.objects.filter(status='active', is_blocked=False, vendor__is_active=True, vendor__is_blocked=False)
+    )
+
+
+def filter_catalog(queryset, params):
+    """Apply the category / price / vendor filters from the query string."""
+    category = params.get('category')
+    if category:
+        queryset = queryset.filter(category__in=[c for c in category.split(',') if c])
+
+    min_price = _decimal_param(params, 'min_price')
+    if min_price is not None:
+        queryset = queryset.filter(price__gte=min_price)
+
+    max_price = _decimal_param(params, 'max_price')
+    if max_price is not None:
+        queryset = queryset.filter(price__lte=max_price)
+
+    vendor = params.get('vendor')
+    if vendor:
+        try:
+            queryset = queryset.filter(vendor_id=int(vendor))
+        except ValueError:
+            raise CatalogError('Invalid vendor')
+
+    return queryset
+
+
+def get_page_size(params):
+    try:
+        size = int(params.get('page_size', DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        raise CatalogError('Invalid page_size')
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def paginate_catalog(request, queryset=None):
+    """
+    Return (products, next_cursor, next_url) for the requested page.
+    Raises CatalogError on bad input.
+    """
+    params = request.query_params
+    if queryset is None:
+        queryset = catalog_queryset()
+    queryset = filter_catalog(queryset, params)
+    page_size = get_page_size(params)
+
+    cursor = params.get('cursor')
+    if cursor:
+        created_at, product_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=product_id)
+        )
+
+    products = list(queryset.order_by('-created_at', '-id')[:page_size + 1])
+    next_cursor = next_url = None
+    if len(products) > page_size:
+        products = products[:page_size]
+        next_cursor = encode_cursor(products[-1])
+        next_url = replace_query_param(request.build_absolute_uri(), 'cursor', next_cursor)
+
+    return products, next_cursor, next_url
@@ -0,0 +1,143 @@
+"""
+user/inventory.py
+
+Stock reservation for checkout.
+
+reserve_stock() takes stock for every line of an order with one conditional
+UPDATE (quantity = quantity - n WHERE quantity >= n), so concurrent checkouts
+can never drive Product.quantity below zero and a short line fails the whole
+order. Each line is recorded as a StockReservation:
+
+  committed  paid order; stays out of stock until rejected or cancelled
+  released   units have been put back
+
+release_reservations() is the single path that puts stock back (vendor
+rejection, customer cancellation) and is idempotent per reservation.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from vendor.models import Product
+from .models import Order, StockReservation
+
+
+class InsufficientStock(Exception):
+    """Raised when a reservation line cannot be met; nothing is taken."""
+
+    def __init__(self, product_name, available):
+        self.product_name = product_name
+        self.available = available
+        super().__init__(f"Insufficient stock for {product_name}. Available: {available}")
+
+
+class _Shortfall(Exception):
+    pass
+
+
+def _merge_lines(lines):
+    """Sum (product_id, quantity) lines per product."""
+    totals = defaultdict(int)
+    for product_id, quantity in lines:
+        if quantity <= 0:
+            raise ValueError('Quantity must be positive')
+        totals[product_id] += quantity
+    return dict(totals)
+
+
+def _quantity_case(totals):
+    return Case(
+        *[When(id=product_id, then=Value(quantity)) for product_id, quantity in totals.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _restore_stock(totals):
+    """Add the quantities back to every product in one UPDATE."""
+    return Product.objects.filter(id__in=totals).update(
+        quantity=F('quantity') + _quantity_case(totals)
+    )
+
+
+def _raise_shortfall(totals):
+    products = {p.id: p for p in Product.objects.filter(id__in=totals).only('id', 'name', 'quantity')}
+    for product_id, quantity in totals.items():
+        product = products.get(product_id)
+        if product is None:
+            raise InsufficientStock(f'product #{product_id}', 0)
+        if product.quantity < quantity:
+            raise InsufficientStock(product.name, product.quantity)
+    # Stock was restored between the UPDATE and this lookup; report the first line.
+    product_id = next(iter(totals))
+    raise InsufficientStock(products[product_id].name, products[product_id].quantity)
+
+
+def reserve_stock(order, lines):
+    """
+    Take stock for `lines` ((product_id, quantity) pairs) and record the
+    reservations against `order`.
+
+    Raises InsufficientStock, leaving every product untouched, if any line
+    cannot be met.
+    """
+    totals = _merge_lines(lines)
+    if not totals:
+        return []
+
+    guard = Q()
+    for product_id, quantity in totals.items():
+        guard |= Q(id=product_id, quantity__gte=quantity)
+
+    try:
+        with transaction.atomic():
+            updated = Product.objects.filter(guard).update(
+                quantity=F('quantity') - _quantity_case(totals)
+            )
+            if updated != len(totals):
+                # Roll back the lines that did fit.
+                raise _Shortfall
+    except _Shortfall:
+        _raise_shortfall(totals)
+
+    return StockReservation.objects.bulk_create([
+        StockReservation(order=order, product_id=product_id, quantity=quantity, status='committed')
+        for product_id, quantity in totals.items()
+    ])
+
+
+def release_reservations(orders, vendor=None):
+    """
+    Put the active reservations of `orders` (an Order, list or queryset)
+    back into stock, optionally only for `vendor`'s products.
+    Returns the number of units released.
+    """
+    if isinstance(orders, Order):
+        orders = [orders]
+
+    with transaction.atomic():
+        reservations = StockReservation.objects.select_for_update().filter(
+            order__in=orders, status='committed'
+        )
+        if vendor is not None:
+            reservations = reservations.filter(product__vendor=vendor)
+
+        rows = list(reservations.values_list('id', 'product_id', 'quantity'))
+        if not rows:
+            return 0
+
+        # Rows are locked above (SQLite serializes writers instead), so each
+        # reservation is returned to stock at most once.
+        StockReservation.objects.filter(id__in=[row[0] for row in rows]).update(
+            status='released', released_at=timezone.now()
+        )
+
+        totals = defaultdict(int)
+        for _, product_id, quantity in rows:
+            totals[product_id] += quantity
+        _restore_stock(totals)
+
+    return sum(totals.values())
+
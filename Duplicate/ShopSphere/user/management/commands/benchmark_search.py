@@ -0,0 +1,100 @@
+import random
+import sqlite3
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from user.search import FTS5Index, InvertedIndex, fts5_available, parse_query
+
+ADJECTIVES = [
+    'wireless', 'portable', 'organic', 'premium', 'compact', 'waterproof', 'classic', 'smart',
+    'vintage', 'ergonomic', 'stainless', 'cotton', 'leather', 'bamboo', 'ceramic', 'foldable',
+    'rechargeable', 'handmade', 'lightweight', 'heavy', 'mini', 'deluxe', 'eco', 'digital',
+]
+NOUNS = [
+    'headphones', 'speaker', 'charger', 'backpack', 'bottle', 'kettle', 'lamp', 'keyboard',
+    'mouse', 'jacket', 'sneakers', 'watch', 'blender', 'mat', 'notebook', 'pen', 'shirt',
+    'saree', 'helmet', 'tent', 'drone', 'camera', 'tripod', 'mug', 'pan', 'toaster', 'novel',
+    'puzzle', 'doll', 'racket', 'dumbbell', 'serum', 'shampoo', 'rice', 'tea', 'coffee',
+]
+CATEGORIES = [
+    'Electronics', 'Fashion', 'Home & Kitchen', 'Beauty & Personal Care', 'Sports & Fitness',
+    'Toys & Games', 'Automotive', 'Grocery', 'Books', 'Other',
+]
+FILLER = (
+    'with a durable finish ideal for daily use and gifting made from quality materials '
+    'easy to clean comes in assorted colours backed by warranty fits most needs'
+).split()
+
+
+class Command(BaseCommand):
+    help = 'Time FTS5, the in-process inverted index and an icontains scan on a synthetic catalog.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000, help='Size of the synthetic catalog.')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query (median is reported).')
+        parser.add_argument('--limit', type=int, default=20, help='Results fetched per query (one page).')
+
+    def _catalog(self, n, rng):
+        brands = [f'brand{i:03d}' for i in range(400)]
+        shops = [f'{rng.choice(ADJECTIVES).title()} Mart {i}' for i in range(2000)]
+        for product_id in range(1, n + 1):
+            noun = rng.choice(NOUNS)
+            name = f'{rng.choice(brands).title()} {rng.choice(ADJECTIVES).title()} {noun.title()}'
+            words = rng.sample(FILLER, 12) + rng.sample(ADJECTIVES, 3) + [noun, rng.choice(NOUNS)]
+            rng.shuffle(words)
+            yield product_id, name, ' '.join(words), rng.choice(CATEGORIES), rng.choice(shops)
+
+    def _time(self, fn):
+        start = time.perf_counter()
+        result = fn()
+        return (time.perf_counter() - start) * 1000, result
+
+    def _median(self, repeat, fn):
+        return statistics.median(self._time(fn)[0] for _ in range(repeat))
+
+    def handle(self, *args, **options):
+        n, repeat, limit = options['products'], options['repeat'], options['limit']
+        conn = sqlite3.connect(':memory:')
+        if not fts5_available(conn):
+            raise CommandError('This SQLite build has no FTS5.')
+        rows = list(self._catalog(n, random.Random(42)))
+        conn.execute('CREATE TABLE products (id INTEGER PRIMARY KEY, name, description, category, shop_name)')
+        conn.executemany('INSERT INTO products VALUES (?, ?, ?, ?, ?)', rows)
+
+        fts = FTS5Index(conn)
+        fts.create()
+        fts_build, _ = self._time(lambda: fts.add(rows))
+        memory = InvertedIndex()
+        memory_build, _ = self._time(lambda: memory.rebuild(rows))
+        self.stdout.write(f'{n} products: FTS5 build {fts_build:.0f} ms, '
+                          f'in-process build {memory_build:.0f} ms ({len(memory.postings)} terms)')
+
+        def scan(query):
+            # Today's icontains filter on name/description, with a count and
+            # one page like the search backends return.
+            pattern = f'%{query}%'
+            where = 'WHERE name LIKE ? OR description LIKE ?'
+            conn.execute(f'SELECT count(*) FROM products {where}', (pattern, pattern)).fetchone()
+            return conn.execute(
+                f'SELECT id FROM products {where} LIMIT ?', (pattern, pattern, limit),
+            ).fetchall()
+
+        queries = [
+            'wireless', 'wireless headphones', 'brand042 kettle', 'kitchen',
+            'he', 'head', 'portable spe', 'nothingmatches',
+        ]
+        header = f"{'query'.ljust(22)} {'matches':>8} {'icontains':>11} {'fts5':>9} {'in-process':>11}"
+        self.stdout.write(header)
+        for query in queries:
+            terms, prefix = parse_query(query)
+            total, _ = memory.search(terms, prefix, limit)
+            timings = [
+                self._median(repeat, lambda: scan(query)),
+                self._median(repeat, lambda: fts.search(terms, prefix, limit)),
+                self._median(repeat, lambda: memory.search(terms, prefix, limit)),
+            ]
+            self.stdout.write(
+                f'{query.ljust(22)} {total:>8} ' + ' '.join(f'{ms:>8.2f} ms' for ms in timings)
+            )
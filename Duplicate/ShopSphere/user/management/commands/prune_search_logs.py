@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from user.search_logging import prune_search_logs
+
+
+class Command(BaseCommand):
+    help = 'Delete raw search logs and hourly search counts past their retention window.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'SEARCH_LOG_RETENTION_DAYS', 14),
+                            help='Keep raw SearchLog rows for this many days.')
+        parser.add_argument('--rollup-days', type=int,
+                            default=getattr(settings, 'SEARCH_ROLLUP_RETENTION_DAYS', 90),
+                            help='Keep hourly search counts for this many days.')
+
+    def handle(self, *args, **options):
+        window = getattr(settings, 'MOST_SEARCHED_WINDOW_DAYS', 30)
+        if options['rollup_days'] < window:
+            raise CommandError(f'--rollup-days must cover the most-searched window ({window} days).')
+        logs, rollups = prune_search_logs(options['days'], options['rollup_days'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {logs} search logs and {rollups} hourly search counts.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from user.ratings import rebuild_rating_summaries
+
+
+class Command(BaseCommand):
+    help = 'Recompute ProductRatingSummary rows from the Review table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--product', type=int, action='append', dest='product_ids',
+            help='Only rebuild the given product id (repeatable).',
+        )
+
+    def handle(self, *args, **options):
+        written = rebuild_rating_summaries(options['product_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} product rating summaries.'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from user.search import backend_name, rebuild_index, reindex_products
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product search index from the Product table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--product', type=int, action='append', dest='product_ids',
+            help='Only reindex the given product id (repeatable).',
+        )
+
+    def handle(self, *args, **options):
+        if options['product_ids']:
+            reindex_products(options['product_ids'])
+            self.stdout.write(self.style.SUCCESS(f"Reindexed {len(options['product_ids'])} products."))
+            return
+        indexed = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} products ({backend_name()} backend).'))
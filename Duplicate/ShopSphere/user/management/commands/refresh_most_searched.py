@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from user.search_ranking import refresh_most_searched
+
+
+class Command(BaseCommand):
+    help = 'Fold new hourly search counts into the word counts and recompute the most-searched rankings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-n', type=int, default=getattr(settings, 'MOST_SEARCHED_TOP_N', 10),
+                            help='Products kept per ranking.')
+        parser.add_argument('--window-days', type=int,
+                            default=getattr(settings, 'MOST_SEARCHED_WINDOW_DAYS', 30),
+                            help='Searches older than this many days no longer count.')
+
+    def handle(self, *args, **options):
+        summary = refresh_most_searched(top_n=options['top_n'], window_days=options['window_days'])
+        self.stdout.write(
+            f"Folded {summary['folded']} hourly query counts, dropped {summary['pruned']} expired word counts."
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Ranked {summary['ranked']} products from {summary['tokens']} words "
+            f"({summary['categories']} category rankings)."
+        ))
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from user.trending import refresh_trending
+
+
+class Command(BaseCommand):
+    help = 'Recompute the trending product rankings from recent reviews, sales and searches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=getattr(settings, 'TRENDING_TOP_K', 10),
+                            help='Products kept per ranking.')
+        parser.add_argument('--window-days', type=int, default=getattr(settings, 'TRENDING_WINDOW_DAYS', 7),
+                            help='Activity older than this many days is ignored.')
+        parser.add_argument('--half-life-hours', type=float,
+                            default=getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 48),
+                            help='Age at which an event counts half.')
+
+    def handle(self, *args, **options):
+        summary = refresh_trending(
+            top_k=options['top_k'], window_days=options['window_days'],
+            half_life_hours=options['half_life_hours'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Ranked {summary['ranked']} of {summary['scored']} active products "
+            f"({summary['categories']} category rankings)."
+        ))
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_summaries(apps, schema_editor):
+    """Summaries of the existing reviews (as rebuild_rating_summaries does)."""
+    Review = apps.get_model('user', 'Review')
+    ProductRatingSummary = apps.get_model('user', 'ProductRatingSummary')
+
+    summaries = {}
+    for row in Review.objects.values('Product_id', 'rating').annotate(n=Count('id')).order_by():
+        if row['rating'] not in range(1, 6):
+            continue
+        summary = summaries.setdefault(row['Product_id'], ProductRatingSummary(product_id=row['Product_id']))
+        setattr(summary, f"star_{row['rating']}", row['n'])
+        summary.review_count += row['n']
+        summary.rating_total += row['n'] * row['rating']
+    ProductRatingSummary.objects.bulk_create(summaries.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0008_add_search_log'),
+        ('vendor', '0005_vendorprofile_selfie_with_id_data_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRatingSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_total', models.PositiveIntegerField(default=0)),
+                ('star_1', models.PositiveIntegerField(default=0)),
+                ('star_2', models.PositiveIntegerField(default=0)),
+                ('star_3', models.PositiveIntegerField(default=0)),
+                ('star_4', models.PositiveIntegerField(default=0)),
+                ('star_5', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='rating_summary', to='vendor.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Product Rating Summaries',
+            },
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_open_order_reservations(apps, schema_editor):
+    """
+    Orders that can still be rejected or cancelled took their stock before
+    reservations existed; record it so release_reservations() can return it.
+    """
+    OrderItem = apps.get_model('user', 'OrderItem')
+    StockReservation = apps.get_model('user', 'StockReservation')
+    totals = {}
+    items = OrderItem.objects.filter(
+        order__status__in=('pending', 'approved', 'confirmed'), product__isnull=False
+    ).values_list('order_id', 'product_id', 'quantity')
+    for order_id, product_id, quantity in items:
+        key = (order_id, product_id)
+        totals[key] = totals.get(key, 0) + quantity
+    StockReservation.objects.bulk_create([
+        StockReservation(order_id=order_id, product_id=product_id, quantity=quantity, status='committed')
+        for (order_id, product_id), quantity in totals.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0009_product_rating_summary'),
+        ('vendor', '0010_defer_document_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('held', 'Held'), ('committed', 'Committed'), ('released', 'Released')], default='committed', max_length=20)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('released_at', models.DateTimeField(blank=True, null=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservations', to='user.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservations', to='vendor.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['order', 'status'], name='user_stockr_order_i_8f3094_idx'), models.Index(fields=['status', 'expires_at'], name='user_stockr_status_fc02a9_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_open_order_reservations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:02
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """
+    FTS5 table for product search, filled with the listed products. Without
+    FTS5 (or on another database) user/search.py uses its in-process index.
+    """
+    from user.search import FTS5Index, fts5_available, index_rows, listed_products
+
+    connection = schema_editor.connection
+    if not fts5_available(connection):
+        return
+    index = FTS5Index(connection)
+    index.create()
+    index.add(index_rows(listed_products(apps.get_model('vendor', 'Product'))))
+
+
+def drop_search_index(apps, schema_editor):
+    from user.search import FTS5Index
+
+    if schema_editor.connection.vendor == 'sqlite':
+        FTS5Index(schema_editor.connection).drop()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0011_address_coordinates'),
+        ('vendor', '0010_defer_document_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
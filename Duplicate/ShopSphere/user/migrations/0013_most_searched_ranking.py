@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0012_product_search_index'),
+        ('vendor', '0010_defer_document_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchRankingState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_search_log_id', models.BigIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchTokenCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=100)),
+                ('date', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='user_search_date_1a8c42_idx')],
+                'unique_together': {('token', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='MostSearchedProduct',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(blank=True, default='', max_length=50)),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='vendor.product')),
+            ],
+            options={
+                'ordering': ['category', 'rank'],
+                'unique_together': {('category', 'rank')},
+            },
+        ),
+    ]
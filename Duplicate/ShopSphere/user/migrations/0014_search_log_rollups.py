@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:25
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+
+
+def backfill_hourly_counts(apps, schema_editor):
+    """
+    Roll the existing search logs up by hour, and make the ranking job
+    rebuild its word counts from the rollups (they were folded from the
+    raw logs, which would now count twice).
+    """
+    SearchLog = apps.get_model('user', 'SearchLog')
+    SearchQueryHourly = apps.get_model('user', 'SearchQueryHourly')
+    rows = (
+        SearchLog.objects.annotate(bucket=TruncHour('created_at'))
+        .values('query', 'bucket').annotate(total=Count('id')).order_by()
+    )
+    SearchQueryHourly.objects.bulk_create([
+        SearchQueryHourly(query=row['query'], hour=row['bucket'], count=row['total'])
+        for row in rows.iterator()
+    ], batch_size=500)
+    apps.get_model('user', 'SearchTokenCount').objects.all().delete()
+    apps.get_model('user', 'SearchRankingState').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0013_most_searched_ranking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchQueryHourly',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(max_length=255)),
+                ('hour', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RemoveField(
+            model_name='searchrankingstate',
+            name='last_search_log_id',
+        ),
+        migrations.AddField(
+            model_name='searchrankingstate',
+            name='folded_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='searchlog',
+            index=models.Index(fields=['created_at'], name='user_search_created_921140_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchqueryhourly',
+            index=models.Index(fields=['hour'], name='user_search_hour_2f9cd3_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='searchqueryhourly',
+            unique_together={('query', 'hour')},
+        ),
+        migrations.RunPython(backfill_hourly_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0015_trending_products'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='stockreservation',
+            name='user_stockr_status_fc02a9_idx',
+        ),
+        migrations.RemoveField(
+            model_name='stockreservation',
+            name='expires_at',
+        ),
+        migrations.AlterField(
+            model_name='stockreservation',
+            name='status',
+            field=models.CharField(choices=[('committed', 'Committed'), ('released', 'Released')], default='committed', max_length=20),
+        ),
+    ]
@@ -131,6 +131,9 @@ class Address(models.Model):
     state = models.CharField(max_length=100)
     pincode = models.CharField(max_length=10)
     country = models.CharField(max_length=100, default='India')
+    # Optional, from the client's map picker; used for delivery routing.
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     
     is_default = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -200,6 +203,8 @@ class Order(models.Model):
         indexes = [
             models.Index(fields=['user', 'status']),
             models.Index(fields=['order_number']),
+            # Recent sales for the trending job (user/trending.py)
+            models.Index(fields=['created_at']),
         ]
 
     def __str__(self):
@@ -316,6 +321,33 @@ class Payment(models.Model):
         return f"Payment {self.transaction_id} - {self.status}"
 
 
+class StockReservation(models.Model):
+    """
+    Units of a product taken out of stock for an order (see user/inventory.py).
+    'committed' reservations stay out of stock until the order is rejected or
+    cancelled.
+    """
+    STATUS_CHOICES = [
+        ('committed', 'Committed'),
+        ('released', 'Released'),
+    ]
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='stock_reservations')
+    product = models.ForeignKey('vendor.Product', on_delete=models.CASCADE, related_name='stock_reservations')
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='committed')
+    created_at = models.DateTimeField(auto_now_add=True)
+    released_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x product #{self.product_id} for {self.order_id} ({self.status})"
+
+
 class ProductReview(models.Model):
     """Product reviews and ratings"""
     product = models.ForeignKey('vendor.Product', on_delete=models.CASCADE, related_name='product_reviews_legacy')
@@ -728,10 +760,57 @@ class Review(models.Model):
     reviewer_name = models.CharField(max_length=100, blank=True, null=True) # Added this
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Recent reviews for the trending job (user/trending.py)
+            models.Index(fields=['created_at']),
+        ]
+
     def __str__(self):
         return f"Review for {self.Product.name} by {self.reviewer_name or (self.user.username if self.user else 'Anonymous')}"
 
 
+class ProductRatingSummary(models.Model):
+    """
+    Denormalized rating aggregate for a product.
+    Maintained incrementally by the Review signals in user/signals.py so that
+    product listings can read ratings via select_related('rating_summary')
+    instead of running an aggregate per product.
+    Rebuild from scratch with: python manage.py rebuild_rating_summaries
+    """
+    product = models.OneToOneField('vendor.Product', on_delete=models.CASCADE, related_name='rating_summary')
+    review_count = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0)
+    star_1 = models.PositiveIntegerField(default=0)
+    star_2 = models.PositiveIntegerField(default=0)
+    star_3 = models.PositiveIntegerField(default=0)
+    star_4 = models.PositiveIntegerField(default=0)
+    star_5 = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Product Rating Summaries'
+
+    def __str__(self):
+        return f"Rating summary for product #{self.product_id}: {self.average_rating} ({self.review_count})"
+
+    @property
+    def average_rating(self):
+        if not self.review_count:
+            return 0
+        return round(self.rating_total / self.review_count, 1)
+
+    @property
+    def histogram(self):
+        return {
+            1: self.star_1,
+            2: self.star_2,
+            3: self.star_3,
+            4: self.star_4,
+            5: self.star_5,
+        }
+
+
 # ===============================================
 #          SEARCH TRACKING (ML Feature)
 # ===============================================
@@ -739,7 +818,9 @@ class Review(models.Model):
 class SearchLog(models.Model):
     """
     Logs every search query made on the platform.
-    Used by the ML-based 'most searched products' endpoint.
+    Written in batches by user/search_logging.py, which also keeps the
+    hourly per-query counts (SearchQueryHourly) that the 'most searched
+    products' ranking reads. Rows expire after SEARCH_LOG_RETENTION_DAYS.
     """
     query = models.CharField(max_length=255, db_index=True)
     user = models.ForeignKey(
@@ -754,6 +835,90 @@ class SearchLog(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Retention (python manage.py prune_search_logs)
+            models.Index(fields=['created_at']),
+        ]
 
     def __str__(self):
         return f"Search: '{self.query}' at {self.created_at}"
+
+
+class SearchQueryHourly(models.Model):
+    """Searches per query per hour, maintained by the SearchLog write buffer (user/search_logging.py)."""
+    query = models.CharField(max_length=255)
+    hour = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('query', 'hour')
+        indexes = [models.Index(fields=['hour'])]
+
+    def __str__(self):
+        return f"'{self.query}' x{self.count} at {self.hour}"
+
+
+class SearchTokenCount(models.Model):
+    """
+    Searches per query word per day, folded in from the hourly query
+    counts (SearchQueryHourly) by user/search_ranking.py. The most-searched ranking weighs words by their
+    counts over the last MOST_SEARCHED_WINDOW_DAYS days.
+    """
+    token = models.CharField(max_length=100)
+    date = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('token', 'date')
+        indexes = [models.Index(fields=['date'])]
+
+    def __str__(self):
+        return f"'{self.token}' x{self.count} on {self.date}"
+
+
+class SearchRankingState(models.Model):
+    """Progress of the most-searched ranking job: hourly counts before folded_until are folded in (single row)."""
+    folded_until = models.DateTimeField(null=True, blank=True)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Search ranking up to {self.folded_until}"
+
+
+class MostSearchedProduct(models.Model):
+    """
+    Precomputed most-searched ranking, overall (category '') and per product
+    category. Replaced as a whole by `python manage.py refresh_most_searched`.
+    """
+    category = models.CharField(max_length=50, blank=True, default='')
+    rank = models.PositiveSmallIntegerField()
+    product = models.ForeignKey('vendor.Product', on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['category', 'rank']
+        unique_together = ('category', 'rank')
+
+    def __str__(self):
+        return f"#{self.rank} {self.category or 'all'}: product {self.product_id}"
+
+
+class TrendingProduct(models.Model):
+    """
+    Precomputed trending ranking, overall (category '') and per product
+    category, from time-decayed reviews, sales and searches. Replaced as a
+    whole by `python manage.py refresh_trending` (user/trending.py).
+    """
+    category = models.CharField(max_length=50, blank=True, default='')
+    rank = models.PositiveSmallIntegerField()
+    product = models.ForeignKey('vendor.Product', on_delete=models.CASCADE, related_name='trending_ranks')
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['category', 'rank']
+        unique_together = ('category', 'rank')
+
+    def __str__(self):
+        return f"#{self.rank} {self.category or 'all'}: product {self.product_id}"
@@ -0,0 +1,147 @@
+"""
+user/orders.py
+
+Builds an order, its payment record, stock reservations and order items for
+process_payment with a fixed number of queries, whatever the cart size:
+one product lookup, cached commission rules (superAdmin/commission.py), and
+bulk inserts for the reservations and the order items.
+"""
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+from django.utils import timezone
+
+from superAdmin.commission import commission_for_lines
+from vendor.models import Product, VendorProfile
+from .inventory import reserve_stock
+from .models import Order, OrderItem, Payment
+
+
+# product is None when a request line names a product that no longer exists.
+OrderLine = namedtuple('OrderLine', ['product', 'name', 'price', 'quantity'])
+
+
+class InvalidOrderLine(ValueError):
+    """Raised for a line with a malformed or non-positive quantity or price."""
+
+
+def _quantity(value, name):
+    try:
+        quantity = int(value)
+    except (TypeError, ValueError):
+        raise InvalidOrderLine(f'Invalid quantity for {name}')
+    if quantity < 1:
+        raise InvalidOrderLine(f'Quantity for {name} must be positive')
+    return quantity
+
+
+def _price(value, name):
+    try:
+        price = Decimal(str(value))
+    except InvalidOperation:
+        raise InvalidOrderLine(f'Invalid price for {name}')
+    if not price.is_finite() or price < 0:
+        raise InvalidOrderLine(f'Invalid price for {name}')
+    return price
+
+
+def _products_by_name(names):
+    """Map product name -> product for lines sent by name (newest product wins)."""
+    products = {}
+    queryset = (
+        Product.objects.filter(name__in=set(names))
+        .select_related('vendor')
+        .defer(*VendorProfile.document_defer_paths('vendor'))
+        .order_by('created_at', 'id')
+    )
+    for product in queryset:
+        products[product.name] = product
+    return products
+
+
+def lines_from_request_items(items):
+    """
+    Order lines from the frontend payload: [{"name", "price", "quantity"}, ...].
+    Raises InvalidOrderLine for a malformed quantity or price.
+    """
+    products = _products_by_name(item.get('name') for item in items)
+    return [
+        OrderLine(
+            product=products.get(item.get('name')),
+            name=item.get('name'),
+            price=_price(item.get('price', 0), item.get('name')),
+            quantity=_quantity(item.get('quantity', 1), item.get('name')),
+        )
+        for item in items
+    ]
+
+
+def lines_from_cart(cart):
+    """Order lines from the stored cart, priced at the current product price."""
+    cart_items = (
+        cart.items.select_related('product__vendor')
+        .defer(*VendorProfile.document_defer_paths('product__vendor'))
+    )
+    return [
+        OrderLine(
+            product=item.product, name=item.product.name, price=item.product.price,
+            quantity=_quantity(item.quantity, item.product.name),
+        )
+        for item in cart_items
+    ]
+
+
+def create_order(user, lines, payment_mode, transaction_id, order_number):
+    """
+    Create a paid order for `lines`. Must run inside a transaction; raises
+    InsufficientStock (from reserve_stock) when any line cannot be met.
+    """
+    total_amount = sum((line.price * line.quantity for line in lines), Decimal('0.00'))
+
+    order = Order.objects.create(
+        user=user,
+        order_number=order_number,
+        payment_method=payment_mode,
+        transaction_id=transaction_id,
+        total_amount=total_amount,
+        subtotal=total_amount,
+        payment_status='completed'
+    )
+
+    Payment.objects.create(
+        order=order,
+        user=user,
+        method=payment_mode if payment_mode in dict(Payment.PAYMENT_METHOD_CHOICES) else 'cod',
+        amount=total_amount,
+        transaction_id=transaction_id,
+        status='completed',
+        completed_at=timezone.now().replace(second=0, microsecond=0)
+    )
+
+    reserve_stock(order, [(line.product.id, line.quantity) for line in lines if line.product])
+
+    priced = iter(commission_for_lines(
+        (line.product, line.price * line.quantity) for line in lines if line.product
+    ))
+    order_items = []
+    for line in lines:
+        subtotal = line.price * line.quantity
+        commission_rate = Decimal('10.00')
+        commission_amount = Decimal('0.00')
+        if line.product:
+            commission_rate, commission_amount = next(priced)
+
+        order_items.append(OrderItem(
+            order=order,
+            product=line.product,
+            vendor=line.product.vendor if line.product else None,
+            product_name=line.name,
+            quantity=line.quantity,
+            product_price=line.price,
+            subtotal=subtotal,
+            commission_rate=commission_rate,
+            commission_amount=commission_amount
+        ))
+    OrderItem.objects.bulk_create(order_items)
+
+    return order
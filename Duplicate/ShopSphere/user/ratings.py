@@ -0,0 +1,79 @@
+"""
+user/ratings.py
+
+Maintenance of the denormalized ProductRatingSummary table.
+Review signals call apply_review_delta() for incremental updates; the
+rebuild_rating_summaries management command calls rebuild_rating_summaries()
+to recompute everything from the Review table.
+"""
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import ProductRatingSummary, Review
+
+
+STAR_FIELDS = {i: f'star_{i}' for i in range(1, 6)}
+
+
+def apply_review_delta(product_id, rating, delta):
+    """
+    Add (delta=1) or remove (delta=-1) a single rating from a product summary.
+    Uses F() expressions so concurrent review writes cannot lose updates.
+    """
+    star_field = STAR_FIELDS.get(rating)
+    if not product_id or not star_field:
+        return
+
+    if delta > 0:
+        ProductRatingSummary.objects.get_or_create(product_id=product_id)
+        qs = ProductRatingSummary.objects.filter(product_id=product_id)
+    else:
+        # Never drive a counter below zero; a drifted summary is fixed by a rebuild.
+        qs = ProductRatingSummary.objects.filter(
+            product_id=product_id,
+            review_count__gt=0,
+            rating_total__gte=rating,
+            **{f'{star_field}__gt': 0},
+        )
+
+    qs.update(
+        review_count=F('review_count') + delta,
+        rating_total=F('rating_total') + delta * rating,
+        updated_at=timezone.now(),
+        **{star_field: F(star_field) + delta},
+    )
+
+
+def rebuild_rating_summaries(product_ids=None):
+    """
+    Recompute rating summaries from the Review table in a single grouped query.
+    Returns the number of summaries written.
+    """
+    reviews = Review.objects.all()
+    if product_ids is not None:
+        reviews = reviews.filter(Product_id__in=product_ids)
+
+    rows = reviews.values('Product_id', 'rating').annotate(n=Count('id'))
+
+    summaries = {}
+    for row in rows:
+        star_field = STAR_FIELDS.get(row['rating'])
+        if not star_field:
+            continue
+        summary = summaries.setdefault(
+            row['Product_id'],
+            ProductRatingSummary(product_id=row['Product_id'], updated_at=timezone.now()),
+        )
+        setattr(summary, star_field, row['n'])
+        summary.review_count += row['n']
+        summary.rating_total += row['n'] * row['rating']
+
+    with transaction.atomic():
+        stale = ProductRatingSummary.objects.all()
+        if product_ids is not None:
+            stale = stale.filter(product_id__in=product_ids)
+        stale.delete()
+        ProductRatingSummary.objects.bulk_create(summaries.values(), batch_size=500)
+
+    return len(summaries)
@@ -0,0 +1,515 @@
+"""
+user/search.py
+
+Product search (search_products / search_suggestions views): an inverted
+index over product name, description, category and vendor shop name,
+ranked with BM25. Every query word must match; the last word also matches
+as a prefix ("blue iph" finds "Blue iPhone case"), which drives typeahead.
+
+Two backends share the tokenizer and the field weights:
+
+    fts5    SQLite FTS5 table `user_productsearch` (created by migration
+            0012 when the SQLite build has FTS5), ranked with the built-in
+            bm25() and per-column weights, with 2- and 3-letter prefix
+            indexes for typeahead.
+    memory  InvertedIndex, a per-process index for databases without FTS5.
+            Saves update it in place and publish a version stamp in the
+            shared cache after commit; other workers rebuild on their next
+            search, like deliveryAgent/agent_index.py.
+
+Only listed products (active, not blocked, from an active, unblocked
+vendor; the catalog's filter) are indexed. Product and VendorProfile
+writes reindex the affected products after commit (signals.py); writes
+through update()/bulk_update() are not seen, `python manage.py
+rebuild_search_index` rebuilds from scratch. `python manage.py
+benchmark_search` times both backends against an icontains scan on a
+synthetic catalog.
+"""
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+import uuid
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+FTS_TABLE = 'user_productsearch'
+VERSION_CACHE_KEY = 'search:product_index:version'
+
+logger = logging.getLogger(__name__)
+
+# Column order of the FTS5 table and of index rows after the product id.
+FIELDS = ('name', 'description', 'category', 'shop_name')
+FIELD_WEIGHTS = {'name': 4.0, 'description': 1.0, 'category': 2.0, 'shop_name': 1.5}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+MIN_PREFIX_LENGTH = 2       # a shorter last word must match exactly
+MAX_QUERY_TERMS = 8
+MAX_RESULTS = 1000          # ranked matches considered for filtering and paging
+
+TOKEN_RE = re.compile(r'[^\W_]+')
+
+CREATE_FTS_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"{', '.join(FIELDS)}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+)
+
+
+def tokenize(text):
+    """Lower-cased words without accents; what FTS5's unicode61 tokenizer produces."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return TOKEN_RE.findall(text.lower())
+
+
+def parse_query(query, prefix=True):
+    """
+    (terms, prefix): the query's words and whether the last one should also
+    match as a prefix (not when the query ends with a space).
+    """
+    terms = tokenize(query)[:MAX_QUERY_TERMS]
+    prefix = bool(
+        prefix and terms and len(terms[-1]) >= MIN_PREFIX_LENGTH
+        and not (query or '').endswith(' ')
+    )
+    return terms, prefix
+
+
+# -- indexed rows -----------------------------------------------------------------
+
+def listed_products(product_model):
+    """Products that belong in the index (the catalog's listing filter)."""
+    return product_model.objects.filter(
+        status='active', is_blocked=False, vendor__is_active=True, vendor__is_blocked=False,
+    )
+
+
+def index_rows(queryset):
+    """(id, name, description, category label, shop name) rows of a product queryset."""
+    from vendor.models import Product
+
+    labels = dict(Product.CATEGORY_CHOICES)
+    for product_id, name, description, category, shop_name in queryset.values_list(
+        'id', 'name', 'description', 'category', 'vendor__shop_name',
+    ).iterator(chunk_size=2000):
+        yield product_id, name or '', description or '', labels.get(category, category or ''), shop_name or ''
+
+
+# -- FTS5 backend -----------------------------------------------------------------
+
+def fts5_available(conn=None):
+    """Whether the SQLite build behind `conn` (default: Django's) has FTS5."""
+    conn = conn or connection
+    if getattr(conn, 'vendor', 'sqlite') != 'sqlite':
+        return False
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+    finally:
+        cursor.close()
+
+
+class FTS5Index:
+    """
+    Search over the FTS5 table. `conn` is Django's connection or a plain
+    sqlite3 connection (benchmark_search).
+    """
+    name = 'fts5'
+
+    def __init__(self, conn=None):
+        self.conn = conn or connection
+        # Django's cursors take %s (and format it into the debug SQL log).
+        self.placeholder = '%s' if hasattr(self.conn, 'vendor') else '?'
+        weights = ', '.join(str(FIELD_WEIGHTS[field]) for field in FIELDS)
+        self.rank = f'bm25({FTS_TABLE}, {weights})'
+
+    def _execute(self, sql, params=(), many=False, fetch=False):
+        cursor = self.conn.cursor()
+        try:
+            if many:
+                cursor.executemany(sql, params)
+            else:
+                cursor.execute(sql, params)
+            return cursor.fetchall() if fetch else None
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def match_expression(terms, prefix):
+        # Tokens are plain words, so quoting each one can't break the syntax.
+        phrases = [f'"{term}"' for term in terms]
+        if prefix:
+            phrases[-1] += '*'
+        return ' '.join(phrases)
+
+    def create(self):
+        self._execute(CREATE_FTS_SQL)
+
+    def drop(self):
+        self._execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+    def clear(self):
+        self._execute(f'DELETE FROM {FTS_TABLE}')
+
+    def delete(self, product_ids):
+        product_ids = list(product_ids)
+        for start in range(0, len(product_ids), 500):
+            chunk = product_ids[start:start + 500]
+            self._execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join([self.placeholder] * len(chunk))})",
+                chunk,
+            )
+
+    def add(self, rows):
+        self._execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FIELDS)}) "
+            f"VALUES ({', '.join([self.placeholder] * (len(FIELDS) + 1))})",
+            list(rows), many=True,
+        )
+
+    def update(self, rows, removed_ids=()):
+        rows = list(rows)
+        self.delete([row[0] for row in rows] + list(removed_ids))
+        self.add(rows)
+
+    def search(self, terms, prefix=False, limit=MAX_RESULTS):
+        """(total matches, [(product_id, score), ...] best first, at most `limit`)."""
+        if not terms:
+            return 0, []
+        expression, p = self.match_expression(terms, prefix), self.placeholder
+        total = self._execute(
+            f'SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH {p}', [expression], fetch=True,
+        )[0][0]
+        if not total:
+            return 0, []
+        # bm25() is lower-is-better; scores are returned negated.
+        rows = self._execute(
+            f'SELECT rowid, -{self.rank} FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH {p} '
+            f'ORDER BY {self.rank}, rowid DESC LIMIT {p}',
+            [expression, limit], fetch=True,
+        )
+        return total, [(product_id, score) for product_id, score in rows]
+
+
+# -- in-process backend -----------------------------------------------------------
+
+class InvertedIndex:
+    """
+    Term -> {product_id: weighted term frequency} postings with BM25 over
+    the field-weighted document (BM25F-style: a name hit counts
+    FIELD_WEIGHTS['name'] times). The sorted vocabulary serves prefix lookups.
+    """
+    name = 'memory'
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.doc_terms = {}             # product_id -> {term: weighted tf}, for removal
+        self.doc_length = {}
+        self.total_length = 0.0
+        self._vocabulary = []
+        self._vocabulary_stale = False
+        self.version = None
+        self.built_at = 0.0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.doc_length)
+
+    # -- maintenance ----------------------------------------------------------
+
+    def _remove(self, product_id):
+        terms = self.doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self.postings[term]
+            postings.pop(product_id, None)
+            if not postings:
+                del self.postings[term]
+                self._vocabulary_stale = True
+        self.total_length -= self.doc_length.pop(product_id)
+
+    def _add(self, row):
+        product_id, *values = row
+        weighted = defaultdict(float)
+        for field, text in zip(FIELDS, values):
+            weight = FIELD_WEIGHTS[field]
+            for term in tokenize(text):
+                weighted[term] += weight
+        for term, frequency in weighted.items():
+            postings = self.postings[term]
+            if not postings:
+                self._vocabulary_stale = True
+            postings[product_id] = frequency
+        self.doc_terms[product_id] = dict(weighted)
+        length = sum(weighted.values())
+        self.doc_length[product_id] = length
+        self.total_length += length
+
+    def update(self, rows, removed_ids=()):
+        with self._lock:
+            for product_id in removed_ids:
+                self._remove(product_id)
+            for row in rows:
+                self._remove(row[0])
+                self._add(row)
+
+    def delete(self, product_ids):
+        self.update((), product_ids)
+
+    def rebuild(self, rows, version=None):
+        with self._lock:
+            self.postings = defaultdict(dict)
+            self.doc_terms = {}
+            self.doc_length = {}
+            self.total_length = 0.0
+            for row in rows:
+                self._add(row)
+            self._vocabulary_stale = True
+            self.version = version
+            self.built_at = time.monotonic()
+
+    # -- queries --------------------------------------------------------------
+
+    def _expand(self, prefix):
+        if self._vocabulary_stale:
+            self._vocabulary = sorted(self.postings)
+            self._vocabulary_stale = False
+        start = bisect_left(self._vocabulary, prefix)
+        terms = []
+        for term in self._vocabulary[start:]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def _postings(self, term, prefix):
+        """{product_id: weighted tf} of a term, or of every term it prefixes."""
+        if not prefix:
+            return self.postings.get(term, {})
+        merged = defaultdict(float)
+        for expanded in self._expand(term):
+            for product_id, frequency in self.postings[expanded].items():
+                merged[product_id] += frequency
+        return merged
+
+    def search(self, terms, prefix=False, limit=MAX_RESULTS):
+        """(total matches, [(product_id, score), ...] best first, at most `limit`)."""
+        if not terms:
+            return 0, []
+        with self._lock:
+            lists = [
+                self._postings(term, prefix and i == len(terms) - 1)
+                for i, term in enumerate(terms)
+            ]
+            if not all(lists):
+                return 0, []
+            # Intersect from the rarest term.
+            lists.sort(key=len)
+            matches = set(lists[0])
+            for postings in lists[1:]:
+                matches.intersection_update(postings)
+                if not matches:
+                    return 0, []
+
+            n = len(self.doc_length)
+            average = self.total_length / n if n else 1.0
+            scores = dict.fromkeys(matches, 0.0)
+            for postings in lists:
+                idf = math.log((n - len(postings) + 0.5) / (len(postings) + 0.5) + 1.0)
+                for product_id in matches:
+                    frequency = postings[product_id]
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_length[product_id] / average)
+                    scores[product_id] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+        return len(matches), best
+
+
+_memory_index = InvertedIndex()
+_memory_lock = threading.Lock()
+
+
+def _shared_version():
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(VERSION_CACHE_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(VERSION_CACHE_KEY)
+    return version
+
+
+def get_memory_index():
+    """The process index, rebuilt when another worker changed products or it aged out."""
+    from vendor.models import Product
+
+    version = _shared_version()
+    max_age = getattr(settings, 'SEARCH_INDEX_MAX_AGE', 300)
+    index = _memory_index
+    if index.version != version or time.monotonic() - index.built_at > max_age:
+        with _memory_lock:
+            if index.version != version or time.monotonic() - index.built_at > max_age:
+                index.rebuild(index_rows(listed_products(Product)), version)
+    return index
+
+
+def _publish_memory_change():
+    def publish():
+        version = uuid.uuid4().hex
+        cache.set(VERSION_CACHE_KEY, version, timeout=None)
+        if _memory_index.version is not None:
+            _memory_index.version = version
+
+    transaction.on_commit(publish)
+
+
+# -- backend selection and maintenance ------------------------------------------
+
+_fts_ready = {}
+
+
+def backend_name():
+    """'fts5' or 'memory', from SEARCH_BACKEND ('auto' picks FTS5 when its table exists)."""
+    name = getattr(settings, 'SEARCH_BACKEND', 'auto')
+    if name != 'auto':
+        return name
+    alias = connection.alias
+    if alias not in _fts_ready:
+        _fts_ready[alias] = (
+            connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+        )
+    return 'fts5' if _fts_ready[alias] else 'memory'
+
+
+def get_backend():
+    return FTS5Index() if backend_name() == 'fts5' else get_memory_index()
+
+
+def reindex_products(product_ids):
+    """Bring these products' index entries up to date (delisted or deleted ones are removed)."""
+    from vendor.models import Product
+
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+    rows = list(index_rows(listed_products(Product).filter(id__in=product_ids)))
+    removed = product_ids - {row[0] for row in rows}
+    if backend_name() == 'fts5':
+        FTS5Index().update(rows, removed)
+    elif _memory_index.version is not None:
+        # An index not built yet loads everything on first use anyway.
+        _memory_index.update(rows, removed)
+        _publish_memory_change()
+
+
+def schedule_reindex(product_ids=(), vendor_ids=()):
+    """reindex_products() once the current transaction commits."""
+    product_ids, vendor_ids = set(product_ids), set(vendor_ids)
+    if not product_ids and not vendor_ids:
+        return
+
+    def reindex():
+        from vendor.models import Product
+
+        ids = set(product_ids)
+        if vendor_ids:
+            ids.update(Product.objects.filter(vendor_id__in=vendor_ids).values_list('id', flat=True))
+        try:
+            reindex_products(ids)
+        except Exception:
+            # rebuild_search_index repairs an index that missed an update.
+            logger.exception("Search index update failed for %d products", len(ids))
+
+    transaction.on_commit(reindex)
+
+
+def rebuild_index():
+    """Reindex every listed product from scratch. Returns the number indexed."""
+    from vendor.models import Product
+
+    rows = index_rows(listed_products(Product))
+    if backend_name() == 'fts5':
+        index = FTS5Index()
+        with transaction.atomic():
+            index.clear()
+            count = 0
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) == 2000:
+                    index.add(batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                index.add(batch)
+            return count + len(batch)
+    with _memory_lock:
+        _memory_index.rebuild(rows, _memory_index.version)
+    _publish_memory_change()
+    return len(_memory_index)
+
+
+# -- queries ----------------------------------------------------------------------
+
+def search_product_ids(query, prefix=True, limit=MAX_RESULTS):
+    """(total matches, [product_id, ...] best first) for a free-text query."""
+    terms, prefix = parse_query(query, prefix)
+    total, ranked = get_backend().search(terms, prefix, limit)
+    return total, [product_id for product_id, _ in ranked]
+
+
+SUGGESTION_LIMIT = 8
+FILTER_PARAMS = ('category', 'min_price', 'max_price', 'vendor')
+
+
+def paginate_search(request):
+    """
+    Return (products, total, next_url) for GET /search/. Ranked matches are
+    narrowed by the catalog filters, then paged by ?page=. Raises
+    CatalogError on bad input.
+    """
+    from rest_framework.utils.urls import replace_query_param
+    from vendor.models import Product
+    from .catalog import CatalogError, catalog_queryset, filter_catalog, get_page_size
+
+    params = request.query_params
+    page_size = get_page_size(params)
+    try:
+        page = int(params.get('page', 1))
+    except (TypeError, ValueError):
+        raise CatalogError('Invalid page')
+    if page < 1:
+        raise CatalogError('Invalid page')
+
+    total, ids = search_product_ids(params.get('q', ''))
+    if ids and any(params.get(name) for name in FILTER_PARAMS):
+        allowed = set(filter_catalog(Product.objects.filter(id__in=ids), params).values_list('id', flat=True))
+        ids = [product_id for product_id in ids if product_id in allowed]
+        total = len(ids)
+
+    page_ids = ids[(page - 1) * page_size:page * page_size]
+    # The catalog filter again: the index may lag behind bulk updates.
+    products = {product.id: product for product in catalog_queryset().filter(id__in=page_ids)}
+    next_url = None
+    if page * page_size < len(ids):
+        next_url = replace_query_param(request.build_absolute_uri(), 'page', page + 1)
+    return [products[i] for i in page_ids if i in products], total, next_url
+
+
+def suggest_products(query, limit=SUGGESTION_LIMIT):
+    """[{id, name, category, price}, ...] best first, for typeahead."""
+    from vendor.models import Product
+
+    _, ids = search_product_ids(query, limit=limit)
+    rows = {
+        row['id']: row
+        for row in listed_products(Product).filter(id__in=ids).values('id', 'name', 'category', 'price')
+    }
+    return [rows[i] for i in ids if i in rows]
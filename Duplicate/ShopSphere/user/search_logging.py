@@ -0,0 +1,214 @@
+"""
+user/search_logging.py
+
+Write path for search events (log_search), the busiest write of the shop:
+the frontend reports every debounced search keystroke.
+
+Events go to an in-process buffer that is written once it holds
+SEARCH_LOG_BUFFER_SIZE events or its oldest event is
+SEARCH_LOG_BUFFER_MAX_AGE seconds old (a timer thread covers idle periods),
+as deliveryAgent/location_ingest.py does for GPS pings. A flush is one
+bulk_create of the raw SearchLog rows plus one counter increment per
+distinct (query, hour) in SearchQueryHourly. SEARCH_LOG_BUFFER_SIZE = 0
+writes on every request. Events still buffered when a worker dies are lost.
+A failed write is logged and never reaches the caller: its rows go back to
+the buffer and are retried after SEARCH_LOG_BUFFER_MAX_AGE seconds, up to
+MAX_PENDING_BUFFERS buffers' worth; older rows beyond that are dropped and
+counted in SearchLogBuffer.dropped.
+
+The most-searched ranking (search_ranking.py) reads the hourly counts, so
+raw rows are only kept for SEARCH_LOG_RETENTION_DAYS; prune_search_logs()
+(`python manage.py prune_search_logs`, from cron) deletes older rows, and
+rollups after SEARCH_ROLLUP_RETENTION_DAYS.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+DELETE_BATCH_SIZE = 5000
+MAX_PENDING_BUFFERS = 10
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def hour_of(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+# -- hourly rollups ---------------------------------------------------------------
+
+def add_hourly_counts(counts):
+    """Add {(query, hour): n} to SearchQueryHourly with F() increments."""
+    from .models import SearchQueryHourly
+
+    missing = {}
+    for (query, hour), n in counts.items():
+        if not SearchQueryHourly.objects.filter(query=query, hour=hour).update(count=F('count') + n):
+            missing[(query, hour)] = n
+    if not missing:
+        return
+    try:
+        with transaction.atomic():
+            SearchQueryHourly.objects.bulk_create([
+                SearchQueryHourly(query=query, hour=hour, count=n) for (query, hour), n in missing.items()
+            ])
+    except IntegrityError:
+        # Another worker created some of these rows first.
+        for (query, hour), n in missing.items():
+            try:
+                with transaction.atomic():
+                    SearchQueryHourly.objects.create(query=query, hour=hour, count=n)
+            except IntegrityError:
+                SearchQueryHourly.objects.filter(query=query, hour=hour).update(count=F('count') + n)
+
+
+def write_search_logs(rows):
+    """Insert SearchLog rows and add them to the hourly counts, in one transaction."""
+    from .models import SearchLog
+
+    if not rows:
+        return
+    with transaction.atomic():
+        # created_at (auto_now_add) is the write time, set by bulk_create().
+        SearchLog.objects.bulk_create(rows, batch_size=500)
+        add_hourly_counts(Counter((row.query, hour_of(row.created_at)) for row in rows))
+
+
+# -- buffer -----------------------------------------------------------------------
+
+class SearchLogBuffer:
+    """Pending SearchLog rows of this process, written by write_search_logs()."""
+
+    def __init__(self):
+        self._rows = []
+        self._oldest = None
+        self._timer = None
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, row):
+        size = _setting('SEARCH_LOG_BUFFER_SIZE', 200)
+        max_age = _setting('SEARCH_LOG_BUFFER_MAX_AGE', 5)
+        with self._lock:
+            self._rows.append(row)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            now = time.monotonic()
+            due = (len(self._rows) >= size or now - self._oldest >= max_age) and now >= self._retry_at
+            if not due and self._timer is None:
+                self._start_timer(max_age)
+        if due:
+            self.flush()
+
+    def _start_timer(self, delay):
+        self._timer = threading.Timer(delay, self._flush_from_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _take(self):
+        with self._lock:
+            rows, self._rows, self._oldest = self._rows, [], None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return rows
+
+    def _restore(self, rows):
+        """Put the rows of a failed write back for a later retry. Returns how many were dropped."""
+        limit = max(_setting('SEARCH_LOG_BUFFER_SIZE', 200), 1) * MAX_PENDING_BUFFERS
+        max_age = _setting('SEARCH_LOG_BUFFER_MAX_AGE', 5)
+        for row in rows:
+            # bulk_create() may have set ids before the transaction rolled back.
+            row.pk = None
+        with self._lock:
+            pending = rows + self._rows
+            dropped = max(len(pending) - limit, 0)
+            self._rows = pending[dropped:]
+            self.dropped += dropped
+            self._oldest = time.monotonic()
+            self._retry_at = self._oldest + max_age
+            if self._timer is None:
+                self._start_timer(max_age)
+        return dropped
+
+    def flush(self):
+        """Write every pending row; returns how many were written (0 if the write failed)."""
+        rows = self._take()
+        try:
+            write_search_logs(rows)
+        except Exception:
+            dropped = self._restore(rows)
+            logger.exception(
+                'Search log write failed; %d rows kept for retry, %d dropped', len(rows) - dropped, dropped,
+            )
+            return 0
+        return len(rows)
+
+    def _flush_from_timer(self):
+        close_old_connections()
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+
+_buffer = SearchLogBuffer()
+atexit.register(_buffer.flush)
+
+
+def flush_search_log_buffer():
+    return _buffer.flush()
+
+
+def record_search(query, user_id=None, session_key=''):
+    """Log one search. `query` is stored lower-cased, at most 255 characters."""
+    from .models import SearchLog
+
+    row = SearchLog(query=query.lower()[:255], user_id=user_id, session_key=session_key)
+    if _setting('SEARCH_LOG_BUFFER_SIZE', 200) > 0:
+        _buffer.add(row)
+        return
+    try:
+        write_search_logs([row])
+    except Exception:
+        # Search logging must never fail the request.
+        logger.exception('Search log write failed; 1 row dropped')
+
+
+# -- retention --------------------------------------------------------------------
+
+def _delete_in_batches(queryset):
+    deleted = 0
+    while True:
+        ids = list(queryset.values_list('id', flat=True)[:DELETE_BATCH_SIZE])
+        if not ids:
+            return deleted
+        deleted += queryset.model.objects.filter(id__in=ids).delete()[0]
+
+
+def prune_search_logs(log_days=None, rollup_days=None):
+    """Delete raw logs and hourly counts past their retention. Returns (logs, rollups) deleted."""
+    from .models import SearchLog, SearchQueryHourly
+
+    now = timezone.now()
+    log_days = log_days or _setting('SEARCH_LOG_RETENTION_DAYS', 14)
+    rollup_days = rollup_days or _setting('SEARCH_ROLLUP_RETENTION_DAYS', 90)
+    logs = _delete_in_batches(SearchLog.objects.filter(created_at__lt=now - timedelta(days=log_days)))
+    rollups = _delete_in_batches(SearchQueryHourly.objects.filter(hour__lt=now - timedelta(days=rollup_days)))
+    return logs, rollups
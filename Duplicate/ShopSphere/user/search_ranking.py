@@ -0,0 +1,222 @@
+"""
+user/search_ranking.py
+
+Precomputed most-searched ranking (most_searched_products view), refreshed
+by `python manage.py refresh_most_searched` (run from cron).
+
+1. Fold in. Hourly query counts (SearchQueryHourly, kept by
+   search_logging.py) of the hours closed since the stored watermark are
+   tokenized and added to per-day word counts (SearchTokenCount); buckets
+   older than MOST_SEARCHED_WINDOW_DAYS are dropped. Each run reads only
+   the new hours, never the raw SearchLog.
+2. Weigh. The window's top MAX_TOKENS words get weight count / max count.
+3. Score. Candidates are the products the search index (search.py)
+   matches for those words, not the whole catalog. A product scores the
+   weights of the words in its name plus 0.05 per average rating star, as
+   the endpoint used to compute per request.
+4. Rank. The top MOST_SEARCHED_TOP_N overall and per category replace the
+   MostSearchedProduct rows in one transaction.
+
+score_products() and rank_products() take any weights, so other rankings
+can reuse them.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .search import listed_products, search_product_ids, tokenize
+
+STOP_WORDS = {
+    'the', 'a', 'an', 'is', 'in', 'on', 'at', 'for', 'of', 'and', 'or', 'to', 'with', 'by',
+}
+MAX_TOKENS = 200
+CANDIDATES_PER_TOKEN = 200
+RATING_WEIGHT = 0.05
+FOLD_GRACE_SECONDS = 60
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def query_tokens(query):
+    """Distinct words of a search query that count towards the ranking."""
+    return {token for token in tokenize(query) if len(token) >= 2 and token not in STOP_WORDS}
+
+
+# -- folding hourly query counts into daily word counts ---------------------------
+
+def _add_counts(counts):
+    """Add {(token, date): n} to the SearchTokenCount buckets."""
+    items = list(counts.items())
+    for start in range(0, len(items), 500):
+        _add_count_batch(dict(items[start:start + 500]))
+
+
+def _add_count_batch(counts):
+    from .models import SearchTokenCount
+
+    existing = {
+        (row.token, row.date): row
+        for row in SearchTokenCount.objects.filter(
+            token__in={token for token, _ in counts},
+            date__in={day for _, day in counts},
+        )
+    }
+    changed, created = [], []
+    for (token, day), n in counts.items():
+        row = existing.get((token, day))
+        if row is None:
+            created.append(SearchTokenCount(token=token, date=day, count=n))
+        else:
+            row.count += n
+            changed.append(row)
+    SearchTokenCount.objects.bulk_update(changed, ['count'], batch_size=500)
+    SearchTokenCount.objects.bulk_create(created, batch_size=500)
+
+
+def fold_hourly_counts(window_days=None):
+    """
+    Add the hourly query counts (SearchQueryHourly) of hours that closed
+    since the last run to the daily word counts. An hour is closed
+    FOLD_GRACE_SECONDS after the search buffers' max age past its end, when
+    every worker has flushed into it. Returns the number of hourly rows
+    folded in.
+    """
+    from .models import SearchQueryHourly, SearchRankingState
+    from .search_logging import hour_of
+
+    window_days = window_days or _setting('MOST_SEARCHED_WINDOW_DAYS', 30)
+    now = timezone.now()
+    grace = timedelta(seconds=_setting('SEARCH_LOG_BUFFER_MAX_AGE', 5) + FOLD_GRACE_SECONDS)
+    until = hour_of(now - grace)
+    with transaction.atomic():
+        state, _ = SearchRankingState.objects.select_for_update().get_or_create(pk=1)
+        since = hour_of(now - timedelta(days=window_days))
+        if state.folded_until and state.folded_until > since:
+            since = state.folded_until
+        counts = Counter()
+        folded = 0
+        for query, hour, count in (
+            SearchQueryHourly.objects.filter(hour__gte=since, hour__lt=until)
+            .values_list('query', 'hour', 'count').iterator(chunk_size=2000)
+        ):
+            folded += 1
+            for token in query_tokens(query):
+                counts[(token[:100], hour.date())] += count
+        _add_counts(counts)
+        state.folded_until = until
+        state.save(update_fields=['folded_until'])
+    return folded
+
+
+def prune_token_counts(window_days=None):
+    """Drop buckets that fell out of the window. Returns the number deleted."""
+    from .models import SearchTokenCount
+
+    window_days = window_days or _setting('MOST_SEARCHED_WINDOW_DAYS', 30)
+    cutoff = timezone.now().date() - timedelta(days=window_days)
+    deleted, _ = SearchTokenCount.objects.filter(date__lt=cutoff).delete()
+    return deleted
+
+
+def token_weights(window_days=None, limit=MAX_TOKENS):
+    """{token: weight in (0, 1]} of the window's most searched words."""
+    from .models import SearchTokenCount
+
+    window_days = window_days or _setting('MOST_SEARCHED_WINDOW_DAYS', 30)
+    since = timezone.now().date() - timedelta(days=window_days)
+    top = list(
+        SearchTokenCount.objects.filter(date__gte=since)
+        .values('token').annotate(total=Sum('count')).order_by('-total', 'token')[:limit]
+    )
+    if not top:
+        return {}
+    max_total = top[0]['total'] or 1
+    return {row['token']: row['total'] / max_total for row in top}
+
+
+# -- scoring ----------------------------------------------------------------------
+
+def candidate_products(weights, per_token=CANDIDATES_PER_TOKEN):
+    """Ids of the products the search index matches for any weighted word."""
+    ids = set()
+    for token in weights:
+        ids.update(search_product_ids(token, prefix=False, limit=per_token)[1])
+    return ids
+
+
+def score_products(weights, product_ids):
+    """[(score, product_id, category), ...] of the listed products among `product_ids`."""
+    from vendor.models import Product
+
+    rows = (
+        listed_products(Product).filter(id__in=product_ids)
+        .values_list('id', 'name', 'category', 'rating_summary__review_count', 'rating_summary__rating_total')
+    )
+    scored = []
+    for product_id, name, category, review_count, rating_total in rows:
+        score = sum(weights.get(token, 0) for token in set(tokenize(name)))
+        if review_count:
+            score += (rating_total / review_count) * RATING_WEIGHT
+        if score > 0:
+            scored.append((score, product_id, category))
+    return scored
+
+
+def rank_products(scored, top_n):
+    """{category: [(score, product_id), ...]} best first; '' is the overall ranking."""
+    by_category = defaultdict(list)
+    for score, product_id, category in scored:
+        by_category[''].append((score, product_id))
+        by_category[category].append((score, product_id))
+    return {
+        category: sorted(entries, key=lambda entry: (-entry[0], -entry[1]))[:top_n]
+        for category, entries in by_category.items()
+    }
+
+
+# -- the job ----------------------------------------------------------------------
+
+def refresh_most_searched(top_n=None, window_days=None):
+    """Fold in new searches and replace the stored rankings. Returns a summary dict."""
+    from ShopSphere.cache import invalidate_tags
+    from .models import MostSearchedProduct, SearchRankingState
+
+    top_n = top_n or _setting('MOST_SEARCHED_TOP_N', 10)
+    folded = fold_hourly_counts(window_days)
+    pruned = prune_token_counts(window_days)
+    weights = token_weights(window_days)
+    rankings = rank_products(score_products(weights, candidate_products(weights)), top_n) if weights else {}
+
+    now = timezone.now()
+    with transaction.atomic():
+        MostSearchedProduct.objects.all().delete()
+        MostSearchedProduct.objects.bulk_create([
+            MostSearchedProduct(category=category, rank=rank, product_id=product_id, score=score, computed_at=now)
+            for category, entries in rankings.items()
+            for rank, (score, product_id) in enumerate(entries, start=1)
+        ])
+        SearchRankingState.objects.filter(pk=1).update(refreshed_at=now)
+        transaction.on_commit(lambda: invalidate_tags('most_searched'))
+
+    return {
+        'folded': folded,
+        'pruned': pruned,
+        'tokens': len(weights),
+        'ranked': len(rankings.get('', [])),
+        'categories': len(rankings) - (1 if '' in rankings else 0),
+    }
+
+
+def ranked_product_ids(category=''):
+    """Product ids of a stored ranking, best first."""
+    from .models import MostSearchedProduct
+
+    return list(
+        MostSearchedProduct.objects.filter(category=category).order_by('rank').values_list('product_id', flat=True)
+    )
@@ -18,18 +18,31 @@ class RegisterSerializer(serializers.ModelSerializer):
 
 class ProductImageSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
+    medium = serializers.SerializerMethodField()
 
     class Meta:
         model = ProductImage
-        fields = ['id', 'image', 'uploaded_at']
+        fields = ['id', 'image', 'thumbnail', 'medium', 'uploaded_at']
 
-    def get_image(self, obj):
+    def _build_url(self, obj, size=None):
         request = self.context.get('request')
         path = f"/api/vendor/product-images/{obj.id}/"
+        if size:
+            path += f"?size={size}"
         if request:
             return request.build_absolute_uri(path)
         return path
 
+    def get_image(self, obj):
+        return self._build_url(obj)
+
+    def get_thumbnail(self, obj):
+        return self._build_url(obj, 'thumb')
+
+    def get_medium(self, obj):
+        return self._build_url(obj, 'medium')
+
 
 class ProductSerializer(serializers.ModelSerializer):
     images = ProductImageSerializer(many=True, read_only=True)
@@ -45,15 +58,22 @@ class ProductSerializer(serializers.ModelSerializer):
             'vendor_name', 'average_rating', 'review_count'
         ]
 
+    # Ratings come from the denormalized ProductRatingSummary; callers should
+    # select_related('rating_summary') to keep listings at a constant query count.
+    def _rating_summary(self, obj):
+        from django.core.exceptions import ObjectDoesNotExist
+        try:
+            return obj.rating_summary
+        except ObjectDoesNotExist:
+            return None
+
     def get_average_rating(self, obj):
-        from django.db.models import Avg
-        from .models import Review
-        avg = Review.objects.filter(Product=obj).aggregate(Avg('rating'))['rating__avg']
-        return round(avg, 1) if avg else 0
+        summary = self._rating_summary(obj)
+        return summary.average_rating if summary else 0
 
     def get_review_count(self, obj):
-        from .models import Review
-        return Review.objects.filter(Product=obj).count()
+        summary = self._rating_summary(obj)
+        return summary.review_count if summary else 0
 
 
 
@@ -64,7 +84,7 @@ class AddressSerializer(serializers.ModelSerializer):
     class Meta:
         model = Address
         fields = ['id', 'user', 'name', 'phone', 'email', 'address_line1', 'address_line2',
-                  'city', 'state', 'pincode', 'country', 'is_default', 'created_at', 'address']
+                  'city', 'state', 'pincode', 'country', 'latitude', 'longitude', 'is_default', 'created_at', 'address']
         read_only_fields = ['user']
 
 
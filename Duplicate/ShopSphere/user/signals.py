@@ -19,4 +19,90 @@ def update_product_rating(sender, instance, **kwargs):
         product.average_rating = 0
         product.total_reviews = 0
 
-    product.save()
\ No newline at end of file
+    product.save()
+
+# ── Review → ProductRatingSummary ──────────────────────────────────────────
+
+from django.db.models.signals import pre_save
+from .models import Review
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_review_rating(sender, instance, **kwargs):
+    """Stash the stored rating/product so post_save can apply a correct delta."""
+    instance._previous_rating = None
+    if instance.pk:
+        previous = Review.objects.filter(pk=instance.pk).values('Product_id', 'rating').first()
+        if previous:
+            instance._previous_rating = (previous['Product_id'], previous['rating'])
+
+
+@receiver(post_save, sender=Review)
+def update_rating_summary_on_save(sender, instance, created, raw=False, **kwargs):
+    from .ratings import apply_review_delta
+    if raw:
+        return
+    previous = getattr(instance, '_previous_rating', None)
+    if previous == (instance.Product_id, instance.rating):
+        return
+    if previous:
+        apply_review_delta(previous[0], previous[1], -1)
+    apply_review_delta(instance.Product_id, instance.rating, 1)
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_summary_on_delete(sender, instance, **kwargs):
+    from .ratings import apply_review_delta
+    apply_review_delta(instance.Product_id, instance.rating, -1)
+
+
+# ── Response cache invalidation (ShopSphere/cache.py) ──────────────────────
+
+from django.db import transaction
+from ShopSphere.cache import invalidate_tags
+from .models import Order
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_review_caches(sender, **kwargs):
+    transaction.on_commit(lambda: invalidate_tags('reviews'))
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_order_caches(sender, **kwargs):
+    transaction.on_commit(lambda: invalidate_tags('orders'))
+
+
+# ── Product search index (user/search.py) ──────────────────────────────────
+
+from vendor.models import Product, VendorProfile
+
+PRODUCT_SEARCH_FIELDS = {'name', 'description', 'category', 'status', 'is_blocked', 'vendor'}
+VENDOR_SEARCH_FIELDS = {'shop_name', 'is_active', 'is_blocked'}
+
+
+def _touches(update_fields, fields):
+    return update_fields is None or bool(set(update_fields) & fields)
+
+
+@receiver(post_save, sender=Product)
+def reindex_saved_product(sender, instance, raw=False, update_fields=None, **kwargs):
+    from .search import schedule_reindex
+    if not raw and _touches(update_fields, PRODUCT_SEARCH_FIELDS):
+        schedule_reindex(product_ids=[instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_deleted_product(sender, instance, **kwargs):
+    from .search import schedule_reindex
+    schedule_reindex(product_ids=[instance.pk])
+
+
+@receiver(post_save, sender=VendorProfile)
+def reindex_vendor_products(sender, instance, raw=False, update_fields=None, **kwargs):
+    from .search import schedule_reindex
+    # Shop name and vendor status are part of every product's entry.
+    if not raw and _touches(update_fields, VENDOR_SEARCH_FIELDS):
+        schedule_reindex(vendor_ids=[instance.pk])
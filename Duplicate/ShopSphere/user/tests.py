@@ -1,3 +1,113 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+
+from vendor.models import Product, ProductImage, VendorProfile
+from .models import Order, SearchLog
+from .search_logging import SearchLogBuffer
+
+User = get_user_model()
+
+
+class CatalogQueryCountTests(APITestCase):
+    """A catalog page costs the same two queries whatever its size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(
+            username='vendor', email='vendor@example.com', password='pass12345', role='vendor',
+        )
+        vendor = VendorProfile.objects.create(
+            user=user, shop_name='Test Shop', shop_description='Everything', address='1 Market Road',
+            business_type='retail', approval_status='approved',
+        )
+        products = Product.objects.bulk_create([
+            Product(
+                vendor=vendor, name=f'Product {i}', description='A product', category='other',
+                price=Decimal('10.00') + i, quantity=5,
+            )
+            for i in range(60)
+        ])
+        ProductImage.objects.bulk_create([
+            ProductImage(product=product, image_mimetype='image/png', image_filename=f'{product.id}-{n}.png')
+            for product in products
+            for n in range(2)
+        ])
+
+    def assertPageQueries(self, page_size):
+        # products with vendor and rating summary joined, images
+        with self.assertNumQueries(2):
+            response = self.client.get('/catalog/', {'page_size': page_size})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), page_size)
+        self.assertEqual(len(response.data['results'][0]['images']), 2)
+        return response
+
+    def test_small_page(self):
+        response = self.assertPageQueries(5)
+        self.assertIsNotNone(response.data['next_cursor'])
+
+    def test_large_page(self):
+        response = self.assertPageQueries(50)
+        with self.assertNumQueries(2):
+            following = self.client.get('/catalog/', {'page_size': 50, 'cursor': response.data['next_cursor']})
+        self.assertEqual(len(following.data['results']), 10)
+        self.assertIsNone(following.data['next_cursor'])
+        seen = {row['id'] for row in response.data['results']}
+        self.assertFalse(seen & {row['id'] for row in following.data['results']})
+
+
+class ProcessPaymentValidationTests(APITestCase):
+    """Malformed line quantities are rejected with 400 and take no stock."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(
+            username='seller', email='seller@example.com', password='pass12345', role='vendor',
+        )
+        vendor = VendorProfile.objects.create(
+            user=user, shop_name='Test Shop', shop_description='Everything', address='1 Market Road',
+            business_type='retail', approval_status='approved',
+        )
+        cls.product = Product.objects.create(
+            vendor=vendor, name='Lamp', description='A lamp', price=Decimal('10.00'), quantity=5,
+        )
+        cls.customer = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass12345')
+
+    def test_bad_quantities(self):
+        self.client.force_authenticate(self.customer)
+        for quantity in (0, -2, 'two', None):
+            with self.subTest(quantity=quantity):
+                response = self.client.post('/process_payment/', {
+                    'payment_mode': 'cod',
+                    'items': [{'name': 'Lamp', 'price': '10.00', 'quantity': quantity}],
+                }, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('Lamp', response.data['error'])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 5)
+        self.assertFalse(Order.objects.exists())
+
+
+class SearchLogBufferTests(APITestCase):
+    """A failed search log write is logged and retried, never raised."""
+
+    def test_failed_flush_keeps_rows(self):
+        buffer = SearchLogBuffer()
+        with self.settings(SEARCH_LOG_BUFFER_SIZE=2, SEARCH_LOG_BUFFER_MAX_AGE=60):
+            with mock.patch.object(SearchLog.objects, 'bulk_create', side_effect=RuntimeError('db down')):
+                with self.assertLogs('user.search_logging', 'ERROR'):
+                    buffer.add(SearchLog(query='lamp'))
+                    buffer.add(SearchLog(query='desk'))
+            self.assertEqual(len(buffer), 2)
+            self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(SearchLog.objects.count(), 2)
+
+    def test_unbuffered_failure_does_not_fail_request(self):
+        with self.settings(SEARCH_LOG_BUFFER_SIZE=0):
+            with mock.patch.object(SearchLog.objects, 'bulk_create', side_effect=RuntimeError('db down')):
+                with self.assertLogs('user.search_logging', 'ERROR'):
+                    response = self.client.post('/log-search/', {'query': 'lamp'}, format='json')
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,172 @@
+"""
+user/trending.py
+
+Precomputed trending ranking (trending_products view), refreshed by
+`python manage.py refresh_trending` (run from cron).
+
+A product's trending score is its recent activity, each event weighted by
+0.5 ** (age / TRENDING_HALF_LIFE_HOURS) so that yesterday counts more than
+last week, over the last TRENDING_WINDOW_DAYS days:
+
+    REVIEW_WEIGHT   per review (Review.created_at)
+    SALE_WEIGHT     per unit sold (OrderItem, by Order.created_at; orders
+                    that were cancelled or rejected don't count)
+    SEARCH_WEIGHT   per search whose results show the product (hourly
+                    SearchQueryHourly counts, each query run once against
+                    the search index; its top SEARCH_RESULTS_CREDITED
+                    products are credited)
+
+plus RATING_WEIGHT per average star for products with any activity. Events
+are read grouped by product and hour (indexed on created_at), so a refresh
+reads a week of activity, not the catalog.
+
+The top TRENDING_TOP_K products overall and per category replace the
+TrendingProduct rows in one transaction (ranking shared with
+search_ranking.rank_products()).
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .search import listed_products, search_product_ids
+from .search_ranking import rank_products
+
+REVIEW_WEIGHT = 2.0
+SALE_WEIGHT = 1.0
+SEARCH_WEIGHT = 0.2
+RATING_WEIGHT = 0.25
+SEARCH_RESULTS_CREDITED = 10
+MAX_SEARCH_QUERIES = 500        # most searched queries of the window that are credited
+EXCLUDED_ORDER_STATUSES = ('cancelled', 'rejected')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class Decay:
+    """Weight of an event from its hour: 1 now, 0.5 one half-life ago."""
+
+    def __init__(self, now, half_life_hours):
+        self.now = now
+        self.half_life = half_life_hours
+
+    def __call__(self, moment):
+        age_hours = max((self.now - moment).total_seconds() / 3600, 0.0)
+        return 0.5 ** (age_hours / self.half_life)
+
+
+# -- activity ---------------------------------------------------------------------
+
+def review_activity(since, decay):
+    """{product_id: decayed review count}."""
+    from .models import Review
+
+    activity = defaultdict(float)
+    rows = (
+        Review.objects.filter(created_at__gte=since)
+        .annotate(hour=TruncHour('created_at'))
+        .values('Product_id', 'hour').annotate(n=Count('id')).order_by()
+    )
+    for row in rows:
+        activity[row['Product_id']] += row['n'] * decay(row['hour'])
+    return activity
+
+
+def sales_activity(since, decay):
+    """{product_id: decayed units sold}."""
+    from .models import OrderItem
+
+    activity = defaultdict(float)
+    rows = (
+        OrderItem.objects.filter(order__created_at__gte=since, product__isnull=False)
+        .exclude(order__status__in=EXCLUDED_ORDER_STATUSES)
+        .annotate(hour=TruncHour('order__created_at'))
+        .values('product_id', 'hour').annotate(units=Sum('quantity')).order_by()
+    )
+    for row in rows:
+        activity[row['product_id']] += row['units'] * decay(row['hour'])
+    return activity
+
+
+def search_activity(since, decay):
+    """{product_id: decayed searches that show it among the top results}."""
+    from .models import SearchQueryHourly
+
+    searches = defaultdict(float)
+    for query, hour, count in (
+        SearchQueryHourly.objects.filter(hour__gte=since).values_list('query', 'hour', 'count').iterator()
+    ):
+        searches[query] += count * decay(hour)
+
+    activity = defaultdict(float)
+    top = sorted(searches.items(), key=lambda item: -item[1])[:MAX_SEARCH_QUERIES]
+    for query, weight in top:
+        for product_id in search_product_ids(query, prefix=False, limit=SEARCH_RESULTS_CREDITED)[1]:
+            activity[product_id] += weight
+    return activity
+
+
+def trending_scores(now=None, window_days=None, half_life_hours=None):
+    """[(score, product_id, category), ...] of listed products with recent activity."""
+    from vendor.models import Product
+
+    now = now or timezone.now()
+    window_days = window_days or _setting('TRENDING_WINDOW_DAYS', 7)
+    decay = Decay(now, half_life_hours or _setting('TRENDING_HALF_LIFE_HOURS', 48))
+    since = now - timedelta(days=window_days)
+
+    activity = defaultdict(float)
+    for weight, source in (
+        (REVIEW_WEIGHT, review_activity),
+        (SALE_WEIGHT, sales_activity),
+        (SEARCH_WEIGHT, search_activity),
+    ):
+        for product_id, amount in source(since, decay).items():
+            activity[product_id] += weight * amount
+    if not activity:
+        return []
+
+    scored = []
+    for product_id, category, review_count, rating_total in (
+        listed_products(Product).filter(id__in=list(activity))
+        .values_list('id', 'category', 'rating_summary__review_count', 'rating_summary__rating_total')
+    ):
+        score = activity[product_id]
+        if review_count:
+            score += (rating_total / review_count) * RATING_WEIGHT
+        scored.append((score, product_id, category))
+    return scored
+
+
+# -- the job ----------------------------------------------------------------------
+
+def refresh_trending(top_k=None, window_days=None, half_life_hours=None):
+    """Recompute and store the trending rankings. Returns a summary dict."""
+    from ShopSphere.cache import invalidate_tags
+    from .models import TrendingProduct
+
+    top_k = top_k or _setting('TRENDING_TOP_K', 10)
+    now = timezone.now()
+    scored = trending_scores(now, window_days, half_life_hours)
+    rankings = rank_products(scored, top_k)
+
+    with transaction.atomic():
+        TrendingProduct.objects.all().delete()
+        TrendingProduct.objects.bulk_create([
+            TrendingProduct(category=category, rank=rank, product_id=product_id, score=score, computed_at=now)
+            for category, entries in rankings.items()
+            for rank, (score, product_id) in enumerate(entries, start=1)
+        ])
+        transaction.on_commit(lambda: invalidate_tags('trending'))
+
+    return {
+        'scored': len(scored),
+        'ranked': len(rankings.get('', [])),
+        'categories': len(rankings) - (1 if '' in rankings else 0),
+    }
@@ -14,6 +14,7 @@ urlpatterns = [
    
     path('', views.home_api, name='user_products'),
     path('products/', views.home_api, name='user_products_json'),
+    path('catalog/', views.catalog_api, name='catalog_api'),
     path('product/<int:product_id>/', views.product_detail, name='user_product_detail'),
     path('submit_review/<int:product_id>/', views.submit_review_api, name='submit_review_api'),
 
@@ -27,6 +28,7 @@ urlpatterns = [
 
     # User Profile / Orders
     path('my_orders/', views.my_orders, name='my_orders'),
+    path('cancel_order/<int:order_id>/', views.cancel_order, name='cancel_order'),
     path('address/', views.address_page, name="address_page"),
     path('delete-address/<int:id>/', views.delete_address, name="delete_address"),
     path('update-address/<int:id>/', views.update_address, name="update_address"),
@@ -40,6 +42,8 @@ urlpatterns = [
     path('trending/', views.trending_products, name='trending_products'),
     path('log-search/', views.log_search, name='log_search'),
     path('most-searched/', views.most_searched_products, name='most_searched_products'),
+    path('search/', views.search_products, name='search_products'),
+    path('search/suggest/', views.search_suggestions, name='search_suggestions'),
 
     # Auth / Forgot Password
     path('auth/', views.auth_page, name='auth'),
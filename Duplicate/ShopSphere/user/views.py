@@ -5,11 +5,14 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate, login, logout
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from decimal import Decimal
 
-from .models import AuthUser, Cart, CartItem, Order, OrderItem, Address, Review, Payment, UserWallet, WalletTransaction
+from .models import AuthUser, Cart, CartItem, Order, OrderStatusHistory, Address, Review, Payment, UserWallet, WalletTransaction
 from .serializers import RegisterSerializer, ProductSerializer, CartSerializer, OrderSerializer, AddressSerializer, ReviewSerializer
 from .forms import AddressForm
+from .catalog import CATALOG_PARAMS, CatalogError, paginate_catalog, with_listing_relations
+from .inventory import InsufficientStock, release_reservations
+from .orders import InvalidOrderLine, create_order, lines_from_cart, lines_from_request_items
+from .search import paginate_search, suggest_products, tokenize
 import uuid
 from django.db import transaction
 from vendor.models import Product
@@ -17,9 +20,9 @@ from django.utils import timezone
 from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
-from datetime import timedelta
-from django.db.models import Count, F, FloatField, ExpressionWrapper, Q
+from django.db.models import Count
 from django.views.decorators.csrf import csrf_exempt
+from ShopSphere.cache import cache_policy
 
 
 @api_view(['GET'])
@@ -220,16 +223,79 @@ def google_login_api(request):
     })
 
 
+# 🔹 CATALOG (cursor-paginated product listing)
+def _catalog_page_response(request):
+    try:
+        products, next_cursor, next_url = paginate_catalog(request)
+    except CatalogError as e:
+        return Response({"error": str(e)}, status=400)
+    serializer = ProductSerializer(products, many=True, context={'request': request})
+    return Response({
+        "results": serializer.data,
+        "next_cursor": next_cursor,
+        "next": next_url,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@cache_policy('catalog', tags=('products', 'reviews', 'vendors'))
+def catalog_api(request):
+    """
+    GET /catalog/?cursor=&page_size=&category=&min_price=&max_price=&vendor=
+    Keyset-paginated on (created_at, id); constant query count per page.
+    """
+    return _catalog_page_response(request)
+
+
+# 🔹 SEARCH (BM25 over the product search index, user/search.py)
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@cache_policy('search', tags=('products', 'reviews', 'vendors'))
+def search_products(request):
+    """
+    GET /search/?q=&page=&page_size=&category=&min_price=&max_price=&vendor=
+    Products ranked by relevance; the last word of q also matches as a prefix.
+    """
+    if not tokenize(request.query_params.get('q', '')):
+        return Response({"error": "q is required"}, status=400)
+    try:
+        products, total, next_url = paginate_search(request)
+    except CatalogError as e:
+        return Response({"error": str(e)}, status=400)
+    serializer = ProductSerializer(products, many=True, context={'request': request})
+    return Response({
+        "count": total,
+        "results": serializer.data,
+        "next": next_url,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@cache_policy('search', tags=('products',))
+def search_suggestions(request):
+    """GET /search/suggest/?q= — a few matching products for typeahead."""
+    query = request.query_params.get('q', '')
+    if len(query.strip()) < 2:
+        return Response([])
+    return Response(suggest_products(query))
+
+
 # 🔹 HOME (Product Page)
 @api_view(['GET'])
 
 
 #permission_classes([IsAuthenticated])
 
+@cache_policy('catalog', tags=('products', 'reviews', 'vendors'))
 def home_api(request):
     products = Product.objects.filter(status='active', is_blocked=False, vendor__is_active=True, vendor__is_blocked=False)
     
     if request.accepted_renderer.format == 'json':
+        if any(param in request.query_params for param in CATALOG_PARAMS):
+            return _catalog_page_response(request)
+        products = with_listing_relations(products)
         serializer = ProductSerializer(products, many=True, context={'request': request})
         return Response(serializer.data)
     
@@ -341,140 +407,24 @@ def process_payment(request):
         with transaction.atomic():
             # CASE 1: Items passed directly (frontend state)
             if items_from_request:
-                total_amount = Decimal('0.00')
-                for item_data in items_from_request:
-                    price = Decimal(str(item_data.get('price', 0)))
-                    quantity = int(item_data.get('quantity', 1))
-                    total_amount += price * quantity
-                
-                order = Order.objects.create(
-                    user=request.user,
-                    order_number=order_number,
-                    payment_method=payment_mode,
-                    transaction_id=transaction_id,
-                    total_amount=total_amount,
-                    subtotal=total_amount,
-                    payment_status='completed'
-                )
-                
-                # Create Payment record
-                Payment.objects.create(
-                    order=order,
-                    user=request.user,
-                    method=payment_mode if payment_mode in dict(Payment.PAYMENT_METHOD_CHOICES) else 'cod',
-                    amount=total_amount,
-                    transaction_id=transaction_id,
-                    status='completed',
-                    completed_at=timezone.now().replace(second=0, microsecond=0)
-                )
-                
-                from superAdmin.models import CommissionSetting
-                for item_data in items_from_request:
-                    price = Decimal(str(item_data.get('price', 0)))
-                    quantity = int(item_data.get('quantity', 1))
-                    
-                    # Try to find the product object to maintain the FK relation
-                    product_obj = Product.objects.filter(name=item_data.get('name')).first()
-                    
-                    # --- STOCK REDUCTION LOGIC ---
-                    if product_obj:
-                        if product_obj.quantity < quantity:
-                            raise Exception(f"Insufficient stock for {product_obj.name}. Available: {product_obj.quantity}")
-                        product_obj.quantity -= quantity
-                        product_obj.save(update_fields=['quantity'])
-                    # -----------------------------
-
-                    commission_rate = Decimal('10.00')
-                    commission_amount = Decimal('0.00')
-                    
-                    if product_obj:
-                        comm_data = CommissionSetting.get_commission_for_product(product_obj)
-                        commission_rate = Decimal(str(comm_data['rate']))
-                        basic_fee = Decimal(str(comm_data.get('basic_fee', 0)))
-                        if comm_data['type'] == 'percentage':
-                            commission_amount = ((price * quantity * commission_rate) / 100) + basic_fee
-                        else:
-                            commission_amount = commission_rate + basic_fee # Fixed amount + basic fee
-                    
-                    OrderItem.objects.create(
-                        order=order,
-                        product=product_obj,
-                        vendor=product_obj.vendor if product_obj else None,
-                        product_name=item_data.get('name'),
-                        quantity=quantity,
-                        product_price=price,
-                        subtotal=price * quantity,
-                        commission_rate=commission_rate,
-                        commission_amount=commission_amount
-                    )
+                lines = lines_from_request_items(items_from_request)
+                order = create_order(request.user, lines, payment_mode, transaction_id, order_number)
                 Cart.objects.filter(user=request.user).delete()
 
             # CASE 2: Use items from the database cart
             else:
                 cart = Cart.objects.get(user=request.user)
-                cart_items = cart.items.all()
-                if not cart_items:
+                lines = lines_from_cart(cart)
+                if not lines:
                     return Response({"error": "Cart is empty"}, status=400)
 
-                total_amount = sum(item.get_total() for item in cart_items)
-                
-                # Pre-check stock for all items
-                for item in cart_items:
-                    if item.product.quantity < item.quantity:
-                        return Response({"error": f"Insufficient stock for {item.product.name}. Available: {item.product.quantity}"}, status=400)
-
-                order = Order.objects.create(
-                    user=request.user,
-                    order_number=order_number,
-                    payment_method=payment_mode,
-                    transaction_id=transaction_id,
-                    total_amount=total_amount,
-                    subtotal=total_amount,
-                    payment_status='completed'
-                )
-
-                # Create Payment record
-                Payment.objects.create(
-                    order=order,
-                    user=request.user,
-                    method=payment_mode if payment_mode in dict(Payment.PAYMENT_METHOD_CHOICES) else 'cod',
-                    amount=total_amount,
-                    transaction_id=transaction_id,
-                    status='completed',
-                    completed_at=timezone.now().replace(second=0, microsecond=0)
-                )
-
-                from superAdmin.models import CommissionSetting
-                for item in cart_items:
-                    # --- STOCK REDUCTION LOGIC ---
-                    product_obj = item.product
-                    product_obj.quantity -= item.quantity
-                    product_obj.save(update_fields=['quantity'])
-                    # -----------------------------
-
-                    comm_data = CommissionSetting.get_commission_for_product(item.product)
-                    commission_rate = Decimal(str(comm_data['rate']))
-                    basic_fee = Decimal(str(comm_data.get('basic_fee', 0)))
-                    if comm_data['type'] == 'percentage':
-                        commission_amount = (item.get_total() * commission_rate) / 100 + basic_fee
-                    else:
-                        commission_amount = commission_rate + basic_fee
-                        
-                    OrderItem.objects.create(
-                        order=order,
-                        product=item.product,
-                        vendor=item.product.vendor,
-                        product_name=item.product.name,
-                        quantity=item.quantity,
-                        product_price=item.product.price,
-                        subtotal=item.get_total(),
-                        commission_rate=commission_rate,
-                        commission_amount=commission_amount
-                    )
+                order = create_order(request.user, lines, payment_mode, transaction_id, order_number)
                 cart.items.all().delete()
 
     except Cart.DoesNotExist:
         return Response({"error": "Cart not found"}, status=404)
+    except (InsufficientStock, InvalidOrderLine) as e:
+        return Response({"error": str(e)}, status=400)
     except Exception as e:
         return Response({"error": f"Database Error: {str(e)}"}, status=500)
 
@@ -499,6 +449,44 @@ def my_orders(request):
         
     return render(request, "my_orders.html", {"orders": orders})
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def cancel_order(request, order_id):
+    get_object_or_404(Order.objects.only('id'), id=order_id, user=request.user)
+
+    with transaction.atomic():
+        # Locked and re-checked here: a vendor or agent may move it on concurrently.
+        order = Order.objects.select_for_update().get(id=order_id)
+        if not order.can_be_cancelled():
+            return Response({"error": f"Cannot cancel an order in status: {order.status}"}, status=400)
+
+        release_reservations(order)
+        order.status = 'cancelled'
+        notes = 'Cancelled by customer.'
+        refunded = order.payment_status == 'completed'
+        if refunded:
+            # Paid orders are refunded to the customer's wallet straight away.
+            wallet, _ = UserWallet.objects.select_for_update().get_or_create(user=request.user)
+            wallet.add_balance(order.total_amount, description=f"Refund for cancelled order {order.order_number}")
+            order.payment_status = 'refunded'
+            Payment.objects.filter(order=order, status='completed').update(status='refunded')
+            notes += f' ₹{order.total_amount} refunded to wallet.'
+        order.save(update_fields=['status', 'payment_status', 'updated_at'])
+        OrderStatusHistory.objects.create(
+            order=order,
+            status='cancelled',
+            changed_by=request.user,
+            notes=notes,
+        )
+
+    return Response({
+        "message": "Order cancelled successfully",
+        "order_number": order.order_number,
+        "order_status": order.status,
+        "payment_status": order.payment_status,
+        "refunded_amount": float(order.total_amount) if refunded else 0,
+    })
+
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
 def address_page(request):
@@ -592,8 +580,9 @@ def logout_api(request):
 
 @api_view(['GET', 'POST'])
 @permission_classes([AllowAny])
+@cache_policy('product_detail', tags=('products', 'reviews', 'vendors'), vary_on_user=True)
 def product_detail(request, product_id):
-    product = get_object_or_404(Product, id=product_id, status='active', is_blocked=False, vendor__is_active=True, vendor__is_blocked=False)
+    product = get_object_or_404(with_listing_relations(Product.objects.all()), id=product_id, status='active', is_blocked=False, vendor__is_active=True, vendor__is_blocked=False)
     user_review = None
     can_edit_review = False
     days_left = 0
@@ -743,54 +732,31 @@ def auth_page(request):
 # ======================================
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cache_policy('trending', tags=('products', 'reviews', 'vendors', 'trending'))
 def trending_products(request):
-    from user.models import Review
-    seven_days_ago = timezone.now() - timedelta(days=7)
-
-    try:
-        products = Product.objects.annotate(
-            recent_review_count=Count(
-                'reviews',
-                filter=Q(reviews__created_at__gte=seven_days_ago)
-            )
-        ).annotate(
-            trending_score=ExpressionWrapper(
-                (F('recent_review_count') * 2.0) + (F('average_rating') * 3.0),
-                output_field=FloatField()
-            )
-        ).filter(
-            trending_score__gt=0
-        ).order_by(
-            '-trending_score',
-            '-total_reviews'
-        )[:10]
-    except Exception:
-        products = Product.objects.none()
-
-    # Apply Vendor Status Filtering
-    products = products.filter(status='active', is_blocked=False, vendor__is_active=True, vendor__is_blocked=False)
-
-    # ✅ Fallback: if no trending products found, return top-rated or newest products
-    if not products.exists():
-        # Try products that have reviews
-        products = Product.objects.filter(
-            status='active', is_blocked=False, vendor__is_active=True, vendor__is_blocked=False
-        ).annotate(
-            review_count=Count('reviews')
-        ).filter(
-            review_count__gt=0
-        ).order_by('-review_count')[:10]
-
-    # Final fallback: just return newest active products
-    if not products.exists():
-        products = Product.objects.filter(
+    """
+    GET /trending/?category=
+    Products with the most recent reviews, sales and searches, overall or
+    within one category. The ranking is precomputed by `python manage.py
+    refresh_trending` (see user/trending.py); this is one lookup by
+    (category, rank) plus the product images.
+    """
+    category = request.query_params.get('category', '')
+    products = with_listing_relations(Product.objects.filter(
+        trending_ranks__category=category,
+        status='active', is_blocked=False, vendor__is_active=True, vendor__is_blocked=False,
+    )).order_by('trending_ranks__rank')
+
+    # Cold start (ranking not computed yet, or no recent activity): newest products
+    products = list(products)
+    if not products:
+        products = with_listing_relations(Product.objects.filter(
             status='active', is_blocked=False, vendor__is_active=True, vendor__is_blocked=False
-        ).order_by('-created_at')[:10]
+        )).order_by('-created_at', '-id')[:10]
 
     serializer = ProductSerializer(products, many=True, context={'request': request})
     return Response(serializer.data)
 
-
 # ======================================
 # 🔍 Most Searched Products (ML-Based)
 # ======================================
@@ -800,107 +766,54 @@ def trending_products(request):
 def log_search(request):
     """
     Records a user search query into SearchLog.
-    Called silently from the frontend on every search keystroke (debounced).
+    Called silently from the frontend on every search keystroke (debounced),
+    so rows are buffered and written in batches (user/search_logging.py).
     """
-    from user.models import SearchLog
+    from user.search_logging import record_search
     query = (request.data.get('query') or '').strip()
     if len(query) < 2:
         return Response({'status': 'ignored'})
 
-    user = request.user if request.user.is_authenticated else None
+    user_id = request.user.id if request.user.is_authenticated else None
     session_key = request.session.session_key or ''
 
-    SearchLog.objects.create(
-        query=query.lower(),
-        user=user,
-        session_key=session_key
-    )
+    record_search(query, user_id=user_id, session_key=session_key)
     return Response({'status': 'logged'})
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cache_policy('most_searched', tags=('products', 'reviews', 'vendors', 'most_searched'))
 def most_searched_products(request):
     """
-    ML-based endpoint: returns products ranked by how often they were searched.
-
-    Algorithm (lightweight TF-IDF-style matching):
-    1. Aggregate the most frequently searched queries (last 30 days).
-    2. Tokenize each query into words.
-    3. For every active product, compute a relevance score:
-           score = sum over all query-tokens that appear in product name
-                   of (token_count / max_count)
-       This gives a frequency-weighted name-match ranking.
-    4. Return the top-10 products sorted by score descending.
+    GET /most-searched/?category=
+    Products ranked by how often their name words were searched in the
+    last 30 days, overall or within one category. The ranking is
+    precomputed by `python manage.py refresh_most_searched` (see
+    user/search_ranking.py); this only reads it.
     """
-    import re
-    from collections import defaultdict
-    from user.models import SearchLog
+    from .search_ranking import ranked_product_ids
 
     def _safe_fallback(request):
         """Return newest active products as a safe cold-start fallback."""
-        products = Product.objects.filter(
+        products = with_listing_relations(Product.objects.filter(
             status='active', is_blocked=False, vendor__is_active=True, vendor__is_blocked=False
-        ).annotate(
+        )).annotate(
             review_count=Count('reviews')
         ).order_by('-review_count', '-created_at')[:10]
         return ProductSerializer(products, many=True, context={'request': request}).data
 
-    try:
-        thirty_days_ago = timezone.now() - timedelta(days=30)
-
-        # Step 1: Fetch aggregated query frequencies from last 30 days
-        recent_logs = list(
-            SearchLog.objects
-            .filter(created_at__gte=thirty_days_ago)
-            .values('query')
-            .annotate(count=Count('query'))
-            .order_by('-count')[:200]
-        )
-
-        if not recent_logs:
-            # Cold-start: no search logs yet, return newest/most-reviewed products
-            return Response(_safe_fallback(request))
-
-        max_count = recent_logs[0]['count'] or 1
-
-        # Step 2: Build token → weight mapping (TF-IDF-like)
-        token_weights = defaultdict(float)
-        stop_words = {'the', 'a', 'an', 'is', 'in', 'on', 'at', 'for',
-                      'of', 'and', 'or', 'to', 'with', 'by'}
-        for row in recent_logs:
-            tokens = re.findall(r'\w+', row['query'].lower())
-            weight = row['count'] / max_count  # normalise to [0, 1]
-            for token in tokens:
-                if token not in stop_words and len(token) >= 2:
-                    token_weights[token] += weight
-
-        # Step 3: Score every active product (no non-existent field access)
-        products_qs = list(Product.objects.filter(status='active', is_blocked=False, vendor__is_active=True, vendor__is_blocked=False))
-        scored = []
-        for product in products_qs:
-            name_tokens = set(re.findall(r'\w+', product.name.lower()))
-            score = sum(token_weights.get(t, 0) for t in name_tokens)
-            # Safe attribute access — some products might have the field set by signals
-            rating = float(getattr(product, 'average_rating', 0) or 0)
-            score += rating * 0.05
-            if score > 0:
-                scored.append((score, product))
-
-        # Step 4: Sort and take top-10
-        scored.sort(key=lambda x: x[0], reverse=True)
-        top_products = [p for _, p in scored[:10]]
-
-        # Final fallback if nothing matched
-        if not top_products:
-            return Response(_safe_fallback(request))
-
-        serializer = ProductSerializer(top_products, many=True, context={'request': request})
-        return Response(serializer.data)
-
-    except Exception as exc:
-        # Never let the ML endpoint crash — always return something useful
-        import logging
-        logging.getLogger(__name__).error("most_searched_products error: %s", exc)
+    ids = ranked_product_ids(request.query_params.get('category', ''))
+    if not ids:
+        # Cold start: no ranking computed yet (or no searches in the window)
         return Response(_safe_fallback(request))
 
+    products = {
+        product.id: product
+        for product in with_listing_relations(Product.objects.filter(
+            id__in=ids, status='active', is_blocked=False, vendor__is_active=True, vendor__is_blocked=False
+        ))
+    }
+    top_products = [products[i] for i in ids if i in products]
+    serializer = ProductSerializer(top_products, many=True, context={'request': request})
+    return Response(serializer.data)